@@ -0,0 +1,27 @@
+"""add materialized response columns
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Pre-serialized response bytes written at refresh time
+    op.add_column('weather_cache', sa.Column('response_json', sa.LargeBinary(), nullable=True))
+    op.add_column('weather_cache', sa.Column('response_json_gzip', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('weather_cache', 'response_json_gzip')
+    op.drop_column('weather_cache', 'response_json')
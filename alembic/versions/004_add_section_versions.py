@@ -0,0 +1,25 @@
+"""add section version stamps for delta sync
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Per-section / per-entry version stamps maintained by the refresh paths
+    op.add_column('weather_cache', sa.Column('section_versions', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('weather_cache', 'section_versions')
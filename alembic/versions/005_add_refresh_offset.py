@@ -0,0 +1,38 @@
+"""add per-city refresh slot offset
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Seconds past the hour at which each city's forecast is refreshed
+    op.add_column('weather_cache', sa.Column('refresh_offset', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_weather_cache_refresh_offset'), 'weather_cache', ['refresh_offset'], unique=False)
+
+    # Backfill existing cities (same hash as app.database.refresh_offset_for)
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, city_name FROM weather_cache")).fetchall()
+    for row_id, city_name in rows:
+        conn.execute(
+            sa.text("UPDATE weather_cache SET refresh_offset = :offset WHERE id = :id"),
+            {"offset": zlib.crc32(city_name.encode("utf-8")) % 3600, "id": row_id}
+        )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_weather_cache_refresh_offset'), table_name='weather_cache')
+    op.drop_column('weather_cache', 'refresh_offset')
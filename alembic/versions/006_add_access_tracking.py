@@ -0,0 +1,29 @@
+"""add per-city access tracking
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Batched request counts and last access time for refresh tiers and eviction
+    op.add_column('weather_cache', sa.Column('access_count', sa.Float(), nullable=True))
+    op.add_column('weather_cache', sa.Column('last_accessed_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_weather_cache_last_accessed_at'), 'weather_cache', ['last_accessed_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_weather_cache_last_accessed_at'), table_name='weather_cache')
+    op.drop_column('weather_cache', 'last_accessed_at')
+    op.drop_column('weather_cache', 'access_count')
@@ -0,0 +1,27 @@
+"""add openweather city id
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # OpenWeather city id for batched current weather fetches (filled on next refresh)
+    op.add_column('weather_cache', sa.Column('openweather_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_weather_cache_openweather_id'), 'weather_cache', ['openweather_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_weather_cache_openweather_id'), table_name='weather_cache')
+    op.drop_column('weather_cache', 'openweather_id')
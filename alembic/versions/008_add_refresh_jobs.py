@@ -0,0 +1,38 @@
+"""add durable refresh job queue
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Forecast refreshes claimed by workers with SELECT ... FOR UPDATE SKIP LOCKED
+    op.create_table(
+        'refresh_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('city_name', sa.String(), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('run_after', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('city_name', name='uix_refresh_jobs_city_name')
+    )
+    op.create_index(op.f('ix_refresh_jobs_run_after'), 'refresh_jobs', ['run_after'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_refresh_jobs_run_after'), table_name='refresh_jobs')
+    op.drop_table('refresh_jobs')
@@ -0,0 +1,25 @@
+"""add forecast fingerprint
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Hash of the latest forecast fetch, so identical refetches skip the rewrite
+    op.add_column('weather_cache', sa.Column('forecast_fingerprint', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    op.drop_column('weather_cache', 'forecast_fingerprint')
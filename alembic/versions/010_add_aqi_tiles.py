@@ -0,0 +1,31 @@
+"""add aqi tiles
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # AQI per geohash cell, shared by all cities in it
+    op.create_table(
+        'aqi_tiles',
+        sa.Column('geohash', sa.String(length=12), nullable=False),
+        sa.Column('aqi_data', sa.JSON(), nullable=False),
+        sa.Column('fetched_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('geohash')
+    )
+
+
+def downgrade():
+    op.drop_table('aqi_tiles')
@@ -1,14 +1,20 @@
-from flask import Flask, render_template_string, request, redirect, url_for, flash, session
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from flask import Flask, render_template_string, request, redirect, url_for, flash, session, g, jsonify, abort
+from sqlalchemy import create_engine, case, func, and_
+from sqlalchemy.orm import sessionmaker, load_only
 from datetime import datetime, timezone
 import os
 import asyncio
+import threading
+import time
 import httpx
 from functools import wraps
 
 # Import your database models
-from .database import DATABASE_URL, WeatherCache, Base
+from .database import DATABASE_URL, WeatherCache, Base, CURRENT_WEATHER_TTL
+from .job_queue import enqueue_refreshes, PRIORITY_USER
+from .query_stats import instrument_engine, count_queries
+from .city_import import CityImport, parse_import, prune_imports, run_import
+from .api_keys import load_api_keys
 
 app = Flask(__name__)
 app.secret_key = os.getenv("ADMIN_SECRET_KEY", "change-this-secret-key-in-production")
@@ -17,9 +23,29 @@ app.secret_key = os.getenv("ADMIN_SECRET_KEY", "change-this-secret-key-in-produc
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")  # Change this in production!
 
+# Cities per page of the dashboard table
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+ADMIN_MAX_PAGE_SIZE = 500
+
 # Database setup
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrument_engine(engine)
+
+# Bulk imports of this process by id, for progress polling (finished ones are pruned)
+city_imports = {}
+
+@app.before_request
+def start_query_count():
+    # Statement count per admin request, warns on N+1 patterns
+    g.query_count = count_queries(f"admin {request.method} {request.path}")
+    g.query_count.__enter__()
+
+@app.teardown_request
+def finish_query_count(exc):
+    query_count = g.pop("query_count", None)
+    if query_count is not None:
+        query_count.__exit__(None, None, None)
 
 # Login decorator
 def login_required(f):
@@ -370,6 +396,25 @@ ADMIN_TEMPLATE = """
             align-items: center;
             gap: 8px;
         }
+        .search-form {
+            display: flex;
+            align-items: center;
+            gap: 10px;
+            margin-bottom: 15px;
+        }
+        .search-form input[type="text"] {
+            max-width: 300px;
+        }
+        .sort-link {
+            color: white;
+            text-decoration: none;
+        }
+        .pagination {
+            display: flex;
+            justify-content: center;
+            gap: 15px;
+            margin-top: 15px;
+        }
     </style>
 </head>
 <body>
@@ -459,17 +504,62 @@ ADMIN_TEMPLATE = """
         </form>
     </div>
     
+    <div class="add-city-form">
+        <h2>Bulk Import</h2>
+        <form method="POST" action="{{ url_for('import_cities') }}" enctype="multipart/form-data">
+            <div class="form-group">
+                <label for="cities_file">CSV or JSON file:</label>
+                <input type="file" id="cities_file" name="cities_file" accept=".csv,.json,.txt" required>
+                <small style="color: #666;">CSV with a <code>name</code> column or <code>lat</code>/<code>lon</code> columns (or one name per line), or a JSON list of names or {"name"} / {"lat", "lon"} objects</small>
+            </div>
+            <div class="form-group">
+                <label><input type="checkbox" name="warm" value="1" checked> Queue an immediate weather fetch for new cities</label>
+            </div>
+            <button type="submit">Import</button>
+        </form>
+        {% if import_id %}
+        <div id="import-progress" class="timestamp" data-url="{{ url_for('import_progress', import_id=import_id) }}">Starting import...</div>
+        <script>
+            (function poll() {
+                var box = document.getElementById('import-progress');
+                fetch(box.dataset.url).then(function (r) { return r.json(); }).then(function (p) {
+                    box.textContent = p.status + ': ' + (p.geocoded + p.failed) + '/' + p.total + ' geocoded, '
+                        + p.failed + ' failed, ' + p.duplicates + ' duplicates, ' + p.inserted + ' added, '
+                        + p.queued + ' queued (' + p.elapsed + 's)'
+                        + (p.errors.length ? '\n' + p.errors.join('\n') : '');
+                    box.style.whiteSpace = 'pre-line';
+                    if (p.status !== 'done' && p.status !== 'failed') setTimeout(poll, 1000);
+                });
+            })();
+        </script>
+        {% endif %}
+    </div>
+
     <div style="background: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
         <h2>Cached Cities</h2>
+        <form method="GET" action="{{ url_for('index') }}" class="search-form">
+            <input type="text" name="q" value="{{ listing.q }}" placeholder="Search cities">
+            <input type="hidden" name="sort" value="{{ listing.sort }}">
+            <input type="hidden" name="dir" value="{{ listing.dir }}">
+            <input type="hidden" name="per_page" value="{{ listing.per_page }}">
+            <button type="submit">Search</button>
+            {% if listing.q %}<a href="{{ page_url(q='', page=1) }}">Clear</a>{% endif %}
+            <span class="timestamp">{{ stats.matching }} {% if listing.q %}matching{% else %}cities{% endif %}</span>
+        </form>
+        {% macro sort_header(key, title) %}
+            {% set next_dir = 'desc' if listing.sort == key and listing.dir == 'asc' else 'asc' %}
+            <th><a class="sort-link" href="{{ page_url(sort=key, dir=next_dir, page=1) }}">{{ title }}
+                {% if listing.sort == key %}{{ '▲' if listing.dir == 'asc' else '▼' }}{% endif %}</a></th>
+        {% endmacro %}
         <table>
             <thead>
                 <tr>
-                    <th>City Name</th>
+                    {{ sort_header('name', 'City Name') }}
                     <th>Coordinates</th>
-                    <th>Current Weather</th>
+                    {{ sort_header('current', 'Current Weather') }}
                     <th>Forecast Status</th>
-                    <th>Forecast Fetches</th>
-                    <th>Last Forecast Update</th>
+                    {{ sort_header('forecast', 'Forecast Fetches') }}
+                    {{ sort_header('updated', 'Last Forecast Update') }}
                     <th>Actions</th>
                 </tr>
             </thead>
@@ -505,6 +595,9 @@ ADMIN_TEMPLATE = """
                         {% endif %}
                     </td>
                     <td>
+                        <form method="POST" action="{{ url_for('refresh_city', city_id=city.id) }}" style="display: inline;">
+                            <button type="submit">Refresh</button>
+                        </form>
                         <form method="POST" action="{{ url_for('delete_city', city_id=city.id) }}" 
                               style="display: inline;"
                               onsubmit="return confirm('Delete {{ city.city_name }}?');">
@@ -515,6 +608,17 @@ ADMIN_TEMPLATE = """
                 {% endfor %}
             </tbody>
         </table>
+        <div class="pagination">
+            {% if listing.page > 1 %}
+                <a href="{{ page_url(page=1) }}">&laquo; First</a>
+                <a href="{{ page_url(page=listing.page - 1) }}">&lsaquo; Prev</a>
+            {% endif %}
+            <span>Page {{ listing.page }} of {{ listing.pages }}</span>
+            {% if listing.page < listing.pages %}
+                <a href="{{ page_url(page=listing.page + 1) }}">Next &rsaquo;</a>
+                <a href="{{ page_url(page=listing.pages) }}">Last &raquo;</a>
+            {% endif %}
+        </div>
     </div>
 </body>
 </html>
@@ -582,11 +686,46 @@ def get_current_weather_status(city):
         'current_age': age_text
     }
 
+# Number of forecast fetches a row holds, computed in SQL for stats and sorting
+FETCH_COUNT = (
+    case((WeatherCache.fetch_1_time.isnot(None), 1), else_=0)
+    + case((WeatherCache.fetch_2_time.isnot(None), 1), else_=0)
+    + case((WeatherCache.fetch_3_time.isnot(None), 1), else_=0)
+)
+
+SORT_COLUMNS = {
+    'name': WeatherCache.city_name,
+    'current': WeatherCache.current_weather_updated_at,
+    'forecast': FETCH_COUNT,
+    'updated': WeatherCache.updated_at,
+}
+
+def city_search_filter(query: str):
+    """Case-insensitive substring match on the city name"""
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return WeatherCache.city_name.ilike(f"%{escaped}%", escape='\\')
+
+def get_stats(db, search_filter=None):
+    """All dashboard counters in one aggregate query"""
+    # Current weather older than its cache TTL is shown as stale
+    fresh_since = datetime.now(timezone.utc) - CURRENT_WEATHER_TTL
+    row = db.query(
+        func.count().label('total_cities'),
+        func.count().filter(FETCH_COUNT >= 3).label('ready_cities'),
+        func.count().filter(and_(FETCH_COUNT > 0, FETCH_COUNT < 3)).label('partial_cities'),
+        func.count().filter(FETCH_COUNT == 0).label('new_cities'),
+        func.count().filter(WeatherCache.current_weather_updated_at >= fresh_since).label('fresh_current'),
+        # Rows matching the search, for pagination
+        (func.count().filter(search_filter) if search_filter is not None else func.count()).label('matching'),
+    ).one()
+
+    stats = dict(row._mapping)
+    stats['stale_current'] = stats['total_cities'] - stats['fresh_current']  # Stale or never fetched
+    return stats
+
 async def geocode_city(city_name: str):
     """Geocode city name to get coordinates"""
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    if not api_key:
-        raise ValueError("OPENWEATHER_API_KEY not set")
+    api_key = load_api_keys()[0]
 
     url = "https://api.openweathermap.org/geo/1.0/direct"
     params = {
@@ -639,12 +778,38 @@ def logout():
 @app.route('/')
 @login_required
 def index():
-    """Main admin page"""
+    """Main admin page: stats and one page of cities, filtered and sorted in SQL"""
+    search = request.args.get('q', '').strip()
+    sort = request.args.get('sort', 'name')
+    if sort not in SORT_COLUMNS:
+        sort = 'name'
+    direction = 'desc' if request.args.get('dir') == 'desc' else 'asc'
+    per_page = min(max(request.args.get('per_page', ADMIN_PAGE_SIZE, type=int), 1), ADMIN_MAX_PAGE_SIZE)
+    page = max(request.args.get('page', 1, type=int), 1)
+
     db = SessionLocal()
     try:
-        cities = db.query(WeatherCache).order_by(WeatherCache.city_name).all()
-
-        # Add status info to each city
+        search_filter = city_search_filter(search) if search else None
+        stats = get_stats(db, search_filter)
+        pages = max((stats['matching'] + per_page - 1) // per_page, 1)
+        page = min(page, pages)
+
+        sort_column = SORT_COLUMNS[sort]
+        order = sort_column.desc() if direction == 'desc' else sort_column.asc()
+
+        # Only the columns the page shows, not the JSON and response blobs
+        query = db.query(WeatherCache).options(load_only(
+            WeatherCache.id, WeatherCache.city_name, WeatherCache.latitude, WeatherCache.longitude,
+            WeatherCache.current_weather_updated_at, WeatherCache.updated_at,
+            WeatherCache.fetch_1_time, WeatherCache.fetch_2_time, WeatherCache.fetch_3_time
+        ))
+        if search_filter is not None:
+            query = query.filter(search_filter)
+        cities = query.order_by(
+            order.nullslast(), WeatherCache.city_name
+        ).offset((page - 1) * per_page).limit(per_page).all()
+
+        # Add status info to each city on the page
         cities_with_status = []
         for city in cities:
             city_dict = {
@@ -661,24 +826,21 @@ def index():
             city_dict.update(get_current_weather_status(city))
             cities_with_status.append(city_dict)
 
-        # Calculate stats
-        total_cities = len(cities)
-        ready_cities = sum(1 for c in cities_with_status if c['fetch_count'] >= 3)
-        partial_cities = sum(1 for c in cities_with_status if 0 < c['fetch_count'] < 3)
-        new_cities = sum(1 for c in cities_with_status if c['fetch_count'] == 0)
-        fresh_current = sum(1 for c in cities_with_status if c['current_status_class'] == 'fresh')
-        stale_current = sum(1 for c in cities_with_status if c['current_status_class'] in ['stale', 'expired'])
+        listing = {'q': search, 'sort': sort, 'dir': direction, 'per_page': per_page, 'page': page, 'pages': pages}
 
-        stats = {
-            'total_cities': total_cities,
-            'ready_cities': ready_cities,
-            'partial_cities': partial_cities,
-            'new_cities': new_cities,
-            'fresh_current': fresh_current,
-            'stale_current': stale_current
-        }
+        def page_url(**changes):
+            args = {**listing, **changes}
+            del args['pages']
+            if request.args.get('import'):
+                args['import'] = request.args['import']
+            if not args['q']:
+                del args['q']
+            return url_for('index', **args)
 
-        return render_template_string(ADMIN_TEMPLATE, cities=cities_with_status, stats=stats)
+        return render_template_string(
+            ADMIN_TEMPLATE, cities=cities_with_status, stats=stats, listing=listing, page_url=page_url,
+            import_id=request.args.get('import')
+        )
     finally:
         db.close()
 
@@ -709,7 +871,7 @@ def add_city():
             flash(f"City '{city_info['name']}' already exists in the cache", 'error')
             return redirect(url_for('index'))
 
-        # Add new city (empty cache, will be populated on first request or hourly fetch)
+        # Add new city; the API's refresh job workers warm its cache up within seconds
         new_city = WeatherCache(
             city_name=city_info['name'],
             latitude=city_info['lat'],
@@ -718,9 +880,10 @@ def add_city():
             aqi_data={}
         )
         db.add(new_city)
+        enqueue_refreshes(db, [city_info['name']], PRIORITY_USER)
         db.commit()
 
-        flash(f"Successfully added '{city_info['name']}'. Current weather will be fetched on first request. Forecast will be updated on the next hourly fetch.", 'success')
+        flash(f"Successfully added '{city_info['name']}'. Its current weather, forecast and AQI are being fetched now.", 'success')
         return redirect(url_for('index'))
 
     except ValueError as e:
@@ -732,6 +895,68 @@ def add_city():
     finally:
         db.close()
 
+def run_import_in_background(job: CityImport):
+    from .weather_service import WeatherService
+
+    try:
+        asyncio.run(run_import(job, SessionLocal, WeatherService()))
+    except Exception as e:
+        job.status = "failed"
+        job.errors.append(str(e))
+        job.duration = time.monotonic() - job.started
+
+@app.route('/import', methods=['POST'])
+@login_required
+def import_cities():
+    """Start a bulk import from an uploaded CSV/JSON file; progress is polled from the index page"""
+    upload = request.files.get('cities_file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV or JSON file to import', 'error')
+        return redirect(url_for('index'))
+
+    try:
+        entries = parse_import(upload.filename, upload.read())
+    except ValueError as e:
+        flash(f"Can't import {upload.filename}: {e}", 'error')
+        return redirect(url_for('index'))
+    if not entries:
+        flash(f"No cities found in {upload.filename}", 'error')
+        return redirect(url_for('index'))
+
+    job = CityImport(entries, warm=bool(request.form.get('warm')))
+    prune_imports(city_imports)
+    city_imports[job.id] = job
+    threading.Thread(target=run_import_in_background, args=(job,), name=f"import-{job.id}", daemon=True).start()
+
+    flash(f"Importing {len(entries)} cities from {upload.filename}", 'success')
+    return redirect(url_for('index', **{'import': job.id}))
+
+@app.route('/import/<import_id>')
+@login_required
+def import_progress(import_id):
+    """Progress of a bulk import as JSON"""
+    job = city_imports.get(import_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.progress())
+
+@app.route('/refresh/<int:city_id>', methods=['POST'])
+@login_required
+def refresh_city(city_id):
+    """Queue a forecast refresh for a city ahead of scheduled ones"""
+    db = SessionLocal()
+    try:
+        city = db.query(WeatherCache).filter(WeatherCache.id == city_id).first()
+        if city:
+            enqueue_refreshes(db, [city.city_name], PRIORITY_USER)
+            db.commit()
+            flash(f"Queued a forecast refresh for '{city.city_name}'", 'success')
+        else:
+            flash('City not found', 'error')
+        return redirect(url_for('index'))
+    finally:
+        db.close()
+
 @app.route('/delete/<int:city_id>', methods=['POST'])
 @login_required
 def delete_city(city_id):
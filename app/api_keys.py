@@ -0,0 +1,117 @@
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import API_KEY_REQUESTS, API_KEY_COOLING
+
+# Each key's quota (calls per minute); keys at their quota are only used when all are
+OPENWEATHER_KEY_CALLS_PER_MINUTE = int(os.getenv("OPENWEATHER_KEY_CALLS_PER_MINUTE", "60"))
+
+# How long a key sits out after HTTP 429 (unless Retry-After says otherwise) or 401
+API_KEY_THROTTLED_COOLDOWN = float(os.getenv("API_KEY_THROTTLED_COOLDOWN", "60"))
+API_KEY_INVALID_COOLDOWN = float(os.getenv("API_KEY_INVALID_COOLDOWN", "3600"))
+
+
+def load_api_keys() -> List[str]:
+    """OPENWEATHER_API_KEYS (comma-separated), else the single OPENWEATHER_API_KEY"""
+    keys = [key.strip() for key in os.getenv("OPENWEATHER_API_KEYS", "").split(",") if key.strip()]
+    if not keys and os.getenv("OPENWEATHER_API_KEY"):
+        keys = [os.getenv("OPENWEATHER_API_KEY")]
+    if not keys:
+        raise ValueError("OPENWEATHER_API_KEY (or OPENWEATHER_API_KEYS) environment variable is required")
+    return list(dict.fromkeys(keys))
+
+
+def key_label(key: str, index: int) -> str:
+    """
+    Identifies a key in logs and metrics without revealing it: its position in
+    the pool (unique even if two keys end alike) and its last 4 characters
+    """
+    return f"{index}:...{key[-4:]}"
+
+
+class ApiKey:
+    def __init__(self, key: str, index: int):
+        self.key = key
+        self.label = key_label(key, index)
+        self.in_flight = 0
+        self.window_start = 0.0  # Start of the current one-minute accounting window
+        self.window_calls = 0
+        self.cooling_until = 0.0
+
+    def calls_this_minute(self, now: float) -> int:
+        return self.window_calls if now - self.window_start < 60 else 0
+
+
+class ApiKeyPool:
+    """
+    OpenWeather API keys with per-key call accounting. Each call takes the
+    least-loaded key (fewest calls this minute, then fewest in flight, then
+    round-robin). Keys that get HTTP 429 or 401 cool off for a while, so
+    throughput scales with the number of keys.
+    """
+
+    def __init__(self, keys: List[str], calls_per_minute: int = OPENWEATHER_KEY_CALLS_PER_MINUTE):
+        if not keys:
+            raise ValueError("At least one API key is required")
+        self.keys = [ApiKey(key, index) for index, key in enumerate(keys)]
+        self.calls_per_minute = calls_per_minute
+        self._next = 0
+        for key in self.keys:
+            API_KEY_COOLING.labels(key.label).set_function(lambda key=key: float(key.cooling_until > time.monotonic()))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def acquire(self, exclude: Tuple[str, ...] = ()) -> Optional[ApiKey]:
+        """
+        Key for the next call, counted against its quota; release() it after the call.
+        Cooling keys are skipped unless every key is cooling (then the one that recovers
+        first is used). Returns None if all keys are excluded.
+        """
+        now = time.monotonic()
+        candidates = [key for key in self.keys if key.key not in exclude]
+        if not candidates:
+            return None
+
+        ready = [key for key in candidates if key.cooling_until <= now] or [
+            min(candidates, key=lambda key: key.cooling_until)
+        ]
+        under_quota = [key for key in ready if key.calls_this_minute(now) < self.calls_per_minute] or ready
+
+        # Round-robin among equally loaded keys
+        self._next = (self._next + 1) % len(self.keys)
+        order = {id(key): (index - self._next) % len(self.keys) for index, key in enumerate(self.keys)}
+        key = min(under_quota, key=lambda key: (key.calls_this_minute(now), key.in_flight, order[id(key)]))
+
+        if now - key.window_start >= 60:
+            key.window_start = now
+            key.window_calls = 0
+        key.window_calls += 1
+        key.in_flight += 1
+        return key
+
+    def release(self, key: ApiKey, status: str, retry_after: Optional[float] = None):
+        """Record a call's outcome (HTTP status or "error"); 429 and 401 start a cool-off"""
+        key.in_flight -= 1
+        API_KEY_REQUESTS.labels(key.label, status).inc()
+        if status == "429":
+            key.cooling_until = time.monotonic() + (retry_after or API_KEY_THROTTLED_COOLDOWN)
+        elif status == "401":
+            key.cooling_until = time.monotonic() + API_KEY_INVALID_COOLDOWN
+
+    def available(self, exclude: Tuple[str, ...] = ()) -> bool:
+        """Whether a key outside `exclude` is not cooling off"""
+        now = time.monotonic()
+        return any(key.cooling_until <= now for key in self.keys if key.key not in exclude)
+
+
+_pools: Dict[Tuple[str, ...], ApiKeyPool] = {}
+
+
+def shared_key_pool() -> ApiKeyPool:
+    """The process-wide pool for the configured keys, so all WeatherService instances share the accounting"""
+    keys = tuple(load_api_keys())
+    if keys not in _pools:
+        _pools[keys] = ApiKeyPool(list(keys))
+    return _pools[keys]
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .database import AqiTile
+from .schemas import AQIData
+from .weather_service import WeatherService
+from .metrics import AQI_TILE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Air quality is shared by all cities in a geohash cell of this precision
+# (5: ~4.9 x 4.9 km, 4: ~39 x 20 km, 6: ~1.2 x 0.6 km)
+AQI_TILE_PRECISION = int(os.getenv("AQI_TILE_PRECISION", "5"))
+
+# A tile's AQI is fetched at most once per this interval (OpenWeather updates it hourly)
+AQI_TILE_TTL = timedelta(minutes=int(os.getenv("AQI_TILE_TTL_MINUTES", "60")))
+
+# Tiles kept in memory per worker, in front of the aqi_tiles table
+AQI_TILE_CACHE_SIZE = int(os.getenv("AQI_TILE_CACHE_SIZE", "10000"))
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int = AQI_TILE_PRECISION) -> str:
+    """Geohash of a point (bits alternate longitude/latitude, 5 per character)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_center(geohash: str) -> Tuple[float, float]:
+    """(lat, lon) of the center of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+class AqiTileCache:
+    """
+    AQI per geohash tile, fetched at the tile's center and shared by every city
+    in it, so dense areas cost one AQI call per tile and interval instead of
+    one per city. Tiles live in the aqi_tiles table (shared by all instances)
+    with an LRU in memory in front of it; concurrent misses for a tile in this
+    process wait on a single upstream call.
+    """
+
+    def __init__(self, precision: int = AQI_TILE_PRECISION, ttl: timedelta = AQI_TILE_TTL,
+                 max_size: int = AQI_TILE_CACHE_SIZE):
+        self.precision = precision
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[datetime, AQIData]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def clear(self):
+        self._entries.clear()
+
+    def _remember(self, geohash: str, fetched_at: datetime, aqi: AQIData):
+        self._entries[geohash] = (fetched_at, aqi)
+        self._entries.move_to_end(geohash)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _fresh(self, geohash: str, db: Session, now: datetime) -> Optional[AQIData]:
+        cached = self._entries.get(geohash)
+        if cached is not None and now - cached[0] < self.ttl:
+            self._entries.move_to_end(geohash)
+            AQI_TILE_LOOKUPS.labels("memory").inc()
+            return cached[1]
+
+        tile = db.get(AqiTile, geohash)
+        if tile is not None and now - tile.fetched_at < self.ttl:
+            aqi = AQIData.construct(**tile.aqi_data)
+            self._remember(geohash, tile.fetched_at, aqi)
+            AQI_TILE_LOOKUPS.labels("database").inc()
+            return aqi
+        return None
+
+    async def get(self, db: Session, weather_service: WeatherService, lat: float, lon: float,
+                  now: Optional[datetime] = None) -> AQIData:
+        """
+        AQI for a location, from its tile if fetched within the TTL. A fetched
+        tile is upserted on `db`; the caller commits.
+        """
+        now = now or datetime.now(timezone.utc)
+        geohash = geohash_encode(lat, lon, self.precision)
+        aqi = self._fresh(geohash, db, now)
+        if aqi is not None:
+            return aqi
+
+        in_flight = self._in_flight.get(geohash)
+        if in_flight is not None:
+            AQI_TILE_LOOKUPS.labels("shared").inc()
+            return await asyncio.shield(in_flight)
+
+        AQI_TILE_LOOKUPS.labels("miss").inc()
+        center_lat, center_lon = geohash_center(geohash)
+        fetch = asyncio.ensure_future(weather_service.fetch_air_pollution(center_lat, center_lon))
+        self._in_flight[geohash] = fetch
+        try:
+            aqi = await asyncio.shield(fetch)
+        finally:
+            self._in_flight.pop(geohash, None)
+
+        self._remember(geohash, now, aqi)
+        self._store(db, geohash, aqi, now)
+        logger.info(f"Fetched AQI for tile {geohash}")
+        return aqi
+
+    def _store(self, db: Session, geohash: str, aqi: AQIData, now: datetime):
+        table = AqiTile.__table__
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(table).values(geohash=geohash, aqi_data=aqi.dict(), fetched_at=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.geohash],
+            set_={"aqi_data": statement.excluded.aqi_data, "fetched_at": statement.excluded.fetched_at}
+        )
+        db.execute(statement)
+
+
+aqi_tiles = AqiTileCache()
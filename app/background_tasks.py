@@ -1,125 +1,554 @@
 import asyncio
+import functools
 import logging
-from datetime import datetime, timezone
+import os
+import time
+import httpx
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import or_, select
 from sqlalchemy.orm import Session
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
-from .database import SessionLocal, WeatherCache
+from .database import SessionLocal, WeatherCache, RefreshJob, engine, FORECAST_LIVE_GRACE_SECONDS, CURRENT_WEATHER_TTL
 from .weather_service import WeatherService
+from .responses import materialize_response_async
+from .aqi_tiles import aqi_tiles
+from .cache_updates import apply_forecast, apply_current_weather, build_forecast, backfill_fetch_history
+from .pubsub import weather_hub, notify_updates
+from .rate_limit import AdaptiveConcurrencyLimiter, retry_after_seconds
+from .leader import LeaderElection, LEADER_CHECK_SECONDS
+from .executor import shutdown_executor
+from .query_stats import count_queries
+from .job_queue import (
+    enqueue_refreshes, claim_jobs, complete_jobs, fail_job, PRIORITY_SCHEDULED, PRIORITY_CATCH_UP
+)
+from .popularity import (
+    access_tracker, current_slot_starts, due_refresh_filter, decay_and_evict, last_activity, refresh_lag_by_tier,
+    HOT_WINDOW_HOURS
+)
+from .metrics import REFRESH_CITIES, REFRESH_RUN_SECONDS, REFRESH_LAG_SECONDS, REFRESH_QUEUE_DEPTH
 
 logger = logging.getLogger(__name__)
 
+# Worker pool for the hourly forecast refresh
+REFRESH_MIN_CONCURRENCY = int(os.getenv("REFRESH_MIN_CONCURRENCY", "2"))
+REFRESH_MAX_CONCURRENCY = int(os.getenv("REFRESH_MAX_CONCURRENCY", "50"))
+REFRESH_INITIAL_CONCURRENCY = int(os.getenv("REFRESH_INITIAL_CONCURRENCY", "5"))
+REFRESH_TARGET_LATENCY = float(os.getenv("REFRESH_TARGET_LATENCY", "2.0"))  # seconds per city
+REFRESH_MAX_RETRIES = int(os.getenv("REFRESH_MAX_RETRIES", "2"))  # re-queues after a 429
+REFRESH_PROGRESS_SECONDS = float(os.getenv("REFRESH_PROGRESS_SECONDS", "30"))
+
+# Refresh job consumers (run on every instance)
+REFRESH_JOB_POLL_SECONDS = int(os.getenv("REFRESH_JOB_POLL_SECONDS", "5"))
+REFRESH_JOB_BATCH = int(os.getenv("REFRESH_JOB_BATCH", "100"))  # jobs claimed at once
+
+# Refresh-ahead of current weather for the most popular cities
+PREWARM_TOP_K = int(os.getenv("PREWARM_TOP_K", "100"))
+PREWARM_LEAD_SECONDS = int(os.getenv("PREWARM_LEAD_SECONDS", "120"))  # before the 15-minute expiry
+PREWARM_MAX_PER_RUN = int(os.getenv("PREWARM_MAX_PER_RUN", "30"))  # upstream calls per minute
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "5"))
+
 class WeatherBackgroundTask:
     def __init__(self):
         self.weather_service = WeatherService()
         self.scheduler = AsyncIOScheduler()
+        self.leader = LeaderElection(engine)
 
-    async def fetch_city_forecast(self, city_name: str, lat: float, lon: float, db: Session):
-        """Fetch forecast data for a single city (hourly background task)"""
+    async def fetch_city_forecast(
+        self,
+        city_name: str,
+        lat: float,
+        lon: float,
+        db: Session,
+        cache_entry: Optional[WeatherCache] = None
+    ):
+        """
+        Fetch forecast data for a single city (hourly background task); cache_entry if already loaded.
+        Cities never fetched before (added in the admin panel) get a full warm-up instead.
+        """
         try:
-            logger.info(f"Background forecast fetch for {city_name} started")
-
-            # Fetch forecast and AQI only (current weather is on-demand)
-            forecast_data = await self.weather_service.fetch_forecast(lat, lon)
-            aqi_data = await self.weather_service.fetch_air_pollution(lat, lon)
-
             # Get cache entry
-            cache_entry = db.query(WeatherCache).filter(
-                WeatherCache.city_name == city_name
-            ).first()
+            if cache_entry is None:
+                cache_entry = db.query(WeatherCache).filter(
+                    WeatherCache.city_name == city_name
+                ).first()
 
             if not cache_entry:
                 logger.warning(f"Cache entry not found for {city_name}, skipping")
                 return
 
+            if cache_entry.fetch_1_time is None:
+                await self.warm_up_city(cache_entry, db)
+                return
+
+            logger.info(f"Background forecast fetch for {city_name} started")
+
+            # Fetch forecast and AQI only (current weather is on-demand); AQI is shared per tile
+            forecast_data = await self.weather_service.fetch_forecast(lat, lon)
+            aqi_data = await aqi_tiles.get(db, self.weather_service, lat, lon)
+
+            # Built off the event loop; live requests keep being served during the refresh
+            built = await build_forecast(cache_entry, forecast_data)
+
             now = datetime.now(timezone.utc)
-            current_time = now.replace(minute=0, second=0, microsecond=0)
-
-            # Rotate the fetches
-            cache_entry.fetch_3_data = cache_entry.fetch_2_data
-            cache_entry.fetch_3_time = cache_entry.fetch_2_time
-            cache_entry.fetch_2_data = cache_entry.fetch_1_data
-            cache_entry.fetch_2_time = cache_entry.fetch_1_time
-            cache_entry.fetch_1_data = forecast_data
-            cache_entry.fetch_1_time = current_time
-
-            cache_entry.aqi_data = aqi_data.dict()
-            cache_entry.updated_at = current_time
-
-            # Build hourly and daily forecasts from the 3 fetches
-            fetch_data_list = [
-                cache_entry.fetch_1_data,
-                cache_entry.fetch_2_data,
-                cache_entry.fetch_3_data
-            ]
-            cache_entry.hourly_forecast = [
-                h.dict() for h in self.weather_service.build_hourly_forecast(fetch_data_list)
-            ]
-            cache_entry.daily_forecast = [
-                d.dict() for d in self.weather_service.build_daily_forecast(forecast_data)
-            ]
+            slot_start = cache_entry.current_slot_start(now)
+
+            # Rotate the fetches and rebuild hourly/daily forecasts from the 3 fetches.
+            # updated_at is the exact refresh time so it never goes backwards after an
+            # on-demand refresh earlier in the hour (delta sync compares against it).
+            if not apply_forecast(cache_entry, forecast_data, aqi_data, slot_start, now, built):
+                # Same forecast and AQI as last hour: only the fetch time changed
+                db.commit()
+                logger.info(f"Background forecast fetch for {city_name} completed, data unchanged")
+                return
 
+            await materialize_response_async(cache_entry)
+            notify_updates(db, [city_name])
             db.commit()
+            weather_hub.publish(city_name, cache_entry.response_json)
             logger.info(f"Background forecast fetch for {city_name} completed successfully")
 
         except Exception as e:
             logger.error(f"Error fetching forecast for {city_name}: {e}", exc_info=True)
             db.rollback()
+            raise
+
+    async def warm_up_city(self, cache_entry: WeatherCache, db: Session):
+        """
+        First fetch of a new city: current weather, forecast and AQI at once, with
+        the forecast fetch history backfilled, so its first request is served from cache
+        """
+        city_name = cache_entry.city_name
+        logger.info(f"Warming up cache for new city {city_name}")
+        (current_weather, openweather_id), forecast_data, aqi_data = await asyncio.gather(
+            self.weather_service.fetch_current_weather_with_id(cache_entry.latitude, cache_entry.longitude),
+            self.weather_service.fetch_forecast(cache_entry.latitude, cache_entry.longitude),
+            aqi_tiles.get(db, self.weather_service, cache_entry.latitude, cache_entry.longitude)
+        )
+        built = await build_forecast(cache_entry, forecast_data)
+
+        now = datetime.now(timezone.utc)
+        apply_current_weather(cache_entry, current_weather, now, openweather_id)
+        apply_forecast(
+            cache_entry, forecast_data, aqi_data, cache_entry.current_slot_start(now), now, built
+        )
+        backfill_fetch_history(cache_entry)
+
+        await materialize_response_async(cache_entry)
+        notify_updates(db, [city_name])
+        db.commit()
+        weather_hub.publish(city_name, cache_entry.response_json)
+        logger.info(f"Cache for {city_name} warmed up")
+
+    async def refresh_city(self, city_name: str, lat: float, lon: float, entry: Optional[WeatherCache] = None):
+        """fetch_city_forecast in a session of its own; a preloaded entry is attached without a query"""
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            if entry is not None:
+                entry = db.merge(entry, load=False)
+            await self.fetch_city_forecast(city_name, lat, lon, db, entry)
+        finally:
+            db.close()
+
+    async def refresh_cities(
+        self,
+        cities: List[Tuple[str, float, float]],
+        entries: Optional[Dict[str, WeatherCache]] = None
+    ) -> Dict[str, Any]:
+        """
+        Refresh forecasts for the given (city_name, lat, lon) list with a worker pool.
+        `entries` are the cities' rows if the caller loaded them already (saves a query per city).
+
+        Every city is refreshed and committed in its own session, so a failed
+        city's rollback can't discard another city's changes (or AQI tiles) and
+        a commit never flushes a city that is still half-applied.
+
+        Workers pull cities from a queue and run through an adaptive concurrency
+        limiter, so one slow city only occupies one slot and the pool speeds up
+        or backs off with upstream latency and 429 responses. Throttled cities
+        are re-queued up to REFRESH_MAX_RETRIES times.
+        """
+        started = time.monotonic()
+        limiter = AdaptiveConcurrencyLimiter(
+            min_limit=REFRESH_MIN_CONCURRENCY,
+            max_limit=REFRESH_MAX_CONCURRENCY,
+            initial_limit=REFRESH_INITIAL_CONCURRENCY,
+            target_latency=REFRESH_TARGET_LATENCY
+        )
+        queue: asyncio.Queue = asyncio.Queue()
+        for city in cities:
+            queue.put_nowait((city, 0))
+
+        stats = {"total": len(cities), "done": 0, "failed": 0, "throttled": 0, "errors": {}}
+        last_report = started
+
+        async def worker():
+            nonlocal last_report
+            while True:
+                try:
+                    (city_name, lat, lon), attempt = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
 
-    async def fetch_all_cities(self):
-        """Fetch forecasts for all cities in the database (hourly)"""
+                async with limiter.slot():
+                    request_started = time.monotonic()
+                    try:
+                        await self.refresh_city(city_name, lat, lon, (entries or {}).get(city_name))
+                        limiter.record_success(time.monotonic() - request_started)
+                        stats["done"] += 1
+                    except httpx.HTTPStatusError as e:
+                        if e.response.status_code == 429:
+                            stats["throttled"] += 1
+                            limiter.record_throttled(retry_after_seconds(e.response))
+                            if attempt < REFRESH_MAX_RETRIES:
+                                queue.put_nowait(((city_name, lat, lon), attempt + 1))
+                                continue
+                        else:
+                            limiter.record_failure()
+                        stats["failed"] += 1
+                        stats["errors"][city_name] = str(e)
+                    except Exception as e:
+                        limiter.record_failure()
+                        stats["failed"] += 1
+                        stats["errors"][city_name] = str(e) or type(e).__name__
+
+                now = time.monotonic()
+                if now - last_report >= REFRESH_PROGRESS_SECONDS:
+                    last_report = now
+                    logger.info(
+                        f"Forecast refresh progress: {stats['done'] + stats['failed']}/{stats['total']} "
+                        f"({stats['failed']} failed, {stats['throttled']} throttled), "
+                        f"concurrency {limiter.current_limit}, {now - started:.0f}s elapsed"
+                    )
+
+        await asyncio.gather(*(worker() for _ in range(min(REFRESH_MAX_CONCURRENCY, len(cities)))))
+
+        stats["duration"] = time.monotonic() - started
+        for result in ("done", "failed", "throttled"):
+            REFRESH_CITIES.labels(result).inc(stats[result])
+        REFRESH_RUN_SECONDS.observe(stats["duration"])
+        stats["concurrency"] = limiter.current_limit
+        return stats
+
+    async def fetch_due_cities(self):
+        """
+        Queue refreshes for the cities whose current slot passed without one (runs every minute).
+
+        Each city has a fixed slot in the hour (WeatherCache.refresh_offset), so the
+        hourly refresh is spread evenly instead of hitting upstream at minute 0.
+        Every run looks at all slots, not just the last minute's, so a skipped tick
+        or a stretch without a leader is made up by the next run. Slots that started
+        within FORECAST_LIVE_GRACE_SECONDS are queued ahead of older ones.
+        The refreshes themselves run from the job queue (process_refresh_jobs).
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.now(timezone.utc)
+            slot_starts = current_slot_starts(now)
+
+            # Cities with a pending job are already on their way
+            due = db.query(WeatherCache.city_name, WeatherCache.refresh_offset).filter(
+                due_refresh_filter(now, slot_starts),
+                WeatherCache.city_name.notin_(select(RefreshJob.city_name))
+            ).all()
+
+            on_time_since = now - timedelta(seconds=FORECAST_LIVE_GRACE_SECONDS)
+            on_time, late = [], []
+            for city_name, refresh_offset in due:
+                (on_time if slot_starts[refresh_offset // 60] >= on_time_since else late).append(city_name)
+            queued = enqueue_refreshes(db, on_time, PRIORITY_SCHEDULED, now)
+            queued += enqueue_refreshes(db, late, PRIORITY_CATCH_UP, now)
+
+            db.commit()
+            if queued:
+                logger.info(f"Queued forecast refresh for {queued} cities ({len(late)} past their slot)")
+
+        except Exception as e:
+            logger.error(f"Error in fetch_due_cities: {e}", exc_info=True)
+            db.rollback()
+        finally:
+            db.close()
+
+    async def process_refresh_jobs(self):
+        """
+        Run due refresh jobs through the worker pool (every REFRESH_JOB_POLL_SECONDS).
+
+        Runs on every instance: jobs are claimed with SKIP LOCKED, so instances
+        split the queue between them. Failed jobs are retried with backoff and
+        jobs of a crashed worker are picked up again once their lease expires.
+        """
         db = SessionLocal()
         try:
-            # Get all cities
-            cities = db.query(WeatherCache).all()
-            logger.info(f"Starting background forecast fetch for {len(cities)} cities")
-
-            # Fetch forecast for each city
-            tasks = []
-            for city in cities:
-                task = self.fetch_city_forecast(
-                    city.city_name,
-                    city.latitude,
-                    city.longitude,
-                    db
+            while True:
+                jobs = claim_jobs(db, REFRESH_JOB_BATCH)
+                if not jobs:
+                    return
+
+                # One scope for the whole batch, so per-city reloads show up as repeats
+                with count_queries(f"refresh jobs ({len(jobs)} cities)", items=len(jobs)) as queries:
+                    # All rows in one query instead of one per city; cities commit in their own
+                    # sessions (refresh_city), so these rows aren't expired under the workers
+                    names = [city_name for _, city_name, _ in jobs]
+                    entries = {
+                        entry.city_name: entry
+                        for entry in db.query(WeatherCache).filter(WeatherCache.city_name.in_(names))
+                    }
+                    cities = [(entry.city_name, entry.latitude, entry.longitude) for entry in entries.values()]
+
+                    stats = await self.refresh_cities(cities, entries)
+
+                    # Jobs of evicted cities are simply dropped
+                    completed = []
+                    for job_id, city_name, attempt in jobs:
+                        if city_name in stats["errors"]:
+                            fail_job(db, job_id, city_name, attempt, stats["errors"][city_name])
+                        else:
+                            completed.append(job_id)
+                    complete_jobs(db, completed)
+                    db.commit()
+
+                logger.info(
+                    f"Refresh jobs completed: {stats['done']}/{len(jobs)} succeeded, "
+                    f"{stats['failed']} failed, {stats['throttled']} throttled, "
+                    f"concurrency {stats['concurrency']}, {queries.count} statements, "
+                    f"took {stats['duration']:.1f}s"
                 )
-                tasks.append(task)
 
-            # Run all fetches concurrently (with some rate limiting)
-            # Process in batches of 5 to avoid overwhelming the API
-            batch_size = 5
-            for i in range(0, len(tasks), batch_size):
-                batch = tasks[i:i + batch_size]
-                await asyncio.gather(*batch, return_exceptions=True)
-                # Small delay between batches
-                if i + batch_size < len(tasks):
-                    await asyncio.sleep(2)
+        except Exception as e:
+            logger.error(f"Error in process_refresh_jobs: {e}", exc_info=True)
+            db.rollback()
+        finally:
+            db.close()
 
-            logger.info("Background forecast fetch completed for all cities")
+    async def prewarm_current_weather(self):
+        """
+        Refresh-ahead for the most requested cities (every minute).
 
+        Current weather of the PREWARM_TOP_K most popular hot cities is refreshed
+        PREWARM_LEAD_SECONDS before its 15-minute expiry, so those cities never
+        make a live request wait on OpenWeather. At most PREWARM_MAX_PER_RUN
+        cities per run keep it within the API budget; cities with a known
+        OpenWeather id are fetched 20 at a time through the group endpoint.
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.now(timezone.utc)
+            expires_soon = now - CURRENT_WEATHER_TTL + timedelta(seconds=PREWARM_LEAD_SECONDS)
+
+            top_cities = db.query(WeatherCache.id).filter(
+                WeatherCache.access_count > 0,
+                last_activity() >= now - timedelta(hours=HOT_WINDOW_HOURS)
+            ).order_by(WeatherCache.access_count.desc()).limit(PREWARM_TOP_K).subquery()
+
+            cities = db.query(WeatherCache).filter(
+                WeatherCache.id.in_(select(top_cities.c.id)),
+                or_(
+                    WeatherCache.current_weather_updated_at.is_(None),
+                    WeatherCache.current_weather_updated_at < expires_soon
+                )
+            ).order_by(WeatherCache.current_weather_updated_at).limit(PREWARM_MAX_PER_RUN).all()
+            if not cities:
+                return
+
+            # Cities with a known OpenWeather id go through the group endpoint (20 per call)
+            grouped: Dict[int, Any] = {}
+            group_ids = [city.openweather_id for city in cities if city.openweather_id]
+            if group_ids:
+                try:
+                    grouped = await self.weather_service.fetch_current_weather_many(group_ids)
+                except Exception as e:
+                    logger.warning(f"Group current weather fetch failed, falling back to per-city: {e}")
+
+            semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+
+            async def fetch(city: WeatherCache):
+                if city.openweather_id in grouped:
+                    return grouped[city.openweather_id], None
+                async with semaphore:
+                    return await self.weather_service.fetch_current_weather_with_id(city.latitude, city.longitude)
+
+            results = await asyncio.gather(*(fetch(city) for city in cities), return_exceptions=True)
+
+            refreshed = []
+            fetched_at = datetime.now(timezone.utc)
+            for city, result in zip(cities, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error prewarming current weather for {city.city_name}: {result}")
+                    continue
+                current_weather, openweather_id = result
+                apply_current_weather(city, current_weather, fetched_at, openweather_id)
+                await materialize_response_async(city)
+                refreshed.append(city)
+
+            notify_updates(db, [city.city_name for city in refreshed])
+            db.commit()
+            for city in refreshed:
+                weather_hub.publish(city.city_name, city.response_json)
+            logger.info(f"Prewarmed current weather for {len(refreshed)}/{len(cities)} popular cities")
+
+        except Exception as e:
+            logger.error(f"Error in prewarm_current_weather: {e}", exc_info=True)
+            db.rollback()
+        finally:
+            db.close()
+
+    async def update_refresh_metrics(self):
+        """Refresh lag per tier and queue depth gauges (every minute)"""
+        db = SessionLocal()
+        try:
+            for tier, lag in refresh_lag_by_tier(db).items():
+                REFRESH_LAG_SECONDS.labels(tier).set(lag)
+            REFRESH_QUEUE_DEPTH.set(db.query(RefreshJob).count())
+        except Exception as e:
+            logger.error(f"Error updating refresh metrics: {e}", exc_info=True)
+        finally:
+            db.close()
+
+    async def flush_access_counts(self):
+        """Write batched per-city request counts (every minute)"""
+        db = SessionLocal()
+        try:
+            # Cities with live subscribers stay hot while anyone is listening
+            for city_name in list(weather_hub.subscribers):
+                access_tracker.record(city_name)
+            access_tracker.flush(db)
+        except Exception as e:
+            logger.error(f"Error flushing access counts: {e}", exc_info=True)
+        finally:
+            db.close()
+
+    async def evict_cold_cities(self):
+        """Decay popularity and delete cities nobody requested for EVICT_AFTER_DAYS (daily)"""
+        db = SessionLocal()
+        try:
+            evicted = decay_and_evict(db)
+            logger.info(f"Evicted {evicted} cold cities")
         except Exception as e:
-            logger.error(f"Error in fetch_all_cities: {e}", exc_info=True)
+            logger.error(f"Error evicting cold cities: {e}", exc_info=True)
+            db.rollback()
         finally:
             db.close()
 
+    async def check_leadership(self):
+        """Keep or take over scheduler leadership (every LEADER_CHECK_SECONDS)"""
+        self.leader.check()
+
+    def leader_only(self, job):
+        """Wrap a job so it only runs on the elected leader instance"""
+        @functools.wraps(job)
+        async def run():
+            if self.leader.is_leader:
+                await job()
+        return run
+
+    def counted(self, job):
+        """Wrap a job to count its statements (warns on N+1 patterns)"""
+        @functools.wraps(job)
+        async def run():
+            with count_queries(f"job {job.__name__}"):
+                await job()
+        return run
+
     def start(self):
-        """Start the background scheduler"""
-        # Run at the start of every hour (e.g., 00:00, 01:00, 02:00)
+        """
+        Start the background scheduler.
+
+        Every worker and replica runs the scheduler, but scheduling, prewarm and
+        eviction only run on the leader (see LeaderElection), so adding instances
+        does not multiply upstream calls. Queued refresh jobs are consumed and
+        access counts flushed everywhere.
+        """
+        self.leader.check()
         self.scheduler.add_job(
-            self.fetch_all_cities,
-            CronTrigger(minute=0),  # Run at minute 0 of every hour
+            self.counted(self.check_leadership),
+            IntervalTrigger(seconds=LEADER_CHECK_SECONDS),
+            id='check_leadership',
+            name='Keep or take over scheduler leadership',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+        # Every minute, queue the cities whose hourly slot passed without a refresh
+        self.scheduler.add_job(
+            self.counted(self.leader_only(self.fetch_due_cities)),
+            CronTrigger(minute='*'),
             id='fetch_forecasts',
-            name='Fetch forecasts for all cities',
+            name='Queue forecast refreshes for cities past their slot',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+        self.scheduler.add_job(
+            self.counted(self.process_refresh_jobs),
+            IntervalTrigger(seconds=REFRESH_JOB_POLL_SECONDS),
+            id='process_refresh_jobs',
+            name='Run queued forecast refreshes',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+        self.scheduler.add_job(
+            self.counted(self.leader_only(self.prewarm_current_weather)),
+            IntervalTrigger(minutes=1),
+            id='prewarm_current_weather',
+            name='Refresh current weather ahead of expiry for popular cities',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+        self.scheduler.add_job(
+            self.counted(self.update_refresh_metrics),
+            IntervalTrigger(minutes=1),
+            id='update_refresh_metrics',
+            name='Update refresh lag and queue depth metrics',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+        self.scheduler.add_job(
+            self.counted(self.flush_access_counts),
+            IntervalTrigger(minutes=1),
+            id='flush_access_counts',
+            name='Flush batched city access counts',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+        self.scheduler.add_job(
+            self.counted(self.leader_only(self.evict_cold_cities)),
+            CronTrigger(hour=3, minute=30),
+            id='evict_cold_cities',
+            name='Decay popularity and evict cold cities',
             replace_existing=True
         )
 
         self.scheduler.start()
-        logger.info("Background scheduler started - will fetch forecasts hourly")
+        role = "leader" if self.leader.is_leader else "follower"
+        logger.info(f"Background scheduler started as {role} - will fetch forecasts in staggered hourly slots")
 
     def stop(self):
         """Stop the background scheduler"""
         self.scheduler.shutdown()
+        self.leader.release()
+        shutdown_executor()
+
+        # Don't lose the last minute of access counts
+        db = SessionLocal()
+        try:
+            access_tracker.flush(db)
+        except Exception as e:
+            logger.error(f"Error flushing access counts: {e}", exc_info=True)
+        finally:
+            db.close()
         logger.info("Background scheduler stopped")
 
 # Global instance
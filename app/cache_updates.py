@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import logging
+import orjson
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified
+
+from .database import WeatherCache, FORECAST_LIVE_GRACE_SECONDS, refresh_offset_for
+from .schemas import WeatherData, AQIData
+from .weather_service import WeatherService, build_forecasts
+from .executor import forecast_builder
+from .timing import phase
+from .metrics import CACHE_LOOKUPS
+from .responses import materialize_response_async
+from .aqi_tiles import aqi_tiles
+
+logger = logging.getLogger(__name__)
+
+
+def stamp_entries(entries: List[Dict[str, Any]], old_entries: Optional[List[Dict[str, Any]]],
+                  old_stamps: Optional[Dict[str, float]], stamp: float, key: str) -> Dict[str, float]:
+    """
+    Version stamps per forecast entry, keyed by str(entry[key]).
+    Entries that are new or differ from the previous build get the new stamp,
+    unchanged ones keep theirs (so delta sync can skip them).
+    """
+    old_by_key = {str(entry[key]): entry for entry in old_entries or []}
+    old_stamps = old_stamps or {}
+    stamps = {}
+    for entry in entries:
+        entry_key = str(entry[key])
+        if entry_key in old_stamps and old_by_key.get(entry_key) == entry:
+            stamps[entry_key] = old_stamps[entry_key]
+        else:
+            stamps[entry_key] = stamp
+    return stamps
+
+
+def apply_current_weather(
+    cache_entry: WeatherCache,
+    current_weather: WeatherData,
+    now: datetime,
+    openweather_id: Optional[int] = None
+):
+    """Store freshly fetched current weather (15-minute cache)"""
+    if openweather_id:
+        cache_entry.openweather_id = openweather_id
+    cache_entry.current_weather = current_weather.dict()
+    cache_entry.current_weather_updated_at = now  # NOT rounded
+    cache_entry.updated_at = now
+
+    versions = dict(cache_entry.section_versions or {})
+    versions["current"] = now.timestamp()
+    cache_entry.section_versions = versions
+
+
+def forecast_fingerprint(forecast_data: Dict[str, Any]) -> str:
+    """Hash of the forecast entries (not OpenWeather's envelope), to detect a repeated model run"""
+    payload = orjson.dumps(forecast_data.get("list", []), option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def apply_forecast(
+    cache_entry: WeatherCache,
+    forecast_data: Dict[str, Any],
+    aqi_data: AQIData,
+    fetch_time: datetime,
+    updated_at: datetime,
+    built: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = None
+) -> bool:
+    """
+    Rotate the 3 forecast fetches, store AQI and rebuild hourly/daily forecasts.
+
+    If OpenWeather returned the same forecast as the last fetch, only the fetch
+    time is bumped (and AQI stored if it changed), so quiet hours don't rewrite
+    the JSON columns or re-run the builders. Returns whether the response changed.
+
+    `built` is the (hourly, daily) result of build_forecast() for this fetch,
+    computed off the event loop; without it the forecasts are built inline.
+    """
+    versions = dict(cache_entry.section_versions or {})
+    stamp = updated_at.timestamp()
+    aqi = aqi_data.dict()
+    aqi_changed = aqi != cache_entry.aqi_data
+
+    fingerprint = forecast_fingerprint(forecast_data)
+    if cache_entry.fetch_1_data and fingerprint == cache_entry.forecast_fingerprint:
+        cache_entry.fetch_1_time = fetch_time
+        if not aqi_changed:
+            # Written back as is, so the column's onupdate doesn't move it past the stored response's
+            flag_modified(cache_entry, "updated_at")
+            return False
+        versions["aqi"] = stamp
+        cache_entry.section_versions = versions
+        cache_entry.aqi_data = aqi
+        cache_entry.updated_at = updated_at
+        return True
+
+    cache_entry.fetch_3_data = cache_entry.fetch_2_data
+    cache_entry.fetch_3_time = cache_entry.fetch_2_time
+    cache_entry.fetch_2_data = cache_entry.fetch_1_data
+    cache_entry.fetch_2_time = cache_entry.fetch_1_time
+    cache_entry.fetch_1_data = forecast_data
+    cache_entry.fetch_1_time = fetch_time  # Start of the city's refresh slot
+    cache_entry.forecast_fingerprint = fingerprint
+
+    if aqi_changed or "aqi" not in versions:
+        versions["aqi"] = stamp
+    cache_entry.aqi_data = aqi
+    cache_entry.updated_at = updated_at
+
+    # Build hourly and daily forecasts from the 3 fetches
+    if built is not None:
+        hourly, daily = built
+    else:
+        fetch_data_list = [
+            cache_entry.fetch_1_data,
+            cache_entry.fetch_2_data,
+            cache_entry.fetch_3_data
+        ]
+        hourly, daily = build_forecasts(fetch_data_list, forecast_data)
+
+    # Per-entry version stamps for delta sync
+    versions["hourly"] = stamp_entries(hourly, cache_entry.hourly_forecast, versions.get("hourly"), stamp, "dt")
+    versions["daily"] = stamp_entries(daily, cache_entry.daily_forecast, versions.get("daily"), stamp, "date")
+    cache_entry.section_versions = versions
+
+    cache_entry.hourly_forecast = hourly
+    cache_entry.daily_forecast = daily
+    return True
+
+
+def backfill_fetch_history(cache_entry: WeatherCache):
+    """
+    Fill the empty older fetch slots of a city's first forecast fetch.
+    OpenWeather doesn't serve past model runs, and the older fetches only add
+    entries that are already in the past, so the first fetch stands in for
+    them. The hourly build is unchanged, and the city counts as fully fetched
+    right away instead of after three scheduler runs. Real fetches rotate the
+    copies out.
+    """
+    if not cache_entry.fetch_1_data:
+        return
+    if cache_entry.fetch_2_data is None:
+        cache_entry.fetch_2_data = cache_entry.fetch_1_data
+        cache_entry.fetch_2_time = cache_entry.fetch_1_time
+    if cache_entry.fetch_3_data is None:
+        cache_entry.fetch_3_data = cache_entry.fetch_2_data
+        cache_entry.fetch_3_time = cache_entry.fetch_2_time
+
+
+async def build_forecast(
+    cache_entry: Optional[WeatherCache],
+    forecast_data: Dict[str, Any]
+) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """
+    Build the forecasts apply_forecast() will store for this fetch, in the
+    forecast executor so the event loop keeps serving requests meanwhile.
+    Returns None when the fetch repeats the last one (nothing to build).
+    """
+    if cache_entry is None:
+        fetch_data_list = [forecast_data]
+    elif cache_entry.fetch_1_data and forecast_fingerprint(forecast_data) == cache_entry.forecast_fingerprint:
+        return None
+    else:
+        # The fetches as they will be after rotation
+        fetch_data_list = [forecast_data, cache_entry.fetch_1_data, cache_entry.fetch_2_data]
+    with phase("build"):
+        return await forecast_builder.submit((fetch_data_list, forecast_data))
+
+
+async def fetch_updates(
+    db: Session,
+    weather_service: WeatherService,
+    cache_entry: Optional[WeatherCache],
+    lat: float,
+    lon: float,
+    prefetched_current: Optional[WeatherData] = None
+) -> Dict[str, Any]:
+    """
+    Fetch whatever upstream data a cache entry is missing (all of it for a new city).
+    Only talks to OpenWeather apart from the AQI tile lookup (which never awaits
+    mid-query), so many of these can run concurrently on one DB session.
+    prefetched_current is current weather already fetched in a batch (group endpoint).
+    """
+    needs_current = cache_entry is None or cache_entry.needs_current_weather_fetch()
+    needs_forecast = cache_entry is None or cache_entry.needs_forecast_fetch(FORECAST_LIVE_GRACE_SECONDS)
+    CACHE_LOOKUPS.labels("current", "miss" if needs_current else "hit").inc()
+    CACHE_LOOKUPS.labels("forecast", "miss" if needs_forecast else "hit").inc()
+
+    if cache_entry is not None:
+        if needs_current:
+            logger.info(f"Current weather expired for {cache_entry.city_name} (>15 min), fetching new data...")
+        else:
+            logger.info(f"Current weather cache hit for {cache_entry.city_name} (fresh within 15 min)")
+        if needs_forecast:
+            logger.info(f"Forecast expired for {cache_entry.city_name}, fetching new data...")
+
+    updates = {"current": None, "openweather_id": None, "forecast": None, "aqi": None, "built": None}
+    calls = []
+    if needs_current and prefetched_current is not None:
+        updates["current"] = prefetched_current
+    elif needs_current:
+        calls.append(("current", weather_service.fetch_current_weather_with_id(lat, lon)))
+    if needs_forecast:
+        calls.append(("forecast", weather_service.fetch_forecast(lat, lon)))
+        calls.append(("aqi", aqi_tiles.get(db, weather_service, lat, lon)))
+
+    if calls:
+        results = await asyncio.gather(*(call for _, call in calls))
+        for (key, _), result in zip(calls, results):
+            if key == "current":
+                updates["current"], updates["openweather_id"] = result
+            else:
+                updates[key] = result
+
+    if updates["forecast"] is not None:
+        updates["built"] = await build_forecast(cache_entry, updates["forecast"])
+
+    return updates
+
+
+async def apply_updates(
+    db: Session,
+    cache_entry: Optional[WeatherCache],
+    city_name: str,
+    lat: float,
+    lon: float,
+    updates: Dict[str, Any]
+) -> Tuple[WeatherCache, bool, bool]:
+    """
+    Apply fetched updates to a cache entry, creating it for new cities.
+    Returns (cache_entry, needs_commit, changed): the caller commits when
+    needs_commit and notifies subscribers only when the response changed.
+    """
+    now = datetime.now(timezone.utc)
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    changed = False
+
+    if not cache_entry:
+        logger.info(f"No cache entry for {city_name}, creating new entry...")
+        cache_entry = WeatherCache(
+            city_name=city_name,
+            latitude=lat,
+            longitude=lon,
+            refresh_offset=refresh_offset_for(city_name)
+        )
+        db.add(cache_entry)
+
+    if updates["current"] is not None:
+        apply_current_weather(cache_entry, updates["current"], now, updates["openweather_id"])
+        changed = True
+        logger.info(f"Updated current weather for {city_name}")
+
+    forecast_fetched = updates["forecast"] is not None
+    if forecast_fetched:
+        if apply_forecast(
+            cache_entry, updates["forecast"], updates["aqi"], cache_entry.current_slot_start(now), now, updates["built"]
+        ):
+            changed = True
+            logger.info(f"Updated forecast for {city_name}")
+        else:
+            logger.info(f"Forecast unchanged for {city_name}, only bumped its fetch time")
+
+    # Rows cached before responses were materialized get backfilled once
+    backfilled = not changed and cache_entry.response_json is None
+    if changed or backfilled:
+        with phase("serialize"):
+            await materialize_response_async(cache_entry, current_hour)
+
+    # An unchanged forecast still has its fetch time to save
+    return cache_entry, changed or backfilled or forecast_fetched, changed
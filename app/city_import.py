@@ -0,0 +1,255 @@
+import asyncio
+import csv
+import io
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import httpx
+import orjson
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .database import WeatherCache, refresh_offset_for
+from .job_queue import enqueue_refreshes, PRIORITY_USER
+from .rate_limit import AdaptiveConcurrencyLimiter, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# Cities accepted per uploaded file
+IMPORT_MAX_CITIES = int(os.getenv("IMPORT_MAX_CITIES", "10000"))
+
+# Concurrent geocoding calls during an import (adaptive, backs off on 429)
+IMPORT_GEOCODE_CONCURRENCY = int(os.getenv("IMPORT_GEOCODE_CONCURRENCY", "10"))
+IMPORT_MAX_RETRIES = int(os.getenv("IMPORT_MAX_RETRIES", "3"))  # re-tries of a throttled geocoding call
+
+# Finished imports stay pollable this long (seconds)
+IMPORT_RESULT_TTL = int(os.getenv("IMPORT_RESULT_TTL", "3600"))
+
+# Rows per INSERT statement
+IMPORT_INSERT_CHUNK = 1000
+
+NAME_FIELDS = ("city_name", "name", "city")
+
+
+def _entry(name: Optional[str] = None, lat: Any = None, lon: Any = None) -> Dict[str, Any]:
+    if name is not None and not isinstance(name, str):
+        raise ValueError(f"city name must be text: {name!r}")
+    name = (name or "").strip()
+    if name:
+        return {"city_name": name}
+    if lat in (None, "") or lon in (None, ""):
+        raise ValueError("each city needs a name or both lat and lon")
+    if not all(isinstance(value, (int, float, str)) for value in (lat, lon)):
+        raise ValueError(f"coordinates must be numbers: {lat!r}, {lon!r}")
+    lat, lon = float(lat), float(lon)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"coordinates out of range: {lat}, {lon}")
+    return {"lat": lat, "lon": lon}
+
+
+def parse_import(filename: str, content: bytes) -> List[Dict[str, Any]]:
+    """
+    Cities from an uploaded file, as {"city_name": ...} or {"lat": ..., "lon": ...}.
+
+    JSON: a list of names or of objects with `name`/`city_name` or `lat`/`lon`.
+    CSV: a header with `name`/`city_name` and/or `lat`/`lon` columns, or one
+    name per line without a header.
+    """
+    if filename.lower().endswith(".json"):
+        items = orjson.loads(content)
+        if not isinstance(items, list):
+            raise ValueError("JSON import must be a list")
+        entries = []
+        for item in items:
+            if isinstance(item, str):
+                entries.append(_entry(item))
+            elif isinstance(item, dict):
+                name = next((item[field] for field in NAME_FIELDS if item.get(field)), None)
+                entries.append(_entry(name, item.get("lat"), item.get("lon")))
+            else:
+                raise ValueError(f"unsupported JSON entry: {item!r}")
+    else:
+        text = content.decode("utf-8-sig")
+        rows = list(csv.reader(io.StringIO(text)))
+        header = [column.strip().lower() for column in rows[0]] if rows else []
+        if set(header) & set(NAME_FIELDS + ("lat", "lon")):
+            entries = []
+            for row in rows[1:]:
+                if not any(cell.strip() for cell in row):
+                    continue
+                values = dict(zip(header, (cell.strip() for cell in row)))
+                name = next((values[field] for field in NAME_FIELDS if values.get(field)), None)
+                entries.append(_entry(name, values.get("lat"), values.get("lon")))
+        else:
+            # One "City, CC" per line: the whole line is the name
+            entries = [_entry(line) for line in text.splitlines() if line.strip()]
+
+    if len(entries) > IMPORT_MAX_CITIES:
+        raise ValueError(f"At most {IMPORT_MAX_CITIES} cities per import ({len(entries)} given)")
+    return entries
+
+
+class CityImport:
+    """Progress of one bulk import, polled by the admin panel"""
+
+    def __init__(self, entries: List[Dict[str, Any]], warm: bool):
+        self.id = uuid.uuid4().hex
+        self.entries = entries
+        self.warm = warm
+        self.status = "pending"  # pending, geocoding, inserting, done, failed
+        self.total = len(entries)
+        self.geocoded = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.inserted = 0
+        self.queued = 0
+        self.errors: List[str] = []  # first 50
+        self.started = time.monotonic()
+        self.duration: Optional[float] = None
+
+    def error(self, message: str):
+        self.failed += 1
+        if len(self.errors) < 50:
+            self.errors.append(message)
+
+    def progress(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "geocoded": self.geocoded,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "inserted": self.inserted,
+            "queued": self.queued,
+            "errors": self.errors,
+            "elapsed": round(self.duration or time.monotonic() - self.started, 1),
+        }
+
+
+def prune_imports(imports: Dict[str, CityImport], now: Optional[float] = None):
+    """Forget imports that finished more than IMPORT_RESULT_TTL seconds ago"""
+    now = now or time.monotonic()
+    for import_id, job in list(imports.items()):
+        if job.duration is not None and now - (job.started + job.duration) > IMPORT_RESULT_TTL:
+            del imports[import_id]
+
+
+def existing_names(db: Session, names: List[str]) -> set:
+    """Which of `names` are already cached (one IN query per chunk)"""
+    found = set()
+    for i in range(0, len(names), IMPORT_INSERT_CHUNK):
+        chunk = names[i:i + IMPORT_INSERT_CHUNK]
+        found.update(name for name, in db.query(WeatherCache.city_name).filter(WeatherCache.city_name.in_(chunk)))
+    return found
+
+
+async def geocode_entries(job: CityImport, entries: List[Dict[str, Any]], weather_service) -> Dict[str, tuple]:
+    """
+    Geocode entries concurrently through an adaptive limiter (backs off and
+    waits out Retry-After on 429). Returns standardized name -> (lat, lon).
+    """
+    limiter = AdaptiveConcurrencyLimiter(
+        min_limit=1,
+        max_limit=IMPORT_GEOCODE_CONCURRENCY,
+        initial_limit=min(5, IMPORT_GEOCODE_CONCURRENCY)
+    )
+    located: Dict[str, tuple] = {}
+
+    async def geocode(entry):
+        label = entry.get("city_name") or f"{entry['lat']}, {entry['lon']}"
+        for attempt in range(IMPORT_MAX_RETRIES + 1):
+            async with limiter.slot():
+                started = time.monotonic()
+                try:
+                    lat, lon, name = await weather_service.geocode_location(
+                        lat=entry.get("lat"), lon=entry.get("lon"), city_name=entry.get("city_name")
+                    )
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code == 429 and attempt < IMPORT_MAX_RETRIES:
+                        limiter.record_throttled(retry_after_seconds(e.response))
+                        continue
+                    limiter.record_failure()
+                    job.error(f"{label}: {e}")
+                    return
+                except Exception as e:
+                    limiter.record_failure()
+                    job.error(f"{label}: {e}")
+                    return
+                limiter.record_success(time.monotonic() - started)
+
+            job.geocoded += 1
+            if name in located:
+                job.duplicates += 1  # Two spellings of the same city in the file
+            else:
+                located[name] = (lat, lon)
+            return
+
+    await asyncio.gather(*(geocode(entry) for entry in entries))
+    return located
+
+
+def insert_cities(db: Session, located: Dict[str, tuple]) -> List[str]:
+    """Insert new rows in multi-row INSERTs, skipping names added meanwhile; the caller commits"""
+    table = WeatherCache.__table__
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    created_at = datetime.now(timezone.utc)
+    rows = [
+        {
+            "city_name": name, "latitude": lat, "longitude": lon,
+            "current_weather": {}, "aqi_data": {},
+            "refresh_offset": refresh_offset_for(name), "created_at": created_at
+        }
+        for name, (lat, lon) in located.items()
+    ]
+    inserted = []
+    for i in range(0, len(rows), IMPORT_INSERT_CHUNK):
+        statement = dialect.insert(table).values(rows[i:i + IMPORT_INSERT_CHUNK])
+        statement = statement.on_conflict_do_nothing(index_elements=[table.c.city_name])
+        inserted.extend(name for name, in db.execute(statement.returning(table.c.city_name)))
+    return inserted
+
+
+async def run_import(job: CityImport, session_factory, weather_service):
+    """Geocode, deduplicate, bulk insert and optionally queue warm-up refreshes"""
+    db = session_factory()
+    try:
+        # Names already in their standardized "City, CC" form need no geocoding if cached
+        names = [entry["city_name"] for entry in job.entries if "city_name" in entry]
+        known = existing_names(db, list(dict.fromkeys(names)))
+        pending, seen = [], set()
+        for entry in job.entries:
+            key = entry.get("city_name", "").lower() or (entry["lat"], entry["lon"])
+            if entry.get("city_name") in known or key in seen:
+                job.duplicates += 1
+            else:
+                seen.add(key)
+                pending.append(entry)
+        db.rollback()  # Don't hold a transaction open while geocoding
+
+        job.status = "geocoding"
+        located = await geocode_entries(job, pending, weather_service)
+
+        job.status = "inserting"
+        for name in existing_names(db, list(located)):
+            del located[name]
+            job.duplicates += 1
+        inserted = insert_cities(db, located)
+        job.duplicates += len(located) - len(inserted)
+        job.inserted = len(inserted)
+        if job.warm:
+            job.queued = enqueue_refreshes(db, inserted, PRIORITY_USER)
+        db.commit()
+        job.status = "done"
+    except Exception as e:
+        db.rollback()
+        job.status = "failed"
+        job.errors.append(str(e))
+        logger.error(f"City import {job.id} failed: {e}")
+    finally:
+        db.close()
+        job.duration = time.monotonic() - job.started
+        logger.info(f"City import {job.id}: {job.progress()}")
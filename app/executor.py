@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+from .weather_service import build_forecasts_many
+
+logger = logging.getLogger(__name__)
+
+# Where forecast building runs: "process" (off the GIL), "thread" (off the event loop) or "inline"
+FORECAST_EXECUTOR = os.getenv("FORECAST_EXECUTOR", "thread")
+FORECAST_EXECUTOR_WORKERS = int(os.getenv("FORECAST_EXECUTOR_WORKERS", "2"))
+
+# Builds requested within this window are sent to the executor together (one IPC round trip)
+FORECAST_BATCH_MAX = int(os.getenv("FORECAST_BATCH_MAX", "16"))
+FORECAST_BATCH_DELAY = float(os.getenv("FORECAST_BATCH_DELAY", "0.005"))  # seconds
+
+_executor: Optional[Executor] = None
+
+
+def get_executor() -> Optional[Executor]:
+    """The shared CPU executor, created on first use (None when running inline)"""
+    global _executor
+    if _executor is None and FORECAST_EXECUTOR != "inline":
+        if FORECAST_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=FORECAST_EXECUTOR_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=FORECAST_EXECUTOR_WORKERS, thread_name_prefix="forecast")
+        logger.info(f"Forecast building runs in a {FORECAST_EXECUTOR} pool of {FORECAST_EXECUTOR_WORKERS}")
+    return _executor
+
+
+async def run_cpu(func: Callable[..., Any], *args: Any) -> Any:
+    """func(*args) in the shared CPU executor, or inline when there is none"""
+    executor = get_executor()
+    if executor is None:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+class BatchingExecutor:
+    """
+    Collects calls made within FORECAST_BATCH_DELAY (up to FORECAST_BATCH_MAX)
+    and runs them as one call of `func_many` in the executor, so a refresh
+    of thousands of cities pays the executor round trip per batch, not per city.
+    """
+
+    def __init__(self, func_many: Callable[[List[Any]], List[Any]],
+                 max_batch: int = FORECAST_BATCH_MAX, max_delay: float = FORECAST_BATCH_DELAY):
+        self.func_many = func_many
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, job: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        executor = get_executor()
+        if executor is None:
+            return self.func_many([job])[0]
+
+        future = loop.create_future()
+        self._pending.append((job, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(get_executor(), self.func_many, [job for job, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# Global instance: takes (fetch_data_list, forecast_data), returns (hourly, daily)
+forecast_builder = BatchingExecutor(build_forecasts_many)
@@ -0,0 +1,103 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import case, delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .database import RefreshJob
+
+logger = logging.getLogger(__name__)
+
+# Job priorities (higher runs first)
+PRIORITY_USER = 10  # Requested by a person (admin panel)
+PRIORITY_SCHEDULED = 5  # City's hourly slot
+PRIORITY_CATCH_UP = 0  # Slots missed while no scheduler was running
+
+# A claimed job becomes claimable again after this long, so a crashed worker's jobs resume.
+# The lease grows by REFRESH_JOB_LEASE_PER_JOB_SECONDS per job claimed with it, as the
+# whole batch goes through one worker pool and its last job may start well after the first.
+REFRESH_JOB_LEASE_SECONDS = int(os.getenv("REFRESH_JOB_LEASE_SECONDS", "600"))
+REFRESH_JOB_LEASE_PER_JOB_SECONDS = int(os.getenv("REFRESH_JOB_LEASE_PER_JOB_SECONDS", "10"))
+
+# Failed jobs retry after REFRESH_JOB_BACKOFF_SECONDS * 2^(attempts-1), up to REFRESH_JOB_MAX_ATTEMPTS tries
+REFRESH_JOB_MAX_ATTEMPTS = int(os.getenv("REFRESH_JOB_MAX_ATTEMPTS", "5"))
+REFRESH_JOB_BACKOFF_SECONDS = int(os.getenv("REFRESH_JOB_BACKOFF_SECONDS", "30"))
+
+
+def enqueue_refreshes(db: Session, city_names: Iterable[str], priority: int, now: Optional[datetime] = None) -> int:
+    """
+    Queue forecast refreshes; the caller commits. A city that already has a
+    pending job keeps it (and its backoff), only raised to the higher priority.
+    """
+    now = now or datetime.now(timezone.utc)
+    rows = [
+        {"city_name": city_name, "priority": priority, "attempts": 0, "run_after": now}
+        for city_name in dict.fromkeys(city_names)
+    ]
+    if not rows:
+        return 0
+
+    table = RefreshJob.__table__
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.city_name],
+        set_={"priority": case(
+            (statement.excluded.priority > table.c.priority, statement.excluded.priority),
+            else_=table.c.priority
+        )}
+    )
+    db.execute(statement)
+    return len(rows)
+
+
+def claim_jobs(db: Session, limit: int, now: Optional[datetime] = None) -> List[Tuple[int, str, int]]:
+    """
+    Lease up to `limit` due jobs, highest priority first; returns (id, city_name, attempt).
+
+    Rows are locked with FOR UPDATE SKIP LOCKED, so workers in any number of
+    processes claim disjoint jobs without waiting on each other. The lease
+    covers the whole batch: it grows with the number of jobs claimed.
+    """
+    now = now or datetime.now(timezone.utc)
+    jobs = db.query(RefreshJob).filter(
+        RefreshJob.run_after <= now
+    ).order_by(
+        RefreshJob.priority.desc(), RefreshJob.run_after
+    ).limit(limit).with_for_update(skip_locked=True).all()
+
+    lease = timedelta(seconds=REFRESH_JOB_LEASE_SECONDS + REFRESH_JOB_LEASE_PER_JOB_SECONDS * len(jobs))
+    claimed = []
+    for job in jobs:
+        job.attempts += 1
+        job.run_after = now + lease
+        claimed.append((job.id, job.city_name, job.attempts))
+    db.commit()
+    return claimed
+
+
+def complete_jobs(db: Session, job_ids: List[int]):
+    """Drop finished jobs in one statement; the caller commits"""
+    if job_ids:
+        db.execute(delete(RefreshJob.__table__).where(RefreshJob.__table__.c.id.in_(job_ids)))
+
+
+def fail_job(db: Session, job_id: int, city_name: str, attempt: int, error: str, now: Optional[datetime] = None):
+    """Schedule a retry with exponential backoff, or give up after the last attempt; the caller commits"""
+    if attempt >= REFRESH_JOB_MAX_ATTEMPTS:
+        logger.error(f"Giving up on forecast refresh for {city_name} after {attempt} attempts: {error}")
+        complete_jobs(db, [job_id])
+        return
+
+    now = now or datetime.now(timezone.utc)
+    delay = min(REFRESH_JOB_BACKOFF_SECONDS * 2 ** (attempt - 1), 3600)
+    table = RefreshJob.__table__
+    db.execute(
+        update(table).where(table.c.id == job_id).values(
+            run_after=now + timedelta(seconds=delay),
+            last_error=error[:500]
+        )
+    )
+    logger.warning(f"Forecast refresh for {city_name} failed (attempt {attempt}), retrying in {delay}s: {error}")
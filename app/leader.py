@@ -0,0 +1,90 @@
+import logging
+import os
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock key shared by every instance against the same database
+LEADER_LOCK_ID = int(os.getenv("LEADER_LOCK_ID", "72150417"))
+
+# How often followers try to take over and the leader checks its lock connection
+LEADER_CHECK_SECONDS = int(os.getenv("LEADER_CHECK_SECONDS", "15"))
+
+
+class LeaderElection:
+    """
+    Elects one scheduler leader among all workers and replicas.
+
+    The leader holds a Postgres session-level advisory lock on a dedicated
+    connection. If the leader dies its connection closes, Postgres releases
+    the lock and the next follower to call check() takes over.
+    Databases without advisory locks (SQLite in development) have a single
+    process, so that process is always the leader.
+    """
+
+    def __init__(self, engine: Engine, lock_id: int = LEADER_LOCK_ID):
+        self.engine = engine
+        self.lock_id = lock_id
+        self._connection: Optional[Connection] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._connection is not None or self.engine.dialect.name != "postgresql"
+
+    def check(self) -> bool:
+        """Verify the held lock or try to acquire it; returns whether this instance leads"""
+        if self.engine.dialect.name != "postgresql":
+            return True
+
+        if self._connection is not None:
+            try:
+                self._connection.exec_driver_sql("SELECT 1")
+                return True
+            except Exception as e:
+                # The lock went away with the connection; another instance may already lead
+                logger.warning(f"Lost scheduler leadership: {e}")
+                self._discard()
+
+        connection = None
+        try:
+            connection = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": self.lock_id}
+            ).scalar()
+        except Exception as e:
+            logger.error(f"Leader election failed: {e}")
+            if connection is not None:
+                connection.invalidate()
+                connection.close()
+            return False
+
+        if not acquired:
+            connection.close()
+            return False
+
+        self._connection = connection
+        logger.info("Acquired scheduler leadership")
+        return True
+
+    def release(self):
+        """Give up leadership (on shutdown) so a follower can take over right away"""
+        if self._connection is None:
+            return
+        try:
+            self._connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": self.lock_id})
+            self._connection.close()
+        except Exception as e:
+            logger.warning(f"Error releasing scheduler leadership: {e}")
+            self._discard()
+        self._connection = None
+
+    def _discard(self):
+        # Never return a connection in an unknown lock state to the pool
+        try:
+            self._connection.invalidate()
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
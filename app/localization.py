@@ -0,0 +1,353 @@
+from typing import Any, Dict, List, Optional
+
+# Cached descriptions are OpenWeather's English ones; these languages are
+# translated locally from the condition id, so every language is served from
+# the same cached data (no per-language upstream fetches).
+DEFAULT_LANGUAGE = "en"
+
+CONDITION_DESCRIPTIONS: Dict[str, Dict[int, str]] = {
+    "ru": {
+        200: "гроза с небольшим дождём",
+        201: "гроза с дождём",
+        202: "гроза с сильным дождём",
+        210: "небольшая гроза",
+        211: "гроза",
+        212: "сильная гроза",
+        221: "местами гроза",
+        230: "гроза с небольшой моросью",
+        231: "гроза с моросью",
+        232: "гроза с сильной моросью",
+        300: "слабая морось",
+        301: "морось",
+        302: "сильная морось",
+        310: "слабый моросящий дождь",
+        311: "моросящий дождь",
+        312: "сильный моросящий дождь",
+        313: "ливень с моросью",
+        314: "сильный ливень с моросью",
+        321: "ливневая морось",
+        500: "небольшой дождь",
+        501: "дождь",
+        502: "сильный дождь",
+        503: "очень сильный дождь",
+        504: "проливной дождь",
+        511: "ледяной дождь",
+        520: "небольшой ливень",
+        521: "ливень",
+        522: "сильный ливень",
+        531: "местами ливень",
+        600: "небольшой снег",
+        601: "снег",
+        602: "сильный снег",
+        611: "мокрый снег",
+        612: "небольшой мокрый снег",
+        613: "ливневый мокрый снег",
+        615: "небольшой дождь со снегом",
+        616: "дождь со снегом",
+        620: "небольшой снегопад",
+        621: "снегопад",
+        622: "сильный снегопад",
+        701: "дымка",
+        711: "дым",
+        721: "мгла",
+        731: "песчаные вихри",
+        741: "туман",
+        751: "песок",
+        761: "пыль",
+        762: "вулканический пепел",
+        771: "шквалы",
+        781: "торнадо",
+        800: "ясно",
+        801: "небольшая облачность",
+        802: "переменная облачность",
+        803: "облачно с прояснениями",
+        804: "пасмурно",
+    },
+    "uz": {
+        200: "yengil yomg'irli momaqaldiroq",
+        201: "yomg'irli momaqaldiroq",
+        202: "kuchli yomg'irli momaqaldiroq",
+        210: "kuchsiz momaqaldiroq",
+        211: "momaqaldiroq",
+        212: "kuchli momaqaldiroq",
+        221: "ayrim joylarda momaqaldiroq",
+        230: "yengil mayda yomg'irli momaqaldiroq",
+        231: "mayda yomg'irli momaqaldiroq",
+        232: "kuchli mayda yomg'irli momaqaldiroq",
+        300: "yengil mayda yomg'ir",
+        301: "mayda yomg'ir",
+        302: "kuchli mayda yomg'ir",
+        310: "yengil mayda yomg'ir va yomg'ir",
+        311: "mayda yomg'ir va yomg'ir",
+        312: "kuchli mayda yomg'ir va yomg'ir",
+        313: "jala va mayda yomg'ir",
+        314: "kuchli jala va mayda yomg'ir",
+        321: "mayda jala",
+        500: "yengil yomg'ir",
+        501: "o'rtacha yomg'ir",
+        502: "kuchli yomg'ir",
+        503: "juda kuchli yomg'ir",
+        504: "o'ta kuchli yomg'ir",
+        511: "muzli yomg'ir",
+        520: "yengil jala",
+        521: "jala",
+        522: "kuchli jala",
+        531: "ayrim joylarda jala",
+        600: "yengil qor",
+        601: "qor",
+        602: "kuchli qor",
+        611: "qor aralash yomg'ir",
+        612: "yengil qor aralash jala",
+        613: "qor aralash jala",
+        615: "yengil yomg'ir va qor",
+        616: "yomg'ir va qor",
+        620: "yengil qor yog'ishi",
+        621: "qor yog'ishi",
+        622: "kuchli qor yog'ishi",
+        701: "yengil tuman",
+        711: "tutun",
+        721: "g'ubor",
+        731: "qum-chang quyunlari",
+        741: "tuman",
+        751: "qum",
+        761: "chang",
+        762: "vulqon kuli",
+        771: "shiddatli shamol",
+        781: "tornado",
+        800: "ochiq osmon",
+        801: "biroz bulutli",
+        802: "tarqoq bulutlar",
+        803: "bulutli",
+        804: "qalin bulutli",
+    },
+    "de": {
+        200: "Gewitter mit leichtem Regen",
+        201: "Gewitter mit Regen",
+        202: "Gewitter mit starkem Regen",
+        210: "leichtes Gewitter",
+        211: "Gewitter",
+        212: "schweres Gewitter",
+        221: "vereinzelte Gewitter",
+        230: "Gewitter mit leichtem Nieselregen",
+        231: "Gewitter mit Nieselregen",
+        232: "Gewitter mit starkem Nieselregen",
+        300: "leichter Nieselregen",
+        301: "Nieselregen",
+        302: "starker Nieselregen",
+        310: "leichter Nieselregen mit Regen",
+        311: "Nieselregen mit Regen",
+        312: "starker Nieselregen mit Regen",
+        313: "Regenschauer und Nieselregen",
+        314: "starke Regenschauer und Nieselregen",
+        321: "Nieselschauer",
+        500: "leichter Regen",
+        501: "mäßiger Regen",
+        502: "starker Regen",
+        503: "sehr starker Regen",
+        504: "extremer Regen",
+        511: "gefrierender Regen",
+        520: "leichte Regenschauer",
+        521: "Regenschauer",
+        522: "starke Regenschauer",
+        531: "vereinzelte Regenschauer",
+        600: "leichter Schneefall",
+        601: "Schnee",
+        602: "starker Schneefall",
+        611: "Schneeregen",
+        612: "leichte Schneeregenschauer",
+        613: "Schneeregenschauer",
+        615: "leichter Regen und Schnee",
+        616: "Regen und Schnee",
+        620: "leichte Schneeschauer",
+        621: "Schneeschauer",
+        622: "starke Schneeschauer",
+        701: "feuchter Dunst",
+        711: "Rauch",
+        721: "Dunst",
+        731: "Sand- und Staubwirbel",
+        741: "Nebel",
+        751: "Sand",
+        761: "Staub",
+        762: "Vulkanasche",
+        771: "Sturmböen",
+        781: "Tornado",
+        800: "klarer Himmel",
+        801: "ein paar Wolken",
+        802: "mäßig bewölkt",
+        803: "überwiegend bewölkt",
+        804: "bedeckt",
+    },
+    "fr": {
+        200: "orage et pluie fine",
+        201: "orage et pluie",
+        202: "orage et fortes pluies",
+        210: "orage léger",
+        211: "orage",
+        212: "violent orage",
+        221: "orages isolés",
+        230: "orage et bruine légère",
+        231: "orage et bruine",
+        232: "orage et forte bruine",
+        300: "bruine légère",
+        301: "bruine",
+        302: "forte bruine",
+        310: "bruine et pluie légères",
+        311: "bruine et pluie",
+        312: "forte bruine et pluie",
+        313: "averses de pluie et bruine",
+        314: "fortes averses de pluie et bruine",
+        321: "averses de bruine",
+        500: "légère pluie",
+        501: "pluie modérée",
+        502: "forte pluie",
+        503: "très forte pluie",
+        504: "pluie extrême",
+        511: "pluie verglaçante",
+        520: "légères averses",
+        521: "averses de pluie",
+        522: "fortes averses",
+        531: "averses isolées",
+        600: "légère neige",
+        601: "neige",
+        602: "fortes chutes de neige",
+        611: "neige fondue",
+        612: "légères averses de neige fondue",
+        613: "averses de neige fondue",
+        615: "pluie et neige légères",
+        616: "pluie et neige",
+        620: "légères averses de neige",
+        621: "averses de neige",
+        622: "fortes averses de neige",
+        701: "brume",
+        711: "fumée",
+        721: "brume sèche",
+        731: "tourbillons de sable",
+        741: "brouillard",
+        751: "sable",
+        761: "poussière",
+        762: "cendres volcaniques",
+        771: "rafales",
+        781: "tornade",
+        800: "ciel dégagé",
+        801: "peu nuageux",
+        802: "partiellement nuageux",
+        803: "nuageux",
+        804: "couvert",
+    },
+    "es": {
+        200: "tormenta con lluvia ligera",
+        201: "tormenta con lluvia",
+        202: "tormenta con lluvia intensa",
+        210: "tormenta ligera",
+        211: "tormenta",
+        212: "tormenta fuerte",
+        221: "tormentas dispersas",
+        230: "tormenta con llovizna ligera",
+        231: "tormenta con llovizna",
+        232: "tormenta con llovizna intensa",
+        300: "llovizna ligera",
+        301: "llovizna",
+        302: "llovizna intensa",
+        310: "llovizna y lluvia ligeras",
+        311: "llovizna y lluvia",
+        312: "llovizna y lluvia intensas",
+        313: "chubascos y llovizna",
+        314: "chubascos fuertes y llovizna",
+        321: "chubascos de llovizna",
+        500: "lluvia ligera",
+        501: "lluvia moderada",
+        502: "lluvia intensa",
+        503: "lluvia muy intensa",
+        504: "lluvia extrema",
+        511: "lluvia helada",
+        520: "chubascos ligeros",
+        521: "chubascos",
+        522: "chubascos intensos",
+        531: "chubascos dispersos",
+        600: "nevada ligera",
+        601: "nieve",
+        602: "nevada intensa",
+        611: "aguanieve",
+        612: "chubascos ligeros de aguanieve",
+        613: "chubascos de aguanieve",
+        615: "lluvia y nieve ligeras",
+        616: "lluvia y nieve",
+        620: "chubascos de nieve ligeros",
+        621: "chubascos de nieve",
+        622: "chubascos de nieve intensos",
+        701: "neblina",
+        711: "humo",
+        721: "calima",
+        731: "remolinos de arena y polvo",
+        741: "niebla",
+        751: "arena",
+        761: "polvo",
+        762: "ceniza volcánica",
+        771: "turbonadas",
+        781: "tornado",
+        800: "cielo claro",
+        801: "algo de nubes",
+        802: "nubes dispersas",
+        803: "muy nuboso",
+        804: "cubierto",
+    },
+}
+
+SUPPORTED_LANGUAGES = (DEFAULT_LANGUAGE,) + tuple(CONDITION_DESCRIPTIONS)
+
+# Codes OpenWeather may add later fall back to their group's plain description
+GROUP_FALLBACK = {2: 211, 3: 301, 5: 501, 6: 601, 7: 741, 8: 803}
+
+
+def negotiate_language(accept_language: Optional[str]) -> str:
+    """Best supported language of an Accept-Language header, else English"""
+    if not accept_language:
+        return DEFAULT_LANGUAGE
+
+    candidates = []
+    for position, part in enumerate(accept_language.split(",")):
+        tag, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        language = tag.strip().lower().split("-")[0]
+        if quality > 0 and language in SUPPORTED_LANGUAGES:
+            candidates.append((-quality, position, language))
+    return min(candidates)[2] if candidates else DEFAULT_LANGUAGE
+
+
+def describe(condition_id: Optional[int], language: str, fallback: str) -> str:
+    """Localized description of an OpenWeather condition id"""
+    table = CONDITION_DESCRIPTIONS.get(language)
+    if table is None or condition_id is None:
+        return fallback
+    description = table.get(condition_id)
+    if description is None:
+        description = table.get(GROUP_FALLBACK.get(condition_id // 100), fallback)
+    return description
+
+
+def _localize_entries(entries: List[Dict[str, Any]], language: str) -> List[Dict[str, Any]]:
+    return [
+        dict(entry, description=describe(entry.get("condition_id"), language, entry["description"]))
+        for entry in entries
+    ]
+
+
+def localize_response(body: Dict[str, Any], language: str) -> Dict[str, Any]:
+    """
+    Translate the descriptions of a parsed weather (or delta) response.
+    Entries cached before condition ids were stored keep their English text.
+    """
+    if language == DEFAULT_LANGUAGE:
+        return body
+    if body.get("current"):
+        body["current"] = _localize_entries([body["current"]], language)[0]
+    for section in ("hourly", "daily"):
+        if body.get(section):
+            body[section] = _localize_entries(body[section], language)
+    return body
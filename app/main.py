@@ -1,24 +1,57 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse, PlainTextResponse
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple, Any, Literal
+import asyncio
 import logging
+import orjson
+import os
+import secrets
 from datetime import datetime, timezone
 
-from .database import SessionLocal, WeatherCache, init_db
-from .schemas import LocationRequest, WeatherResponse, CityInfo
+from .database import SessionLocal, WeatherCache, engine, init_db
+from .schemas import (
+    LocationRequest, WeatherRequest, WeatherResponse, CityInfo, BatchWeatherRequest, BatchWeatherResponse,
+    DeltaWeatherRequest, WeatherDeltaResponse, WeatherData, BATCH_MAX_LOCATIONS
+)
 from .weather_service import WeatherService
+from .responses import render_delta_response
+from .variants import variant_response, variant_body, convert_units
+from .localization import negotiate_language, localize_response, DEFAULT_LANGUAGE
+from .cache_updates import fetch_updates, apply_updates
+from .pubsub import weather_hub, notify_updates, UpdateListener
+from .popularity import access_tracker
 from .background_tasks import background_task_instance
+from .timing import ServerTimingMiddleware, REQUEST_TIMING
+from .metrics import MetricsMiddleware
+from .query_stats import QueryCountMiddleware
+from .profiler import (
+    SamplingProfiler, SlowRequestProfilerMiddleware, collapsed, PROFILE_MAX_SECONDS, PROFILE_SLOW_REQUESTS_MS
+)
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Max concurrent cities refreshing upstream within one batch request
+BATCH_UPSTREAM_CONCURRENCY = int(os.getenv("BATCH_UPSTREAM_CONCURRENCY", "5"))
+
+# Seconds between SSE keep-alive comments on idle subscriptions
+SUBSCRIBE_KEEPALIVE_SECONDS = float(os.getenv("SUBSCRIBE_KEEPALIVE_SECONDS", "15"))
+
+# Credentials for the operator endpoints (same as the admin panel)
+ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
+
 app = FastAPI(
     title="Weather Caching API",
     description="Backend API for caching weather data from OpenWeather API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware for Flutter app
@@ -30,6 +63,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-phase timings (geocode, db, upstream_*, build, serialize) in a Server-Timing header
+if REQUEST_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
+
+# Request latency histogram for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Statement count per request, warns on N+1 patterns
+app.add_middleware(QueryCountMiddleware)
+
+# Opt-in: log sampled stacks of slow /api/weather requests
+if PROFILE_SLOW_REQUESTS_MS:
+    app.add_middleware(SlowRequestProfilerMiddleware, threshold_ms=PROFILE_SLOW_REQUESTS_MS)
+
+admin_auth = HTTPBasic()
+profile_lock = asyncio.Lock()
+
+def require_admin(credentials: HTTPBasicCredentials = Depends(admin_auth)):
+    username_ok = secrets.compare_digest(credentials.username.encode(), ADMIN_USERNAME.encode())
+    password_ok = secrets.compare_digest(credentials.password.encode(), ADMIN_PASSWORD.encode())
+    if not (username_ok and password_ok):
+        raise HTTPException(status_code=401, detail="Invalid credentials", headers={"WWW-Authenticate": "Basic"})
+
+def load_responses(city_names: List[str]) -> Dict[str, bytes]:
+    """Stored responses by city, for refreshes announced by other workers"""
+    db = SessionLocal()
+    try:
+        return dict(db.query(WeatherCache.city_name, WeatherCache.response_json).filter(
+            WeatherCache.city_name.in_(city_names),
+            WeatherCache.response_json.isnot(None)
+        ).all())
+    finally:
+        db.close()
+
+update_listener = UpdateListener(weather_hub, engine, load_responses)
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
@@ -42,8 +111,12 @@ async def startup_event():
     background_task_instance.start()
     logger.info("Background scheduler started")
 
+    # Refreshes committed by other workers (e.g. the scheduler leader) reach our subscribers
+    update_listener.start()
+
 @app.on_event("shutdown")
 async def shutdown_event():
+    update_listener.stop()
     logger.info("Shutting down background scheduler...")
     background_task_instance.stop()
     logger.info("Background scheduler stopped")
@@ -71,7 +144,14 @@ async def get_saved_cities(db: Session = Depends(get_db)):
     - last_updated: Last time the city data was updated
     """
     try:
-        cities = db.query(WeatherCache).all()
+        # Only the listed columns, not the JSON and response blobs
+        cities = db.query(
+            WeatherCache.city_name,
+            WeatherCache.latitude,
+            WeatherCache.longitude,
+            WeatherCache.updated_at,
+            WeatherCache.created_at
+        ).all()
 
         return [
             CityInfo(
@@ -86,9 +166,47 @@ async def get_saved_cities(db: Session = Depends(get_db)):
         logger.error(f"Error fetching cities: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error fetching cities: {str(e)}")
 
+async def resolve_location(request: LocationRequest, db: Session) -> Tuple[Optional[WeatherCache], float, float, str]:
+    """
+    Resolve a location request to (cache_entry, lat, lon, standardized_city_name).
+    Tries the cache first so known city names never hit the geocoding API.
+    """
+    if request.city_name:
+        # Try exact match first
+        cache_entry = db.query(WeatherCache).filter(
+            WeatherCache.city_name == request.city_name
+        ).first()
+
+        if cache_entry:
+            # Found in cache, use stored coordinates
+            logger.info(f"Found cached coordinates for {cache_entry.city_name}: ({cache_entry.latitude}, {cache_entry.longitude})")
+            return cache_entry, cache_entry.latitude, cache_entry.longitude, cache_entry.city_name
+
+        # Not in cache, need to geocode
+        logger.info(f"Cache miss, geocoding city: {request.city_name}")
+        lat, lon, city_name = await weather_service.geocode_location(
+            city_name=request.city_name
+        )
+        logger.info(f"Geocoded to: {city_name} ({lat}, {lon})")
+    else:
+        # Coordinates provided, do reverse geocoding
+        logger.info(f"Reverse geocoding coordinates: ({request.lat}, {request.lon})")
+        lat, lon, city_name = await weather_service.geocode_location(
+            lat=request.lat,
+            lon=request.lon
+        )
+        logger.info(f"Reverse geocoded to: {city_name} ({lat}, {lon})")
+
+    # Check if the standardized city is already cached
+    cache_entry = db.query(WeatherCache).filter(
+        WeatherCache.city_name == city_name
+    ).first()
+    return cache_entry, lat, lon, city_name
+
 @app.post("/api/weather", response_model=WeatherResponse)
 async def get_weather(
-        request: LocationRequest,
+        request: WeatherRequest,
+        http_request: Request,
         db: Session = Depends(get_db)
 ):
     """
@@ -97,147 +215,261 @@ async def get_weather(
     - **city_name**: City name (e.g., "London" or "London, GB")
     - **lat**: Latitude (alternative to city_name)
     - **lon**: Longitude (required if lat is provided)
+    - **units**: `metric` (default), `imperial` or `standard`
+    - **hours** / **days**: Only this far ahead in the hourly / daily forecast
 
     Returns current weather, hourly forecast, daily forecast, and AQI data.
+    Descriptions are in the best `Accept-Language` match (en, ru, uz, de, fr, es).
     - Current weather: cached for 15 minutes (on-demand)
     - Forecasts: cached hourly (background task)
+
+    The response body is pre-serialized at refresh time and streamed as-is
+    (gzip-encoded when the client accepts it).
     """
     try:
-        # Step 1: Try to find existing cache entry first to avoid geocoding
-        cache_entry = None
-        lat, lon, city_name = None, None, None
-
-        if request.city_name:
-            # Try exact match first
-            cache_entry = db.query(WeatherCache).filter(
-                WeatherCache.city_name == request.city_name
-            ).first()
-
-            if cache_entry:
-                # Found in cache, use stored coordinates
-                lat = cache_entry.latitude
-                lon = cache_entry.longitude
-                city_name = cache_entry.city_name
-                logger.info(f"Found cached coordinates for {city_name}: ({lat}, {lon})")
-            else:
-                # Not in cache, need to geocode
-                logger.info(f"Cache miss, geocoding city: {request.city_name}")
-                lat, lon, city_name = await weather_service.geocode_location(
-                    city_name=request.city_name
-                )
-                logger.info(f"Geocoded to: {city_name} ({lat}, {lon})")
-        else:
-            # Coordinates provided, do reverse geocoding
-            logger.info(f"Reverse geocoding coordinates: ({request.lat}, {request.lon})")
-            lat, lon, city_name = await weather_service.geocode_location(
-                lat=request.lat,
-                lon=request.lon
-            )
-            logger.info(f"Reverse geocoded to: {city_name} ({lat}, {lon})")
-
-            # Check if this city is already cached
-            cache_entry = db.query(WeatherCache).filter(
-                WeatherCache.city_name == city_name
-            ).first()
-
-        now = datetime.now(timezone.utc)
-        current_hour = now.replace(minute=0, second=0, microsecond=0)
-
-        # Step 2: Handle new cache entry or existing cache entry
-        if not cache_entry:
-            logger.info(f"No cache entry for {city_name}, creating new entry...")
-
-            # Fetch all data for new city
-            current_weather = await weather_service.fetch_current_weather(lat, lon)
-            forecast_data = await weather_service.fetch_forecast(lat, lon)
-            aqi_data = await weather_service.fetch_air_pollution(lat, lon)
-
-            cache_entry = WeatherCache(
-                city_name=city_name,
-                latitude=lat,
-                longitude=lon,
-                current_weather=current_weather.dict(),
-                current_weather_updated_at=now,  # NOT rounded
-                aqi_data=aqi_data.dict(),
-                fetch_1_data=forecast_data,
-                fetch_1_time=current_hour,  # Rounded to hour
-            )
-            db.add(cache_entry)
+        # Step 1: Find the cache entry (geocoding only when needed)
+        cache_entry, lat, lon, city_name = await resolve_location(request, db)
+        access_tracker.record(city_name)
+
+        # Step 2: Fetch whatever is missing or expired (everything for a new city)
+        updates = await fetch_updates(db, weather_service, cache_entry, lat, lon)
+
+        # Step 3: Apply updates and re-materialize the stored response
+        cache_entry, needs_commit, changed = await apply_updates(db, cache_entry, city_name, lat, lon, updates)
+        if changed:
+            notify_updates(db, [cache_entry.city_name])
+        if needs_commit:
+            db.commit()
+        if changed:
+            weather_hub.publish(cache_entry.city_name, cache_entry.response_json)
+
+        # Step 4: Stream the pre-serialized response (or its units/horizon variant)
+        return variant_response(
+            cache_entry, request.units, request.hours, request.days,
+            negotiate_language(http_request.headers.get("accept-language")),
+            http_request.headers.get("accept-encoding")
+        )
 
-            # Build forecasts
-            fetch_data_list = [cache_entry.fetch_1_data, None, None]
-            cache_entry.hourly_forecast = [
-                h.dict() for h in weather_service.build_hourly_forecast(fetch_data_list)
-            ]
-            cache_entry.daily_forecast = [
-                d.dict() for d in weather_service.build_daily_forecast(forecast_data)
-            ]
+    except ValueError as e:
+        logger.error(f"Validation error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-            db.commit()
-            db.refresh(cache_entry)
-            logger.info(f"Created new cache entry for {city_name}")
+def notify_entries(db: Session, cache_entries: List[WeatherCache]):
+    """Announce refreshes to other workers; call before commit"""
+    notify_updates(db, [cache_entry.city_name for cache_entry in cache_entries])
+
+def publish_entries(cache_entries: List[WeatherCache]):
+    """Push committed refreshes to subscribers of those cities"""
+    for cache_entry in cache_entries:
+        weather_hub.publish(cache_entry.city_name, cache_entry.response_json)
+
+def batch_error(exc: Exception) -> bytes:
+    """Serialize a per-location error for the batch endpoint"""
+    if isinstance(exc, ValueError):
+        return orjson.dumps({"error": str(exc), "status_code": 400})
+    logger.error(f"Batch location error: {exc}", exc_info=exc)
+    return orjson.dumps({"error": f"Internal server error: {str(exc)}", "status_code": 500})
+
+@app.post("/api/weather/batch", response_model=BatchWeatherResponse)
+async def get_weather_batch(
+        request: BatchWeatherRequest,
+        http_request: Request,
+        stream: bool = False,
+        db: Session = Depends(get_db)
+):
+    """
+    Get weather data for several locations in one request (saved-locations screen).
 
+    - **locations**: List of location requests (same fields as `/api/weather`,
+      including `units`/`hours`/`days`), at most `BATCH_MAX_LOCATIONS`
+    - **stream**: Stream results as NDJSON (`{"index": i, "result": {...}}` per line)
+      in completion order instead of returning one JSON document
+
+    Cached cities are resolved with a single `IN` query, upstream refreshes run
+    concurrently, and results keep the order of `locations`. A location that
+    fails returns `{"error": ..., "status_code": ...}` in its slot.
+    """
+    locations = request.locations
+    results: List[Optional[bytes]] = [None] * len(locations)
+    language = negotiate_language(http_request.headers.get("accept-language"))
+
+    # Step 1: Reverse geocode coordinates concurrently, then look up all names at once
+    resolved: Dict[int, Tuple[float, float, str]] = {}
+    reverse = [i for i, loc in enumerate(locations) if not loc.city_name]
+    geocoded = await asyncio.gather(
+        *(weather_service.geocode_location(lat=locations[i].lat, lon=locations[i].lon) for i in reverse),
+        return_exceptions=True
+    )
+    for i, result in zip(reverse, geocoded):
+        if isinstance(result, Exception):
+            results[i] = batch_error(result)
         else:
-            # Step 3: Check if current weather needs update (15-minute cache)
-            needs_current_update = cache_entry.needs_current_weather_fetch()
-
-            if needs_current_update:
-                logger.info(f"Current weather expired for {city_name} (>15 min), fetching new data...")
-                current_weather = await weather_service.fetch_current_weather(lat, lon)
-                cache_entry.current_weather = current_weather.dict()
-                cache_entry.current_weather_updated_at = now  # NOT rounded
-                db.commit()
-                db.refresh(cache_entry)
-                logger.info(f"Updated current weather for {city_name}")
-            else:
-                logger.info(f"Current weather cache hit for {city_name} (fresh within 15 min)")
-
-            # Step 4: Check if forecast needs update (hourly, handled by background task mostly)
-            needs_forecast_update = cache_entry.needs_forecast_fetch()
-
-            if needs_forecast_update:
-                logger.info(f"Forecast expired for {city_name}, fetching new data...")
-                forecast_data = await weather_service.fetch_forecast(lat, lon)
-                aqi_data = await weather_service.fetch_air_pollution(lat, lon)
-
-                # Rotate fetches
-                cache_entry.fetch_3_data = cache_entry.fetch_2_data
-                cache_entry.fetch_3_time = cache_entry.fetch_2_time
-                cache_entry.fetch_2_data = cache_entry.fetch_1_data
-                cache_entry.fetch_2_time = cache_entry.fetch_1_time
-                cache_entry.fetch_1_data = forecast_data
-                cache_entry.fetch_1_time = current_hour
-
-                cache_entry.aqi_data = aqi_data.dict()
-
-                # Rebuild forecasts
-                fetch_data_list = [
-                    cache_entry.fetch_1_data,
-                    cache_entry.fetch_2_data,
-                    cache_entry.fetch_3_data
-                ]
-                cache_entry.hourly_forecast = [
-                    h.dict() for h in weather_service.build_hourly_forecast(fetch_data_list)
-                ]
-                cache_entry.daily_forecast = [
-                    d.dict() for d in weather_service.build_daily_forecast(forecast_data)
-                ]
+            resolved[i] = result
+
+    names = {loc.city_name for loc in locations if loc.city_name}
+    names.update(city_name for _, _, city_name in resolved.values())
+    entries = {
+        entry.city_name: entry
+        for entry in db.query(WeatherCache).filter(WeatherCache.city_name.in_(names)).all()
+    } if names else {}
+
+    # Step 2: Forward geocode names that are not cached yet (once per distinct name)
+    forward = list({loc.city_name for loc in locations if loc.city_name and loc.city_name not in entries})
+    geocoded = dict(zip(forward, await asyncio.gather(
+        *(weather_service.geocode_location(city_name=name) for name in forward),
+        return_exceptions=True
+    )))
+    missing = set()
+    for i, loc in enumerate(locations):
+        result = geocoded.get(loc.city_name)
+        if result is None:
+            continue
+        if isinstance(result, Exception):
+            results[i] = batch_error(result)
+        else:
+            resolved[i] = result
+            if result[2] not in entries:
+                missing.add(result[2])
+    if missing:
+        entries.update(
+            (entry.city_name, entry)
+            for entry in db.query(WeatherCache).filter(WeatherCache.city_name.in_(missing)).all()
+        )
 
+    for i, loc in enumerate(locations):
+        if i not in resolved and results[i] is None:
+            entry = entries[loc.city_name]
+            resolved[i] = (entry.latitude, entry.longitude, entry.city_name)
+
+    # Step 3: Refresh each distinct city once, concurrently
+    cities: Dict[str, List[int]] = {}
+    for i, (_, _, city_name) in resolved.items():
+        cities.setdefault(city_name, []).append(i)
+
+    for city_name in cities:
+        access_tracker.record(city_name)
+
+    # Expired current weather of cities with a known OpenWeather id: one group call per 20 cities
+    group_ids = {
+        city_name: entries[city_name].openweather_id
+        for city_name in cities
+        if city_name in entries
+        and entries[city_name].openweather_id
+        and entries[city_name].needs_current_weather_fetch()
+    }
+    prefetched: Dict[str, WeatherData] = {}
+    if group_ids:
+        try:
+            grouped = await weather_service.fetch_current_weather_many(list(group_ids.values()))
+            prefetched = {
+                city_name: grouped[city_id] for city_name, city_id in group_ids.items() if city_id in grouped
+            }
+        except Exception as e:
+            # Fall back to per-city fetches
+            logger.warning(f"Group current weather fetch failed: {e}")
+
+    semaphore = asyncio.Semaphore(BATCH_UPSTREAM_CONCURRENCY)
+    changed_entries: List[WeatherCache] = []
+
+    async def refresh(city_name: str) -> Tuple[str, Any]:
+        lat, lon, _ = resolved[cities[city_name][0]]
+        try:
+            async with semaphore:
+                updates = await fetch_updates(
+                    db, weather_service, entries.get(city_name), lat, lon, prefetched.get(city_name)
+                )
+            entry, _, changed = await apply_updates(db, entries.get(city_name), city_name, lat, lon, updates)
+            entries[city_name] = entry
+            if changed:
+                changed_entries.append(entry)
+            return city_name, entry
+        except Exception as e:
+            return city_name, e
+
+    def location_body(i: int, result: Any) -> bytes:
+        if isinstance(result, Exception):
+            return batch_error(result)
+        loc = locations[i]
+        return variant_body(result, loc.units, loc.hours, loc.days, language)
+
+    refreshes = [refresh(city_name) for city_name in cities]
+
+    if stream:
+        async def ndjson():
+            try:
+                for i, result in enumerate(results):
+                    if result is not None:
+                        yield b'{"index":%d,"result":%s}\n' % (i, result)
+                for refreshed in asyncio.as_completed(refreshes):
+                    city_name, result = await refreshed
+                    for i in cities[city_name]:
+                        yield b'{"index":%d,"result":%s}\n' % (i, location_body(i, result))
+                notify_entries(db, changed_entries)
                 db.commit()
-                db.refresh(cache_entry)
-                logger.info(f"Updated forecast for {city_name}")
-
-        # Step 5: Build response from cache
-        return WeatherResponse(
-            city_name=cache_entry.city_name,
-            latitude=cache_entry.latitude,
-            longitude=cache_entry.longitude,
-            current=cache_entry.current_weather,
-            hourly=[h for h in cache_entry.hourly_forecast] if cache_entry.hourly_forecast else [],
-            daily=[d for d in cache_entry.daily_forecast] if cache_entry.daily_forecast else [],
-            aqi=cache_entry.aqi_data,
-            current_weather_updated_at=cache_entry.current_weather_updated_at,  # NOT rounded timestamp
-            updated_at=cache_entry.updated_at or current_hour
+                publish_entries(changed_entries)
+            except Exception:
+                db.rollback()
+                raise
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    try:
+        for city_name, result in await asyncio.gather(*refreshes):
+            for i in cities[city_name]:
+                results[i] = location_body(i, result)
+        notify_entries(db, changed_entries)
+        db.commit()
+        publish_entries(changed_entries)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Unexpected error in batch request: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    return Response(content=b'{"results":[' + b",".join(results) + b"]}", media_type="application/json")
+
+@app.post("/api/weather/delta", response_model=WeatherDeltaResponse)
+async def get_weather_delta(
+        request: DeltaWeatherRequest,
+        http_request: Request,
+        db: Session = Depends(get_db)
+):
+    """
+    Incremental weather update for clients that already hold a response.
+
+    Same location fields and `units` as `/api/weather`, plus the client's last
+    `current_weather_updated_at` and `updated_at`. Returns current weather
+    and AQI only if they changed, and only the hourly/daily entries that are
+    new or different. `hourly_dts` / `daily_dates` list every entry currently
+    in the forecast so the client can drop the rest.
+    """
+    try:
+        cache_entry, lat, lon, city_name = await resolve_location(request, db)
+        access_tracker.record(city_name)
+
+        updates = await fetch_updates(db, weather_service, cache_entry, lat, lon)
+        cache_entry, needs_commit, changed = await apply_updates(db, cache_entry, city_name, lat, lon, updates)
+        if changed:
+            notify_updates(db, [cache_entry.city_name])
+        if needs_commit:
+            db.commit()
+        if changed:
+            weather_hub.publish(cache_entry.city_name, cache_entry.response_json)
+
+        body = render_delta_response(
+            cache_entry,
+            request.current_weather_updated_at,
+            request.updated_at,
+            cache_entry.fetch_1_time
+        )
+        language = negotiate_language(http_request.headers.get("accept-language"))
+        if request.units != "metric" or language != DEFAULT_LANGUAGE:
+            body = orjson.dumps(localize_response(convert_units(orjson.loads(body), request.units), language))
+        return Response(
+            content=body, media_type="application/json",
+            headers={"Vary": "Accept-Language", "Content-Language": language}
         )
 
     except ValueError as e:
@@ -247,6 +479,77 @@ async def get_weather(
         logger.error(f"Unexpected error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/api/weather/subscribe")
+async def subscribe_weather(
+        http_request: Request,
+        city: List[str] = Query(..., description="Standardized city name, repeatable"),
+        units: Literal["metric", "imperial", "standard"] = Query("metric")
+):
+    """
+    Server-Sent Events stream of weather updates for a set of cities.
+
+    - **city**: Standardized city name as returned by the API (e.g. "London, GB"),
+      repeat the parameter for several cities (at most `BATCH_MAX_LOCATIONS`)
+    - **units**: As in `/api/weather`, applied to every pushed response
+
+    Descriptions follow `Accept-Language`, negotiated once when subscribing.
+
+    Sends the cached response for each city on connect, then a `weather` event
+    with the full response whenever a refresh for one of the cities commits
+    (hourly forecast refresh or on-demand current weather refresh). Idle
+    connections get a keep-alive comment every `SUBSCRIBE_KEEPALIVE_SECONDS`.
+    """
+    city_names = list(dict.fromkeys(city))
+    if len(city_names) > BATCH_MAX_LOCATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_LOCATIONS} cities per subscription.")
+
+    # Subscribe before reading the snapshot so no refresh falls in between
+    subscription = weather_hub.subscribe(city_names)
+    for city_name in city_names:
+        access_tracker.record(city_name)
+
+    db = SessionLocal()
+    try:
+        snapshot = db.query(WeatherCache.city_name, WeatherCache.response_json).filter(
+            WeatherCache.city_name.in_(city_names)
+        ).all()
+    except Exception:
+        weather_hub.unsubscribe(subscription)
+        raise
+    finally:
+        db.close()
+
+    language = negotiate_language(http_request.headers.get("accept-language"))
+
+    def event(payload: bytes) -> bytes:
+        if units != "metric" or language != DEFAULT_LANGUAGE:
+            payload = orjson.dumps(localize_response(convert_units(orjson.loads(payload), units), language))
+        return b"event: weather\ndata: " + payload + b"\n\n"
+
+    async def events():
+        try:
+            for _, payload in snapshot:
+                if payload is not None:
+                    yield event(payload)
+            while True:
+                updates = await subscription.wait(SUBSCRIBE_KEEPALIVE_SECONDS)
+                if not updates:
+                    yield b": keep-alive\n\n"
+                    continue
+                for payload in updates.values():
+                    yield event(payload)
+        finally:
+            weather_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+            "Vary": "Accept-Language", "Content-Language": language
+        }
+    )
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
@@ -255,6 +558,32 @@ async def health_check():
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: cache hits, upstream calls, DB and request latency, refresh lag"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/admin/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile(
+        seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+        tasks: bool = Query(True, description="Also sample where suspended asyncio tasks are waiting")
+):
+    """
+    Sample this worker's stacks for `seconds` and return them in collapsed
+    format (feed to flamegraph.pl or speedscope). One profile at a time.
+    """
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    async with profile_lock:
+        profiler = SamplingProfiler(loop=asyncio.get_running_loop() if tasks else None)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            counts = await asyncio.to_thread(profiler.stop)
+    logger.info(f"Profiled worker {os.getpid()} for {seconds}s: {profiler.samples} samples")
+    return PlainTextResponse(collapsed(counts) + "\n")
+
 @app.get("/")
 async def root():
     """Root endpoint with API info"""
@@ -262,5 +591,6 @@ async def root():
         "name": "Weather Caching API",
         "version": "1.0.0",
         "docs": "/docs",
-        "health": "/api/health"
+        "health": "/api/health",
+        "metrics": "/metrics"
     }
\ No newline at end of file
@@ -0,0 +1,94 @@
+import time
+from typing import Optional, Set
+from prometheus_client import Counter, Gauge, Histogram
+
+# Cache behaviour of live requests
+CACHE_LOOKUPS = Counter(
+    "weather_cache_lookups_total", "Live request cache lookups", ["section", "result"]
+)  # section: current/forecast, result: hit/miss
+GEOCODE_CALLS = Counter("geocode_calls_total", "Geocoding calls to OpenWeather", ["direction"])
+AQI_TILE_LOOKUPS = Counter(
+    "aqi_tile_lookups_total", "AQI tile lookups", ["result"]
+)  # result: memory/database hit, shared (joined an in-flight fetch) or miss
+
+# OpenWeather
+UPSTREAM_REQUESTS = Counter(
+    "upstream_requests_total", "OpenWeather API calls", ["endpoint", "status"]
+)  # status: HTTP status code, or "error" when no response arrived
+API_KEY_REQUESTS = Counter(
+    "upstream_key_requests_total", "OpenWeather API calls per key", ["key", "status"]
+)  # key: position in the pool and last 4 characters
+API_KEY_COOLING = Gauge("upstream_key_cooling", "1 while a key is cooling off after HTTP 429/401", ["key"])
+UPSTREAM_SECONDS = Histogram(
+    "upstream_request_duration_seconds", "OpenWeather API call latency", ["endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+
+# Database
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+DB_POOL_CONNECTIONS = Gauge("db_pool_connections", "Connections in the SQLAlchemy pool", ["state"])
+
+# API
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "API request latency", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+# Scheduler
+REFRESH_CITIES = Counter(
+    "forecast_refresh_cities_total", "Background forecast refreshes", ["result"]
+)  # result: done/failed/throttled
+REFRESH_RUN_SECONDS = Histogram(
+    "forecast_refresh_run_duration_seconds", "Duration of one background refresh run",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+REFRESH_LAG_SECONDS = Gauge(
+    "forecast_refresh_lag_seconds", "How far the stalest forecast of a tier is past its refresh interval", ["tier"]
+)
+REFRESH_QUEUE_DEPTH = Gauge("refresh_jobs_pending", "Jobs in the refresh_jobs table")
+
+
+def track_pool(pool):
+    """Export the pool's connection counts (read at scrape time)"""
+    if not hasattr(pool, "checkedout"):
+        return  # Pools without counters (SQLite in-memory)
+    DB_POOL_CONNECTIONS.labels(state="checked_out").set_function(pool.checkedout)
+    DB_POOL_CONNECTIONS.labels(state="idle").set_function(pool.checkedin)
+    # overflow() counts from -pool_size until the pool is full
+    DB_POOL_CONNECTIONS.labels(state="overflow").set_function(lambda: max(0, pool.overflow()))
+
+
+class MetricsMiddleware:
+    """
+    Observes request latency per route. Unknown paths are grouped as
+    "unmatched" so scanners can't blow up label cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.routes: Optional[Set[str]] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if self.routes is None:
+                self.routes = {route.path for route in scope["app"].routes}
+            route = scope["path"] if scope["path"] in self.routes else "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
@@ -0,0 +1,177 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import and_, bindparam, func, or_, update
+from sqlalchemy.orm import Session
+
+from .database import WeatherCache
+
+logger = logging.getLogger(__name__)
+
+# Refresh tiers by last access: hot cities refresh every hour in their slot,
+# warm ones every WARM_REFRESH_HOURS, cold ones only on demand
+HOT_WINDOW_HOURS = float(os.getenv("HOT_WINDOW_HOURS", "6"))
+WARM_WINDOW_HOURS = float(os.getenv("WARM_WINDOW_HOURS", "72"))
+WARM_REFRESH_HOURS = int(os.getenv("WARM_REFRESH_HOURS", "6"))
+
+# Cities untouched for this many days are deleted (0 disables eviction)
+EVICT_AFTER_DAYS = float(os.getenv("EVICT_AFTER_DAYS", "30"))
+
+# access_count is multiplied by this once a day so it tracks recent popularity
+ACCESS_DECAY = float(os.getenv("ACCESS_DECAY", "0.5"))
+
+
+class AccessTracker:
+    """
+    Counts city requests in memory and writes them to the DB in one batch,
+    instead of a write per request. Flushed every minute by the scheduler.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._last_seen: Dict[str, datetime] = {}
+
+    def record(self, city_name: str):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._hits[city_name] = self._hits.get(city_name, 0) + 1
+            self._last_seen[city_name] = now
+
+    def flush(self, db: Session) -> int:
+        """Write accumulated hits; returns the number of cities updated"""
+        with self._lock:
+            hits, self._hits = self._hits, {}
+            last_seen, self._last_seen = self._last_seen, {}
+
+        if not hits:
+            return 0
+
+        table = WeatherCache.__table__
+        statement = (
+            update(table)
+            .where(table.c.city_name == bindparam("b_city_name"))
+            .values(
+                access_count=func.coalesce(table.c.access_count, 0) + bindparam("b_hits"),
+                last_accessed_at=bindparam("b_last_seen"),
+                # Reads are not data changes: keep updated_at from firing its onupdate
+                updated_at=table.c.updated_at
+            )
+        )
+        try:
+            db.execute(statement, [
+                {"b_city_name": city_name, "b_hits": count, "b_last_seen": last_seen[city_name]}
+                for city_name, count in hits.items()
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the hits back so they are not lost
+            with self._lock:
+                for city_name, count in hits.items():
+                    self._hits[city_name] = self._hits.get(city_name, 0) + count
+                    self._last_seen.setdefault(city_name, last_seen[city_name])
+            raise
+
+        return len(hits)
+
+
+def last_activity():
+    """SQL expression for a city's last activity (never-requested cities count from creation)"""
+    return func.coalesce(WeatherCache.last_accessed_at, WeatherCache.created_at)
+
+
+def scheduled_refresh_filter(now: datetime, slot_start: datetime):
+    """
+    SQL filter for cities the scheduler should refresh in a slot starting at slot_start:
+    hot cities every slot, warm cities once every WARM_REFRESH_HOURS slots.
+    Cold cities are left to live requests.
+    """
+    activity = last_activity()
+    hot = activity >= now - timedelta(hours=HOT_WINDOW_HOURS)
+    warm_due = and_(
+        activity >= now - timedelta(hours=WARM_WINDOW_HOURS),
+        or_(
+            WeatherCache.fetch_1_time.is_(None),
+            WeatherCache.fetch_1_time < slot_start - timedelta(hours=WARM_REFRESH_HOURS - 1)
+        )
+    )
+    return or_(hot, warm_due)
+
+
+def current_slot_starts(now: datetime) -> List[datetime]:
+    """
+    Start of the current slot for each minute of refresh_offset: this hour's for
+    minutes already over, the previous hour's for the rest
+    """
+    hour_start = now.replace(minute=0, second=0, microsecond=0)
+    return [
+        hour_start + timedelta(minutes=minute) - (timedelta(0) if minute < now.minute else timedelta(hours=1))
+        for minute in range(60)
+    ]
+
+
+def due_refresh_filter(now: datetime, slot_starts: List[datetime]):
+    """SQL filter for cities not refreshed since their current slot started (and due in their tier)"""
+    return or_(*(
+        and_(
+            WeatherCache.refresh_offset >= minute * 60,
+            WeatherCache.refresh_offset < (minute + 1) * 60,
+            or_(WeatherCache.fetch_1_time.is_(None), WeatherCache.fetch_1_time < slot_start),
+            # Only hot cities every hour, warm ones every few hours, cold ones on demand
+            scheduled_refresh_filter(now, slot_start)
+        )
+        for minute, slot_start in enumerate(slot_starts)
+    ))
+
+
+def refresh_lag_by_tier(db: Session, now: Optional[datetime] = None) -> Dict[str, float]:
+    """Seconds the stalest forecast of the hot and warm tiers is past its refresh interval"""
+    now = now or datetime.now(timezone.utc)
+    activity = last_activity()
+    hot_since = now - timedelta(hours=HOT_WINDOW_HOURS)
+    tiers = (
+        ("hot", activity >= hot_since, 1),
+        ("warm", and_(activity < hot_since, activity >= now - timedelta(hours=WARM_WINDOW_HOURS)), WARM_REFRESH_HOURS),
+    )
+
+    lags = {}
+    for tier, condition, interval_hours in tiers:
+        oldest = db.query(func.min(WeatherCache.fetch_1_time)).filter(
+            condition, WeatherCache.fetch_1_time.isnot(None)
+        ).scalar()
+        if oldest is None:
+            lags[tier] = 0.0
+            continue
+        if oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        lags[tier] = max(0.0, (now - oldest).total_seconds() - interval_hours * 3600)
+    return lags
+
+
+def decay_and_evict(db: Session, now: Optional[datetime] = None) -> int:
+    """Decay access counts and delete cities untouched for EVICT_AFTER_DAYS; returns evicted count"""
+    now = now or datetime.now(timezone.utc)
+
+    db.query(WeatherCache).filter(WeatherCache.access_count > 0).update(
+        {
+            WeatherCache.access_count: WeatherCache.access_count * ACCESS_DECAY,
+            WeatherCache.updated_at: WeatherCache.updated_at
+        },
+        synchronize_session=False
+    )
+
+    evicted = 0
+    if EVICT_AFTER_DAYS > 0:
+        evicted = db.query(WeatherCache).filter(
+            last_activity() < now - timedelta(days=EVICT_AFTER_DAYS)
+        ).delete(synchronize_session=False)
+
+    db.commit()
+    return evicted
+
+
+# Global instance
+access_tracker = AccessTracker()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# Opt-in: profile /api/weather requests and log the stacks of those slower than this (ms); 0 disables
+PROFILE_SLOW_REQUESTS_MS = float(os.getenv("PROFILE_SLOW_REQUESTS_MS", "0"))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def thread_stack(frame) -> List[str]:
+    """Frames of a running thread, outermost first"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def coroutine_stack(task: asyncio.Task) -> List[str]:
+    """
+    Where a suspended task is waiting, outermost first. Follows the await
+    chain (Task.get_stack() only returns the outermost coroutine frame).
+    """
+    labels = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return labels
+
+
+def collapsed(counts: Counter) -> str:
+    """Collapsed-stack text ("frame;frame;frame count" per line), as read by flamegraph.pl and speedscope"""
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
+
+
+class SamplingProfiler:
+    """
+    Samples the whole process from a background thread: the stack of every
+    thread (CPU time, including the event loop's running coroutine) and,
+    optionally, where each suspended asyncio task is waiting (wall time).
+    Nothing is instrumented, so overhead is one stack walk per interval.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.interval = interval
+        self.loop = loop
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.counts
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(own)
+
+    def sample(self, own_ident: Optional[int] = None):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = thread_stack(frame)
+            self.counts[";".join([f"thread {names.get(ident, ident)}"] + stack)] += 1
+
+        if self.loop is not None:
+            running = asyncio.tasks._current_tasks.get(self.loop)
+            for task in asyncio.all_tasks(self.loop):
+                # The running task already shows up in the event loop thread's stack
+                if task is running or task.done():
+                    continue
+                stack = coroutine_stack(task)
+                if stack:
+                    self.counts[";".join([f"awaiting {task.get_name()}"] + stack)] += 1
+        self.samples += 1
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in per-request profiling (PROFILE_SLOW_REQUESTS_MS). While requests
+    are tracked, one sampler thread attributes each sample to the request
+    task it caught: the event loop's stack if that request was running,
+    its await chain otherwise. Requests that end up slower than the
+    threshold have their collapsed stacks logged; the rest are discarded.
+    """
+
+    def __init__(self, threshold_ms: float = PROFILE_SLOW_REQUESTS_MS, interval: float = PROFILE_INTERVAL):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.tracked: Dict[asyncio.Task, Counter] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self) -> asyncio.Task:
+        task = asyncio.current_task()
+        with self._lock:
+            self.tracked[task] = Counter()
+        if self._thread is None or not self._thread.is_alive():
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+            self._thread.start()
+        return task
+
+    def end(self, task: asyncio.Task, label: str, duration_ms: float):
+        with self._lock:
+            counts = self.tracked.pop(task, Counter())
+        if duration_ms >= self.threshold_ms and counts:
+            logger.warning(
+                f"Slow request {label} ({duration_ms:.0f} ms), {sum(counts.values())} samples:\n{collapsed(counts)}"
+            )
+
+    def _run(self):
+        # Stops itself once no request has been tracked for a while
+        idle_since = time.monotonic()
+        while time.monotonic() - idle_since < 10:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self.tracked:
+                    continue
+                idle_since = time.monotonic()
+                running = asyncio.tasks._current_tasks.get(self._loop)
+                loop_frame = sys._current_frames().get(self._loop_thread)
+                for task, counts in self.tracked.items():
+                    if task is running and loop_frame is not None:
+                        counts[";".join(["running"] + thread_stack(loop_frame))] += 1
+                    else:
+                        counts[";".join(["awaiting"] + coroutine_stack(task))] += 1
+
+
+class SlowRequestProfilerMiddleware:
+    """Tracks requests to `paths` with a SlowRequestProfiler"""
+
+    def __init__(self, app, paths=("/api/weather",), threshold_ms: float = PROFILE_SLOW_REQUESTS_MS):
+        self.app = app
+        self.paths = set(paths)
+        self.profiler = SlowRequestProfiler(threshold_ms)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        task = self.profiler.begin()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.profiler.end(task, f"{scope['method']} {scope['path']}", duration_ms)
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel that carries "<instance id>:<city name>" refresh notices
+# between workers, so subscribers hear about refreshes made by another process
+NOTIFY_CHANNEL = "weather_updates"
+INSTANCE_ID = uuid.uuid4().hex[:12]
+
+
+class Subscription:
+    """
+    One client's subscription to a set of cities.
+
+    Only the latest payload per city is kept, so a slow client never queues
+    up stale updates and memory stays bounded by the number of cities.
+    """
+
+    def __init__(self, city_names: Iterable[str]):
+        self.city_names = set(city_names)
+        self.pending: Dict[str, bytes] = {}
+        self.event = asyncio.Event()
+
+    def push(self, city_name: str, payload: bytes):
+        self.pending[city_name] = payload
+        self.event.set()
+
+    async def wait(self, timeout: float) -> Dict[str, bytes]:
+        """Wait for updates; returns {} on timeout (time for a keep-alive)"""
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return {}
+
+        updates, self.pending = self.pending, {}
+        self.event.clear()
+        return updates
+
+
+class WeatherHub:
+    """
+    In-process fan-out of refreshed weather responses to subscribers.
+
+    Publishers hand over the pre-serialized response bytes once; every
+    subscriber gets a reference to the same bytes, so fan-out cost is a dict
+    write per subscriber regardless of payload size.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, city_names: Iterable[str]) -> Subscription:
+        subscription = Subscription(city_names)
+        for city_name in subscription.city_names:
+            self.subscribers.setdefault(city_name, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for city_name in subscription.city_names:
+            subscribers = self.subscribers.get(city_name)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[city_name]
+
+    def has_subscribers(self, city_name: str) -> bool:
+        return city_name in self.subscribers
+
+    def publish(self, city_name: str, payload: Optional[bytes]):
+        """Push a refreshed response to everyone subscribed to the city"""
+        if payload is None:
+            return
+        subscribers = self.subscribers.get(city_name)
+        if not subscribers:
+            return
+        for subscription in subscribers:
+            subscription.push(city_name, payload)
+        logger.debug(f"Published update for {city_name} to {len(subscribers)} subscribers")
+
+
+def notify_updates(db: Session, city_names: Iterable[str]):
+    """
+    Queue refresh notices for other workers; call before db.commit().
+    NOTIFY is transactional, so they are only delivered once the data is visible.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for city_name in city_names:
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": NOTIFY_CHANNEL, "payload": f"{INSTANCE_ID}:{city_name}"}
+        )
+
+
+class UpdateListener:
+    """
+    LISTENs for refresh notices from other workers and republishes the stored
+    responses to local subscribers. Notices only carry the city name; the
+    response is read from the DB, and only for cities someone here follows.
+    """
+
+    RECONNECT_SECONDS = 5.0
+
+    def __init__(self, hub: WeatherHub, engine: Engine, load_responses: Callable[[List[str]], Dict[str, bytes]]):
+        self.hub = hub
+        self.engine = engine
+        self.load_responses = load_responses
+        self._connection = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        if self.engine.dialect.name != "postgresql":
+            return
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._connection = self.engine.raw_connection()
+            driver_connection = self._connection.driver_connection
+            driver_connection.autocommit = True
+            driver_connection.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+            self._loop.add_reader(driver_connection.fileno(), self._on_notify)
+            logger.info(f"Listening for weather updates on '{NOTIFY_CHANNEL}'")
+        except Exception as e:
+            logger.error(f"Could not listen for weather updates: {e}")
+            self._reconnect_later()
+
+    def stop(self):
+        if self._connection is None:
+            return
+        try:
+            self._loop.remove_reader(self._connection.driver_connection.fileno())
+            self._connection.invalidate()
+        except Exception:
+            pass
+        self._connection = None
+
+    def _reconnect_later(self):
+        self.stop()
+        self._loop.call_later(self.RECONNECT_SECONDS, self.start)
+
+    def _on_notify(self):
+        driver_connection = self._connection.driver_connection
+        try:
+            driver_connection.poll()
+        except Exception as e:
+            logger.warning(f"Weather update listener disconnected: {e}")
+            self._reconnect_later()
+            return
+
+        city_names = set()
+        while driver_connection.notifies:
+            origin, _, city_name = driver_connection.notifies.pop(0).payload.partition(":")
+            if origin != INSTANCE_ID and self.hub.has_subscribers(city_name):
+                city_names.add(city_name)
+        if not city_names:
+            return
+
+        try:
+            responses = self.load_responses(list(city_names))
+        except Exception as e:
+            logger.error(f"Error loading notified weather updates: {e}")
+            return
+        for city_name, payload in responses.items():
+            self.hub.publish(city_name, payload)
+
+
+# Global instance
+weather_hub = WeatherHub()
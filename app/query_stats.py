@@ -0,0 +1,138 @@
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .timing import record_phase
+from .metrics import DB_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this (ms) are logged with their plan; 0 disables
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+
+# A request or job running more statements than this, or the same statement
+# this many times (likely N+1), gets a warning
+QUERY_COUNT_WARN = int(os.getenv("QUERY_COUNT_WARN", "25"))
+REPEATED_QUERY_WARN = int(os.getenv("REPEATED_QUERY_WARN", "10"))
+
+
+class QueryStats:
+    """Statements run within one count_queries() scope"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.duration_ms = 0.0
+        self.statements: Counter = Counter()
+
+    def most_repeated(self):
+        return self.statements.most_common(1)[0] if self.statements else (None, 0)
+
+
+_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def count_queries(label: str, warn: bool = True, items: int = 1) -> Iterator[QueryStats]:
+    """
+    Count the statements run in this block (a request or a job), across any
+    engine instrumented with instrument_engine(). Warns about scopes that
+    run too many statements or repeat one (N+1).
+
+    A scope covering a batch passes its size as `items`: the statement budget
+    scales with it, and a statement counts as repeated once it runs more than
+    once per item (one UPDATE per city is expected, a reload per city is not).
+    """
+    stats = QueryStats(label)
+    token = _stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+        if warn:
+            statement, repeats = stats.most_repeated()
+            if repeats >= REPEATED_QUERY_WARN and repeats > items:
+                logger.warning(
+                    f"Possible N+1 in {label}: same statement ran {repeats} times "
+                    f"({stats.count} total): {statement[:200]}"
+                )
+            elif stats.count > QUERY_COUNT_WARN * items:
+                logger.warning(f"{label} ran {stats.count} statements ({stats.duration_ms:.1f} ms)")
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    """Plan of a statement, run on the raw connection so it isn't instrumented itself"""
+    cursor = conn.connection.cursor()
+    try:
+        if conn.dialect.name != "postgresql":
+            cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            rows = cursor.fetchall()
+        else:
+            # A failed EXPLAIN must not abort the caller's transaction
+            cursor.execute("SAVEPOINT explain_slow_query")
+            try:
+                cursor.execute("EXPLAIN " + statement, parameters)
+                rows = cursor.fetchall()
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+                raise
+            cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+        return "\n".join(" ".join(str(column) for column in row) for row in rows)
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_started
+    duration_ms = duration * 1000
+    DB_QUERY_SECONDS.observe(duration)
+    # Also counts towards the request's "db" timing phase (no-op outside timed requests)
+    record_phase("db", duration_ms)
+
+    stats = _stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration_ms += duration_ms
+        stats.statements[statement] += 1
+
+    if SLOW_QUERY_MS and duration_ms >= SLOW_QUERY_MS:
+        plan = ""
+        # Only plain reads: EXPLAIN never runs them, but keep writes out of it entirely
+        if SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip()[:6].upper() == "SELECT":
+            try:
+                plan = "\n" + _explain(conn, statement, parameters)
+            except Exception as e:
+                plan = f"\n(EXPLAIN failed: {e})"
+        label = f" in {stats.label}" if stats is not None else ""
+        logger.warning(f"Slow query{label} ({duration_ms:.1f} ms): {statement[:500]}{plan}")
+
+
+def instrument_engine(engine: Engine):
+    """Time every statement: metrics, request timing, per-scope counts and slow-query log"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryCountMiddleware:
+    """Counts the statements of each HTTP request (see count_queries)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with count_queries(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
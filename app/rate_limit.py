@@ -0,0 +1,80 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+import httpx
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Concurrency limit that adapts to upstream behaviour (AIMD).
+
+    - Each fast success (latency under target) grows the limit by 1/limit,
+      i.e. roughly +1 per "round" of requests.
+    - Slow responses shrink it by 10%, throttling (HTTP 429) halves it and
+      pauses new requests for the Retry-After period.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = 1,
+        max_limit: int = 20,
+        initial_limit: Optional[int] = None,
+        target_latency: float = 2.0
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(initial_limit or min_limit)
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.min_limit, min(self.max_limit, int(self.limit)))
+
+    async def acquire(self):
+        async with self._condition:
+            while self.in_flight >= self.current_limit:
+                await self._condition.wait()
+            self.in_flight += 1
+
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    def record_success(self, latency: float):
+        if latency <= self.target_latency:
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+        else:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+
+    def record_throttled(self, retry_after: Optional[float] = None):
+        self.limit = max(self.min_limit, self.limit / 2)
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def record_failure(self):
+        self.limit = max(self.min_limit, self.limit * 0.9)
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse a Retry-After header given in seconds"""
+    try:
+        return float(response.headers.get("retry-after", ""))
+    except ValueError:
+        return None
@@ -0,0 +1,144 @@
+import gzip
+import os
+import orjson
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from fastapi import Response
+
+from .database import WeatherCache
+from .executor import run_cpu
+
+# Compression level for the stored gzip variant (written once per refresh, served many times)
+GZIP_LEVEL = 6
+
+# Async write paths compress bodies this large (bytes) in the CPU executor instead of on
+# the event loop; smaller ones cost less to compress than to hand over
+GZIP_OFFLOAD_BYTES = int(os.getenv("GZIP_OFFLOAD_BYTES", "16384"))
+
+
+def render_weather_response(cache_entry: WeatherCache, fallback_updated_at: Optional[datetime] = None) -> bytes:
+    """
+    Serialize a cache entry into the final WeatherResponse JSON bytes.
+    The row only holds data built by WeatherService, so this skips Pydantic
+    and dumps the stored dicts directly with orjson (same shape as WeatherResponse).
+    """
+    return orjson.dumps({
+        "city_name": cache_entry.city_name,
+        "latitude": cache_entry.latitude,
+        "longitude": cache_entry.longitude,
+        "current": cache_entry.current_weather,
+        "hourly": cache_entry.hourly_forecast or [],
+        "daily": cache_entry.daily_forecast or [],
+        "aqi": cache_entry.aqi_data,
+        "current_weather_updated_at": cache_entry.current_weather_updated_at,  # NOT rounded timestamp
+        "updated_at": cache_entry.updated_at or fallback_updated_at,
+        "units": "metric",
+    })
+
+
+def compress_response(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def materialize_response(cache_entry: WeatherCache, fallback_updated_at: Optional[datetime] = None):
+    """
+    Store the pre-serialized response (plain and gzip) on the cache entry.
+    Must be called by every write path before commit so the read path can
+    stream the stored bytes without rebuilding the response.
+    """
+    if not cache_entry.current_weather or not cache_entry.aqi_data:
+        # Rows added from the admin panel have no data yet
+        cache_entry.response_json = None
+        cache_entry.response_json_gzip = None
+        return
+
+    body = render_weather_response(cache_entry, fallback_updated_at)
+    cache_entry.response_json = body
+    cache_entry.response_json_gzip = compress_response(body)
+
+
+async def materialize_response_async(cache_entry: WeatherCache, fallback_updated_at: Optional[datetime] = None):
+    """materialize_response for async write paths: large bodies are gzipped off the event loop"""
+    if not cache_entry.current_weather or not cache_entry.aqi_data:
+        materialize_response(cache_entry, fallback_updated_at)
+        return
+
+    body = render_weather_response(cache_entry, fallback_updated_at)
+    if len(body) >= GZIP_OFFLOAD_BYTES:
+        body_gzip = await run_cpu(compress_response, body)
+    else:
+        body_gzip = compress_response(body)
+    cache_entry.response_json = body
+    cache_entry.response_json_gzip = body_gzip
+
+
+def _since(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _changed_entries(entries: List[Dict[str, Any]], stamps: Dict[str, float], since: Optional[float], key: str):
+    if since is None:
+        return entries
+    # Entries without a stamp (cached before versioning) are always sent
+    return [entry for entry in entries if stamps.get(str(entry[key]), float("inf")) > since]
+
+
+def render_delta_response(
+    cache_entry: WeatherCache,
+    since_current: Optional[datetime],
+    since_updated: Optional[datetime],
+    fallback_updated_at: Optional[datetime] = None
+) -> bytes:
+    """
+    Serialize only what changed since the client's timestamps (WeatherDeltaResponse).
+    Uses the per-entry stamps kept in section_versions by the refresh paths.
+    """
+    versions = cache_entry.section_versions or {}
+    hourly = cache_entry.hourly_forecast or []
+    daily = cache_entry.daily_forecast or []
+    current_since = _since(since_current)
+    updated_since = _since(since_updated)
+
+    send_current = current_since is None or cache_entry.current_weather_updated_at.timestamp() > current_since
+    send_aqi = updated_since is None or versions.get("aqi", float("inf")) > updated_since
+
+    return orjson.dumps({
+        "city_name": cache_entry.city_name,
+        "latitude": cache_entry.latitude,
+        "longitude": cache_entry.longitude,
+        "current": cache_entry.current_weather if send_current else None,
+        "hourly": _changed_entries(hourly, versions.get("hourly", {}), updated_since, "dt"),
+        "daily": _changed_entries(daily, versions.get("daily", {}), updated_since, "date"),
+        "aqi": cache_entry.aqi_data if send_aqi else None,
+        "hourly_dts": [entry["dt"] for entry in hourly],
+        "daily_dates": [entry["date"] for entry in daily],
+        "current_weather_updated_at": cache_entry.current_weather_updated_at,  # NOT rounded timestamp
+        "updated_at": cache_entry.updated_at or fallback_updated_at,
+        "units": "metric",
+    })
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Check whether the client accepts gzip-encoded responses"""
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def stored_response(cache_entry: WeatherCache, accept_encoding: Optional[str] = None) -> Response:
+    """Build an HTTP response straight from the stored bytes (no validation)"""
+    headers = {"Vary": "Accept-Encoding"}
+
+    if cache_entry.response_json_gzip and accepts_gzip(accept_encoding):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=cache_entry.response_json_gzip, media_type="application/json", headers=headers)
+
+    return Response(content=cache_entry.response_json, media_type="application/json", headers=headers)
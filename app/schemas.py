@@ -1,7 +1,11 @@
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, validator
+from typing import Optional, List, Union, Literal
+from pydantic import BaseModel, validator, conint
 from datetime import datetime
 from pydantic import BaseModel, root_validator
+import os
+
+# Max locations accepted by POST /api/weather/batch
+BATCH_MAX_LOCATIONS = int(os.getenv("BATCH_MAX_LOCATIONS", "25"))
 
 class LocationRequest(BaseModel):
     lat: Optional[float] = None
@@ -23,15 +27,23 @@ class LocationRequest(BaseModel):
         return values
 
 
+class WeatherRequest(LocationRequest):
+    # Shaping of the cached metric data; no extra upstream calls
+    units: Literal["metric", "imperial", "standard"] = "metric"  # °C m/s, °F mph, K m/s
+    hours: Optional[conint(ge=1, le=120)] = None  # Hourly forecast horizon
+    days: Optional[conint(ge=1, le=6)] = None  # Daily forecast horizon
+
+
 class WeatherData(BaseModel):
     temp: float
     feels_like: float
     humidity: int
     pressure: int
-    description: str
+    description: str  # OpenWeather's English text; localized per Accept-Language
     icon: str
     wind_speed: float
     wind_deg: int
+    condition_id: Optional[int] = None  # OpenWeather condition code
 
 class HourlyForecast(BaseModel):
     dt: int  # Unix timestamp
@@ -43,6 +55,7 @@ class HourlyForecast(BaseModel):
     icon: str
     wind_speed: float
     pop: float  # Probability of precipitation
+    condition_id: Optional[int] = None
 
 class DailyForecast(BaseModel):
     dt: int
@@ -53,6 +66,7 @@ class DailyForecast(BaseModel):
     icon: str
     humidity: int
     wind_speed: float
+    condition_id: Optional[int] = None
 
 class AQIData(BaseModel):
     aqi: int
@@ -88,6 +102,7 @@ class WeatherResponse(BaseModel):
     aqi: AQIData
     current_weather_updated_at: datetime  # NOT rounded - exact fetch time for current weather
     updated_at: datetime  # For forecast data
+    units: str = "metric"
 
     class Config:
         json_schema_extra = {
@@ -103,7 +118,8 @@ class WeatherResponse(BaseModel):
                     "description": "clear sky",
                     "icon": "01d",
                     "wind_speed": 3.5,
-                    "wind_deg": 180
+                    "wind_deg": 180,
+                    "condition_id": 800
                 },
                 "hourly": [],
                 "daily": [],
@@ -116,6 +132,49 @@ class WeatherResponse(BaseModel):
                     "o3": 45.8
                 },
                 "current_weather_updated_at": "2025-11-03T08:23:45Z",
-                "updated_at": "2025-11-03T08:00:00Z"
+                "updated_at": "2025-11-03T08:00:00Z",
+                "units": "metric"
             }
-        }
\ No newline at end of file
+        }
+
+class BatchWeatherRequest(BaseModel):
+    locations: List[WeatherRequest]
+
+    @validator("locations")
+    def check_locations(cls, locations):
+        if not locations:
+            raise ValueError("Provide at least one location.")
+        if len(locations) > BATCH_MAX_LOCATIONS:
+            raise ValueError(f"At most {BATCH_MAX_LOCATIONS} locations per batch.")
+        return locations
+
+
+class BatchError(BaseModel):
+    error: str
+    status_code: int
+
+
+class BatchWeatherResponse(BaseModel):
+    results: List[Union[WeatherResponse, BatchError]]  # Same order as the requested locations
+
+
+class DeltaWeatherRequest(LocationRequest):
+    # Timestamps from the client's last response; omit them to get everything
+    current_weather_updated_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    units: Literal["metric", "imperial", "standard"] = "metric"
+
+
+class WeatherDeltaResponse(BaseModel):
+    city_name: str
+    latitude: float
+    longitude: float
+    current: Optional[WeatherData]  # Only if refreshed since the client's current_weather_updated_at
+    hourly: List[HourlyForecast]  # Only entries that are new or changed since the client's updated_at
+    daily: List[DailyForecast]
+    aqi: Optional[AQIData]
+    hourly_dts: List[int]  # All hourly entries currently in the forecast; drop any others
+    daily_dates: List[str]  # All daily entries currently in the forecast; drop any others
+    current_weather_updated_at: datetime
+    updated_at: datetime
+    units: str = "metric"
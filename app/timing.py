@@ -0,0 +1,94 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+import orjson
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+# Per-phase request timings in a Server-Timing header and JSON logs
+REQUEST_TIMING = os.getenv("REQUEST_TIMING", "true").lower() in ("1", "true", "yes")
+
+# Requests at least this slow (ms) get a structured timing log line; 0 logs every request
+TIMING_LOG_MIN_MS = float(os.getenv("TIMING_LOG_MIN_MS", "500"))
+
+# Phase name -> accumulated milliseconds for the current request (None outside requests)
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def record_phase(name: str, duration_ms: float):
+    """Add time to a phase of the current request; no-op outside a timed request"""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + duration_ms
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Time a block as a phase of the current request. Repeated or concurrent
+    phases with the same name add up (concurrent upstream calls can sum to
+    more than the request took).
+    """
+    if _timings.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, (time.perf_counter() - started) * 1000)
+
+
+def server_timing_header(timings: Dict[str, float], total_ms: float) -> str:
+    entries = [f"{name};dur={duration:.1f}" for name, duration in timings.items()]
+    entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    Collects phase timings for each HTTP request and sends them as a
+    Server-Timing header. Plain ASGI (not BaseHTTPMiddleware), so streamed
+    responses pass through untouched; the header covers the time until the
+    response starts, the log line the whole request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_header(timings, (time.perf_counter() - started) * 1000))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            total_ms = (time.perf_counter() - started) * 1000
+            if total_ms >= TIMING_LOG_MIN_MS:
+                logger.info(orjson.dumps({
+                    "event": "request_timing",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "total_ms": round(total_ms, 1),
+                    "phases": {name: round(duration, 1) for name, duration in timings.items()}
+                }).decode())
@@ -0,0 +1,172 @@
+import gzip
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+import orjson
+from fastapi import Response
+
+from .database import WeatherCache
+from .responses import GZIP_LEVEL, accepts_gzip, stored_response
+from .timing import phase
+from .localization import localize_response, DEFAULT_LANGUAGE
+
+# Rendered unit/horizon variants kept in memory (each holds a plain and a gzip body)
+VARIANT_CACHE_SIZE = int(os.getenv("VARIANT_CACHE_SIZE", "2048"))
+
+# Cached data is metric (OpenWeather units=metric): °C and m/s
+UNITS = ("metric", "imperial", "standard")
+
+MPS_TO_MPH = 2.2369362920544
+
+CURRENT_TEMPS = ("temp", "feels_like")
+HOURLY_TEMPS = ("temp", "feels_like")
+DAILY_TEMPS = ("temp_min", "temp_max")
+
+
+def convert_temp(celsius: float, units: str) -> float:
+    if units == "imperial":
+        return round(celsius * 9 / 5 + 32, 2)
+    if units == "standard":
+        return round(celsius + 273.15, 2)
+    return celsius
+
+
+def convert_speed(mps: float, units: str) -> float:
+    if units == "imperial":
+        return round(mps * MPS_TO_MPH, 2)
+    return mps
+
+
+def _convert_entry(entry: Dict[str, Any], temps: Tuple[str, ...], units: str) -> Dict[str, Any]:
+    entry = dict(entry)
+    for field in temps:
+        entry[field] = convert_temp(entry[field], units)
+    entry["wind_speed"] = convert_speed(entry["wind_speed"], units)
+    return entry
+
+
+def shape_response(body: Dict[str, Any], units: str, hours: Optional[int], days: Optional[int], now: int,
+                   language: str = DEFAULT_LANGUAGE) -> Dict[str, Any]:
+    """
+    Apply units, forecast horizon and language to a parsed metric response.
+    `hours` keeps the hourly entries from the one covering `now` (unix time) up
+    to that many hours ahead; `days` keeps that many daily entries from today (UTC).
+    """
+    hourly = body["hourly"]
+    daily = body["daily"]
+    if hours is not None:
+        # Entries are 3-hour blocks: keep the one in progress
+        hourly = [entry for entry in hourly if now - 10800 < entry["dt"] < now + hours * 3600]
+    if days is not None:
+        today = datetime.fromtimestamp(now, tz=timezone.utc).date().isoformat()
+        daily = [entry for entry in daily if entry["date"] >= today][:days]
+
+    body["hourly"] = hourly
+    body["daily"] = daily
+    return localize_response(convert_units(body, units), language)
+
+
+def convert_units(body: Dict[str, Any], units: str) -> Dict[str, Any]:
+    """
+    Convert a parsed metric response to `units`; also takes delta responses,
+    whose current weather may be missing and forecasts partial.
+    """
+    if units != "metric":
+        if body["current"] is not None:
+            body["current"] = _convert_entry(body["current"], CURRENT_TEMPS, units)
+        body["hourly"] = [_convert_entry(entry, HOURLY_TEMPS, units) for entry in body["hourly"]]
+        body["daily"] = [_convert_entry(entry, DAILY_TEMPS, units) for entry in body["daily"]]
+    body["units"] = units
+    return body
+
+
+class VariantCache:
+    """
+    LRU of rendered variants per city, valid while the city's stored response
+    is unchanged (and, with a horizon, within the current hour). Every variant
+    is derived from the one cached metric response, so more variants never
+    mean more upstream calls.
+    """
+
+    def __init__(self, max_size: int = VARIANT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, Tuple[tuple, bytes, bytes]]" = OrderedDict()
+
+    @staticmethod
+    def source_version(cache_entry: WeatherCache) -> tuple:
+        """
+        Identifies the stored response without keeping a copy of it: every write
+        path that changes it moves one of the timestamps, the forecast
+        fingerprint or the AQI section version
+        """
+        return (
+            cache_entry.current_weather_updated_at,
+            cache_entry.updated_at,
+            cache_entry.forecast_fingerprint,
+            (cache_entry.section_versions or {}).get("aqi"),
+        )
+
+    def get(self, cache_entry: WeatherCache, units: str, hours: Optional[int], days: Optional[int],
+            language: str = DEFAULT_LANGUAGE, now: Optional[datetime] = None) -> Tuple[bytes, bytes]:
+        """(plain, gzip) bodies of a variant, rendered on a miss"""
+        version = self.source_version(cache_entry)
+        # The horizon is relative to the current hour
+        hour = int((now or datetime.now(timezone.utc)).timestamp()) // 3600 * 3600
+        key = (
+            cache_entry.city_name, units, hours, days, language,
+            hour if hours is not None or days is not None else None
+        )
+
+        cached = self._entries.get(key)
+        if cached is not None and cached[0] == version:
+            self._entries.move_to_end(key)
+            return cached[1], cached[2]
+
+        with phase("serialize"):
+            body = orjson.dumps(
+                shape_response(orjson.loads(cache_entry.response_json), units, hours, days, hour, language)
+            )
+            body_gzip = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        self._entries[key] = (version, body, body_gzip)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return body, body_gzip
+
+
+variant_cache = VariantCache()
+
+
+def is_default_variant(units: str, hours: Optional[int], days: Optional[int], language: str) -> bool:
+    return units == "metric" and hours is None and days is None and language == DEFAULT_LANGUAGE
+
+
+def variant_body(cache_entry: WeatherCache, units: str, hours: Optional[int], days: Optional[int],
+                 language: str = DEFAULT_LANGUAGE) -> bytes:
+    """Plain response body of a variant (the stored body for the default one)"""
+    if is_default_variant(units, hours, days, language):
+        return cache_entry.response_json
+    return variant_cache.get(cache_entry, units, hours, days, language)[0]
+
+
+def variant_response(
+    cache_entry: WeatherCache,
+    units: str,
+    hours: Optional[int],
+    days: Optional[int],
+    language: str = DEFAULT_LANGUAGE,
+    accept_encoding: Optional[str] = None
+) -> Response:
+    """Like stored_response(), for the requested units, forecast horizon and language"""
+    if is_default_variant(units, hours, days, language):
+        response = stored_response(cache_entry, accept_encoding)
+    else:
+        body, body_gzip = variant_cache.get(cache_entry, units, hours, days, language)
+        if accepts_gzip(accept_encoding):
+            response = Response(content=body_gzip, media_type="application/json", headers={"Content-Encoding": "gzip"})
+        else:
+            response = Response(content=body, media_type="application/json")
+    response.headers["Vary"] = "Accept-Encoding, Accept-Language"
+    response.headers["Content-Language"] = language
+    return response
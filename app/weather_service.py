@@ -1,24 +1,166 @@
+import asyncio
 import os
+import time
 import httpx
+import orjson
 from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional, Tuple
 from .schemas import WeatherData, HourlyForecast, DailyForecast, AQIData
+from .timing import phase
+from .metrics import GEOCODE_CALLS, UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+from .api_keys import ApiKeyPool, shared_key_pool
+from .rate_limit import retry_after_seconds
+
+# OpenWeather's group endpoint accepts at most 20 city ids per call
+GROUP_MAX_IDS = 20
+
+
+def parse_current_weather(data: Dict[str, Any]) -> WeatherData:
+    """Build WeatherData from an OpenWeather current weather payload"""
+    # Trusted upstream data: construct() skips validation, casts keep the schema types
+    return WeatherData.construct(
+        temp=float(data["main"]["temp"]),
+        feels_like=float(data["main"]["feels_like"]),
+        humidity=int(data["main"]["humidity"]),
+        pressure=int(data["main"]["pressure"]),
+        description=data["weather"][0]["description"],
+        icon=data["weather"][0]["icon"],
+        wind_speed=float(data["wind"]["speed"]),
+        wind_deg=int(data["wind"].get("deg", 0)),
+        condition_id=data["weather"][0].get("id")
+    )
+
+
+def build_hourly_forecast(fetch_data_list: List[Dict[str, Any]]) -> List[HourlyForecast]:
+    """
+    Build hourly forecast from multiple 3-hour fetches.
+
+    OpenWeather free tier gives 3-hour step data. We fetch every hour and store it.
+    By combining the last 3 fetches, we can interpolate or provide more granular data.
+
+    For simplicity, we'll just merge all unique timestamps from the 3 fetches.
+    """
+    hourly_map = {}
+
+    for fetch_data in fetch_data_list:
+        if not fetch_data:
+            continue
+
+        for item in fetch_data.get("list", []):
+            dt = item["dt"]
+            if dt not in hourly_map:
+                hourly_map[dt] = HourlyForecast.construct(
+                    dt=dt,
+                    time=datetime.fromtimestamp(dt, tz=timezone.utc).isoformat(),
+                    temp=float(item["main"]["temp"]),
+                    feels_like=float(item["main"]["feels_like"]),
+                    humidity=int(item["main"]["humidity"]),
+                    description=item["weather"][0]["description"],
+                    icon=item["weather"][0]["icon"],
+                    wind_speed=float(item["wind"]["speed"]),
+                    pop=float(item.get("pop", 0.0)),
+                    condition_id=item["weather"][0].get("id")
+                )
+
+    # Sort by timestamp and return
+    return sorted(hourly_map.values(), key=lambda x: x.dt)
+
+
+def build_daily_forecast(forecast_data: Dict[str, Any]) -> List[DailyForecast]:
+    """
+    Build daily forecast from 3-hour data.
+    Aggregate 3-hour forecasts into daily min/max temperatures.
+    """
+    daily_map = {}
+
+    for item in forecast_data.get("list", []):
+        dt = item["dt"]
+        date_obj = datetime.fromtimestamp(dt, tz=timezone.utc).date()
+        date_str = date_obj.isoformat()
+
+        temp = float(item["main"]["temp"])
+
+        if date_str not in daily_map:
+            daily_map[date_str] = {
+                "dt": dt,
+                "date": date_str,
+                "temp_min": temp,
+                "temp_max": temp,
+                "description": item["weather"][0]["description"],
+                "icon": item["weather"][0]["icon"],
+                "humidity": int(item["main"]["humidity"]),
+                "wind_speed": float(item["wind"]["speed"]),
+                "condition_id": item["weather"][0].get("id"),
+            }
+        else:
+            daily_map[date_str]["temp_min"] = min(daily_map[date_str]["temp_min"], temp)
+            daily_map[date_str]["temp_max"] = max(daily_map[date_str]["temp_max"], temp)
+
+    return [
+        DailyForecast.construct(**data)
+        for data in sorted(daily_map.values(), key=lambda x: x["dt"])
+    ]
+
+
+def build_forecasts(
+    fetch_data_list: List[Dict[str, Any]],
+    forecast_data: Dict[str, Any]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Hourly and daily forecasts as plain dicts, as stored in the cache"""
+    hourly = [h.dict() for h in build_hourly_forecast(fetch_data_list)]
+    daily = [d.dict() for d in build_daily_forecast(forecast_data)]
+    return hourly, daily
+
+
+def build_forecasts_many(jobs: List[Tuple[List[Dict[str, Any]], Dict[str, Any]]]):
+    """build_forecasts for a batch of (fetch_data_list, forecast_data), one executor round trip"""
+    return [build_forecasts(fetch_data_list, forecast_data) for fetch_data_list, forecast_data in jobs]
+
 
 class WeatherService:
-    def __init__(self):
-        self.api_key = os.getenv("OPENWEATHER_API_KEY")
-        if not self.api_key:
-            raise ValueError("OPENWEATHER_API_KEY environment variable is required")
-        self.base_url = "https://api.openweathermap.org/data/2.5"
-        self.geo_url = "https://api.openweathermap.org/geo/1.0"
-
-    async def _make_request(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Make async HTTP request to OpenWeather API"""
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            params["appid"] = self.api_key
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None, api_keys: Optional[ApiKeyPool] = None):
+        # One or more keys (OPENWEATHER_API_KEYS), shared by every instance in the process
+        self.api_keys = api_keys or shared_key_pool()
+        # Overridable to point at a local stand-in of the OpenWeather API
+        self.base_url = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5")
+        self.geo_url = os.getenv("OPENWEATHER_GEO_URL", "https://api.openweathermap.org/geo/1.0")
+        self.transport = transport
+
+    async def _make_request(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        timing_phase: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Make async HTTP request to OpenWeather API (timed as upstream_<endpoint> by default).
+        A key answered with 429 or 401 cools off and the call is retried with another key, if one is ready.
+        """
+        endpoint = url.rsplit("/", 1)[-1]
+        async with httpx.AsyncClient(timeout=30.0, transport=self.transport) as client:
+            tried: Tuple[str, ...] = ()
+            while True:
+                key = self.api_keys.acquire(exclude=tried)
+                tried += (key.key,)
+                params["appid"] = key.key
+                started = time.perf_counter()
+                try:
+                    with phase(timing_phase or f"upstream_{endpoint}"):
+                        response = await client.get(url, params=params)
+                except httpx.HTTPError:
+                    self.api_keys.release(key, "error")
+                    UPSTREAM_REQUESTS.labels(endpoint, "error").inc()
+                    raise
+                status = str(response.status_code)
+                self.api_keys.release(key, status, retry_after_seconds(response) if status == "429" else None)
+                UPSTREAM_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+                UPSTREAM_REQUESTS.labels(endpoint, status).inc()
+
+                if status in ("401", "429") and self.api_keys.available(exclude=tried):
+                    continue
+                response.raise_for_status()
+                # orjson parses the ~15 KB forecast payloads several times faster than json
+                return orjson.loads(response.content)
 
     async def geocode_location(
         self,
@@ -49,7 +191,8 @@ class WeatherService:
             url = f"{self.geo_url}/reverse"
             params = {"lat": lat, "lon": lon, "limit": 1}
 
-        locations = await self._make_request(url, params)
+        GEOCODE_CALLS.labels("forward" if city_name else "reverse").inc()
+        locations = await self._make_request(url, params, "geocode")
         if not locations:
             raise ValueError("Location not found")
 
@@ -64,6 +207,14 @@ class WeatherService:
 
     async def fetch_current_weather(self, lat: float, lon: float) -> WeatherData:
         """Fetch current weather data"""
+        current_weather, _ = await self.fetch_current_weather_with_id(lat, lon)
+        return current_weather
+
+    async def fetch_current_weather_with_id(self, lat: float, lon: float) -> Tuple[WeatherData, Optional[int]]:
+        """
+        Fetch current weather data along with the OpenWeather city id of the location.
+        The id lets later refreshes go through the batched group endpoint.
+        """
         params = {
             "lat": lat,
             "lon": lon,
@@ -71,16 +222,30 @@ class WeatherService:
         }
         data = await self._make_request(f"{self.base_url}/weather", params)
 
-        return WeatherData(
-            temp=data["main"]["temp"],
-            feels_like=data["main"]["feels_like"],
-            humidity=data["main"]["humidity"],
-            pressure=data["main"]["pressure"],
-            description=data["weather"][0]["description"],
-            icon=data["weather"][0]["icon"],
-            wind_speed=data["wind"]["speed"],
-            wind_deg=data["wind"]["deg"]
-        )
+        return parse_current_weather(data), data.get("id") or None
+
+    async def fetch_current_weather_many(self, city_ids: List[int]) -> Dict[int, WeatherData]:
+        """
+        Fetch current weather for many OpenWeather city ids via the group endpoint,
+        GROUP_MAX_IDS per upstream call (chunks are fetched concurrently).
+        Ids missing from the upstream response are missing from the result.
+        """
+        unique_ids = list(dict.fromkeys(city_ids))
+        chunks = [unique_ids[i:i + GROUP_MAX_IDS] for i in range(0, len(unique_ids), GROUP_MAX_IDS)]
+
+        responses = await asyncio.gather(*(
+            self._make_request(
+                f"{self.base_url}/group",
+                {"id": ",".join(str(city_id) for city_id in chunk), "units": "metric"}
+            )
+            for chunk in chunks
+        ))
+
+        return {
+            int(item["id"]): parse_current_weather(item)
+            for data in responses
+            for item in data.get("list", [])
+        }
 
     async def fetch_forecast(self, lat: float, lon: float) -> Dict[str, Any]:
         """
@@ -104,78 +269,11 @@ class WeatherService:
 
         components = data["list"][0]["components"]
 
-        return AQIData(
-            aqi=data["list"][0]["main"]["aqi"],
-            pm2_5=components.get("pm2_5", 0),
-            pm10=components.get("pm10", 0),
-            co=components.get("co", 0),
-            no2=components.get("no2", 0),
-            o3=components.get("o3", 0)
+        return AQIData.construct(
+            aqi=int(data["list"][0]["main"]["aqi"]),
+            pm2_5=float(components.get("pm2_5", 0)),
+            pm10=float(components.get("pm10", 0)),
+            co=float(components.get("co", 0)),
+            no2=float(components.get("no2", 0)),
+            o3=float(components.get("o3", 0))
         )
-
-    def build_hourly_forecast(self, fetch_data_list: List[Dict[str, Any]]) -> List[HourlyForecast]:
-        """
-        Build hourly forecast from multiple 3-hour fetches.
-
-        OpenWeather free tier gives 3-hour step data. We fetch every hour and store it.
-        By combining the last 3 fetches, we can interpolate or provide more granular data.
-
-        For simplicity, we'll just merge all unique timestamps from the 3 fetches.
-        """
-        hourly_map = {}
-
-        for fetch_data in fetch_data_list:
-            if not fetch_data:
-                continue
-
-            for item in fetch_data.get("list", []):
-                dt = item["dt"]
-                if dt not in hourly_map:
-                    hourly_map[dt] = HourlyForecast(
-                        dt=dt,
-                        time=datetime.fromtimestamp(dt, tz=timezone.utc).isoformat(),
-                        temp=item["main"]["temp"],
-                        feels_like=item["main"]["feels_like"],
-                        humidity=item["main"]["humidity"],
-                        description=item["weather"][0]["description"],
-                        icon=item["weather"][0]["icon"],
-                        wind_speed=item["wind"]["speed"],
-                        pop=item.get("pop", 0.0)
-                    )
-
-        # Sort by timestamp and return
-        return sorted(hourly_map.values(), key=lambda x: x.dt)
-
-    def build_daily_forecast(self, forecast_data: Dict[str, Any]) -> List[DailyForecast]:
-        """
-        Build daily forecast from 3-hour data.
-        Aggregate 3-hour forecasts into daily min/max temperatures.
-        """
-        daily_map = {}
-
-        for item in forecast_data.get("list", []):
-            dt = item["dt"]
-            date_obj = datetime.fromtimestamp(dt, tz=timezone.utc).date()
-            date_str = date_obj.isoformat()
-
-            temp = item["main"]["temp"]
-
-            if date_str not in daily_map:
-                daily_map[date_str] = {
-                    "dt": dt,
-                    "date": date_str,
-                    "temp_min": temp,
-                    "temp_max": temp,
-                    "description": item["weather"][0]["description"],
-                    "icon": item["weather"][0]["icon"],
-                    "humidity": item["main"]["humidity"],
-                    "wind_speed": item["wind"]["speed"],
-                }
-            else:
-                daily_map[date_str]["temp_min"] = min(daily_map[date_str]["temp_min"], temp)
-                daily_map[date_str]["temp_max"] = max(daily_map[date_str]["temp_max"], temp)
-
-        return [
-            DailyForecast(**data)
-            for data in sorted(daily_map.values(), key=lambda x: x["dt"])
-        ]
\ No newline at end of file
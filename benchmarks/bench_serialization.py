@@ -0,0 +1,99 @@
+"""
+Serialization benchmark for a single /api/weather response.
+
+Compares the old Pydantic path (validate WeatherResponse + .json()) with the
+orjson path used to materialize responses, and with serving the stored bytes.
+
+Run from the repo root:
+    python -m benchmarks.bench_serialization
+"""
+import os
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("OPENWEATHER_API_KEY", "benchmark")
+
+from app.database import WeatherCache
+from app.schemas import WeatherResponse
+from app.responses import render_weather_response, materialize_response
+from app.weather_service import build_forecasts
+
+ITERATIONS = 2000
+
+
+def sample_forecast(start: int):
+    return {
+        "list": [
+            {
+                "dt": start + i * 10800,
+                "main": {"temp": 10.0 + i % 7, "feels_like": 9.0 + i % 7, "humidity": 60 + i % 30},
+                "weather": [{"description": "scattered clouds", "icon": "03d"}],
+                "wind": {"speed": 3.2},
+                "pop": 0.2,
+            }
+            for i in range(40)
+        ]
+    }
+
+
+def sample_entry() -> WeatherCache:
+    now = datetime.now(timezone.utc)
+    start = int(now.timestamp()) // 10800 * 10800
+    fetches = [sample_forecast(start), sample_forecast(start - 3600), sample_forecast(start - 7200)]
+    hourly, daily = build_forecasts(fetches, fetches[0])
+
+    return WeatherCache(
+        city_name="London, GB",
+        latitude=51.5074,
+        longitude=-0.1278,
+        current_weather={
+            "temp": 15.5, "feels_like": 14.2, "humidity": 72, "pressure": 1013,
+            "description": "clear sky", "icon": "01d", "wind_speed": 3.5, "wind_deg": 180
+        },
+        current_weather_updated_at=now,
+        hourly_forecast=hourly,
+        daily_forecast=daily,
+        aqi_data={"aqi": 2, "pm2_5": 12.5, "pm10": 18.3, "co": 230.4, "no2": 15.2, "o3": 45.8},
+        updated_at=now.replace(minute=0, second=0, microsecond=0),
+    )
+
+
+def pydantic_path(entry: WeatherCache) -> bytes:
+    return WeatherResponse(
+        city_name=entry.city_name,
+        latitude=entry.latitude,
+        longitude=entry.longitude,
+        current=entry.current_weather,
+        hourly=entry.hourly_forecast,
+        daily=entry.daily_forecast,
+        aqi=entry.aqi_data,
+        current_weather_updated_at=entry.current_weather_updated_at,
+        updated_at=entry.updated_at
+    ).json().encode("utf-8")
+
+
+def stored_path(entry: WeatherCache) -> bytes:
+    return entry.response_json
+
+
+def bench(name: str, fn, entry: WeatherCache):
+    fn(entry)  # warm up
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        body = fn(entry)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed / ITERATIONS * 1e6:>10.1f} us/response  ({len(body)} bytes)")
+
+
+def main():
+    entry = sample_entry()
+    materialize_response(entry)
+
+    print(f"Serialization time per response ({ITERATIONS} iterations)")
+    bench("pydantic validate + .json()", pydantic_path, entry)
+    bench("orjson materialize", render_weather_response, entry)
+    bench("stored bytes", stored_path, entry)
+
+
+if __name__ == "__main__":
+    main()
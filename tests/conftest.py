@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timezone
+
+import httpx
+import pytest
+from sqlalchemy import event, DateTime
+
+# Endpoint tests run the app against SQLite and a stand-in OpenWeather
+os.environ.setdefault("OPENWEATHER_API_KEY", "test-key")
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+
+from app import database  # noqa: E402
+
+NOW = int(time.time()) // 10800 * 10800
+
+
+def openweather(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path.endswith(("/direct", "/reverse")):
+        name = request.url.params.get("q", "London").split(",")[0]
+        return httpx.Response(200, json=[{"name": name, "country": "GB", "lat": 51.5, "lon": -0.12}])
+    if path.endswith("/weather"):
+        return httpx.Response(200, json={
+            "id": 2643743,
+            "main": {"temp": 15.5, "feels_like": 14.2, "humidity": 72, "pressure": 1013},
+            "weather": [{"id": 800, "description": "clear sky", "icon": "01d"}],
+            "wind": {"speed": 3.5, "deg": 180}
+        })
+    if path.endswith("/forecast"):
+        return httpx.Response(200, json={"list": [
+            {
+                "dt": NOW + i * 10800,
+                "main": {"temp": 10.0 + i, "feels_like": 9.0 + i, "humidity": 70},
+                "weather": [{"id": 800, "description": "clear sky", "icon": "01d"}],
+                "wind": {"speed": 3.0},
+                "pop": 0.1
+            }
+            for i in range(40)
+        ]})
+    if path.endswith("/air_pollution"):
+        return httpx.Response(200, json={"list": [{
+            "main": {"aqi": 2},
+            "components": {"pm2_5": 12.5, "pm10": 18.3, "co": 230.4, "no2": 15.2, "o3": 45.8}
+        }]})
+    return httpx.Response(404)
+
+
+def _utc(target, *args):
+    # SQLite drops tzinfo; the app compares against aware datetimes
+    for column in target.__table__.columns:
+        value = target.__dict__.get(column.key)
+        if isinstance(column.type, DateTime) and value is not None and value.tzinfo is None:
+            target.__dict__[column.key] = value.replace(tzinfo=timezone.utc)
+
+
+event.listen(database.WeatherCache, "load", _utc)
+event.listen(database.WeatherCache, "refresh", _utc)
+event.listen(database.AqiTile, "load", _utc)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """API client on a fresh SQLite database, without starting the scheduler"""
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.aqi_tiles import aqi_tiles
+
+    aqi_tiles.clear()
+    database.Base.metadata.drop_all(bind=database.engine)
+    database.Base.metadata.create_all(bind=database.engine)
+    monkeypatch.setattr(main.weather_service, "transport", httpx.MockTransport(openweather))
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def max_queries():
+    """`with max_queries(n):` fails if the block runs more than n SQL statements (on `engine`, default the API's)"""
+    @contextmanager
+    def check(limit: int, engine=None):
+        engine = engine or database.engine
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "after_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "after_cursor_execute", record)
+        assert len(statements) <= limit, f"{len(statements)} statements (max {limit}):\n" + "\n".join(statements)
+
+    return check
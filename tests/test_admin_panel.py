@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import database
+
+
+@pytest.fixture
+def admin():
+    """Logged-in admin panel client on a fresh SQLite database"""
+    from app import admin_panel
+
+    database.Base.metadata.drop_all(bind=database.engine)
+    database.Base.metadata.create_all(bind=database.engine)
+    client = admin_panel.app.test_client()
+    with client.session_transaction() as session:
+        session["logged_in"] = True
+    return client
+
+
+def add_cities(count):
+    now = datetime.now(timezone.utc)
+    db = database.SessionLocal()
+    for i in range(count):
+        db.add(database.WeatherCache(
+            city_name=f"City {i:03d}, GB", latitude=51.0, longitude=0.0,
+            # Every third city is fresh, fetched three times
+            current_weather_updated_at=now if i % 3 == 0 else now - timedelta(hours=1),
+            fetch_1_time=now if i % 3 != 2 else None,
+            fetch_2_time=now if i % 3 == 0 else None,
+            fetch_3_time=now if i % 3 == 0 else None,
+        ))
+    db.commit()
+    db.close()
+
+
+def test_stats_come_from_one_aggregate(admin):
+    from app.admin_panel import SessionLocal, get_stats
+
+    add_cities(30)
+    db = SessionLocal()
+    try:
+        stats = get_stats(db)
+    finally:
+        db.close()
+
+    assert stats["total_cities"] == 30
+    assert stats["ready_cities"] == 10
+    assert stats["partial_cities"] == 10
+    assert stats["new_cities"] == 10
+    assert stats["fresh_current"] == 10
+    assert stats["stale_current"] == 20
+
+
+def test_index_is_paginated_searchable_and_sorted(admin, max_queries):
+    from app.admin_panel import engine
+
+    add_cities(120)
+
+    # Stats aggregate and one page of rows
+    with max_queries(2, engine):
+        page = admin.get("/").get_data(as_text=True)
+    assert "City 000, GB" in page and "City 049, GB" in page
+    assert "City 050, GB" not in page
+    assert "Page 1 of 3" in page
+
+    page = admin.get("/?page=3").get_data(as_text=True)
+    assert "City 119, GB" in page and "City 099, GB" not in page
+
+    page = admin.get("/?q=city 11").get_data(as_text=True)
+    assert "City 110, GB" in page and "City 010, GB" not in page
+    assert "Page 1 of 1" in page
+
+    page = admin.get("/?sort=name&dir=desc&per_page=5").get_data(as_text=True)
+    assert page.index("City 119, GB") < page.index("City 118, GB")
+    assert "City 114, GB" not in page
@@ -0,0 +1,59 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.api_keys import ApiKeyPool, load_api_keys
+from app.weather_service import WeatherService
+
+
+def test_keys_from_env(monkeypatch):
+    monkeypatch.setenv("OPENWEATHER_API_KEYS", " key-a, key-b,,key-a ")
+    assert load_api_keys() == ["key-a", "key-b"]
+    monkeypatch.delenv("OPENWEATHER_API_KEYS")
+    monkeypatch.delenv("OPENWEATHER_API_KEY")
+    with pytest.raises(ValueError):
+        load_api_keys()
+
+
+def test_calls_spread_over_keys_and_skip_cooling_ones():
+    pool = ApiKeyPool(["key-a", "key-b", "key-c"], calls_per_minute=2)
+    used = []
+    for _ in range(6):
+        key = pool.acquire()
+        used.append(key.key)
+        pool.release(key, "200")
+    assert sorted(used) == ["key-a", "key-a", "key-b", "key-b", "key-c", "key-c"]
+
+    key = pool.acquire()
+    pool.release(key, "429", retry_after=30)
+    assert all(pool.acquire().key != key.key for _ in range(4))
+
+
+def test_throttled_key_is_retried_on_another():
+    pool = ApiKeyPool(["spent", "fresh"])
+    seen = []
+
+    def handler(request: httpx.Request):
+        key = request.url.params["appid"]
+        seen.append(key)
+        if key == "spent":
+            return httpx.Response(429, headers={"Retry-After": "120"})
+        return httpx.Response(200, json={"list": []})
+
+    service = WeatherService(transport=httpx.MockTransport(handler), api_keys=pool)
+    for _ in range(3):
+        assert asyncio.run(service.fetch_forecast(51.5, -0.12)) == {"list": []}
+    # "spent" was tried at most once, then left to cool off
+    assert seen.count("spent") <= 1 and seen.count("fresh") == 3
+
+    # With every key throttled the 429 reaches the caller (the refresh limiter backs off on it)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(WeatherService(
+            transport=httpx.MockTransport(lambda request: httpx.Response(429)), api_keys=ApiKeyPool(["a", "b"])
+        ).fetch_forecast(51.5, -0.12))
+
+
+def test_keys_with_the_same_suffix_get_distinct_labels():
+    pool = ApiKeyPool(["first-1234", "second-1234"])
+    assert [key.label for key in pool.keys] == ["0:...1234", "1:...1234"]
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from app import database
+from app.aqi_tiles import AqiTileCache, geohash_center, geohash_encode
+from app.weather_service import WeatherService
+from conftest import openweather
+
+
+def test_geohash():
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    lat, lon = geohash_center("u4pru")
+    assert geohash_encode(lat, lon, 5) == "u4pru"
+    assert abs(lat - 57.65) < 0.05 and abs(lon - 10.41) < 0.05
+
+
+def test_cities_in_a_tile_share_one_aqi_call(client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/air_pollution"):
+            calls.append((float(request.url.params["lat"]), float(request.url.params["lon"])))
+        return openweather(request)
+
+    service = WeatherService(transport=httpx.MockTransport(handler))
+    tiles = AqiTileCache(precision=5, ttl=timedelta(minutes=60))
+    db = database.SessionLocal()
+    now = datetime(2025, 11, 3, 8, tzinfo=timezone.utc)
+
+    async def fetch_all(when):
+        # Two suburbs in one tile (looked up concurrently) and one city elsewhere
+        return await asyncio.gather(
+            tiles.get(db, service, 51.501, -0.121, when),
+            tiles.get(db, service, 51.503, -0.125, when),
+            tiles.get(db, service, 48.85, 2.35, when),
+        )
+
+    results = asyncio.run(fetch_all(now))
+    assert [aqi.aqi for aqi in results] == [2, 2, 2]
+    assert len(calls) == 2
+    assert calls[0] == geohash_center(geohash_encode(51.501, -0.121, 5))
+    db.commit()
+
+    # Another instance finds the tiles in the database
+    other = AqiTileCache(precision=5, ttl=timedelta(minutes=60))
+    assert asyncio.run(other.get(db, service, 51.502, -0.122, now + timedelta(minutes=30))).pm2_5 == 12.5
+    assert len(calls) == 2
+
+    # Once per interval
+    asyncio.run(tiles.get(db, service, 51.502, -0.122, now + timedelta(minutes=60)))
+    assert len(calls) == 3
+    db.close()
@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from app import database
+from app.database import WeatherCache
+from conftest import openweather
+
+
+def test_new_city_is_warmed_up_completely(monkeypatch):
+    from app.background_tasks import WeatherBackgroundTask
+
+    database.Base.metadata.drop_all(bind=database.engine)
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    # As the admin panel adds it
+    entry = WeatherCache(city_name="London, GB", latitude=51.5, longitude=-0.12, current_weather={}, aqi_data={})
+    db.add(entry)
+    db.commit()
+
+    task = WeatherBackgroundTask()
+    monkeypatch.setattr(task.weather_service, "transport", httpx.MockTransport(openweather))
+    asyncio.run(task.fetch_city_forecast(entry.city_name, entry.latitude, entry.longitude, db, entry))
+
+    db.refresh(entry)
+    assert entry.current_weather["temp"] == 15.5
+    assert entry.openweather_id == 2643743
+    assert entry.aqi_data["aqi"] == 2
+    assert entry.hourly_forecast and entry.daily_forecast
+    assert entry.response_json is not None
+    # Fetch history backfilled: the city is ready, not "New"
+    assert entry.fetch_3_data == entry.fetch_2_data == entry.fetch_1_data
+    assert not entry.needs_current_weather_fetch() and not entry.needs_forecast_fetch()
+    db.close()
+
+
+def test_due_cities_are_queued_late_ones_last():
+    from app.background_tasks import WeatherBackgroundTask
+    from app.database import RefreshJob
+    from app.job_queue import PRIORITY_SCHEDULED, PRIORITY_CATCH_UP
+
+    database.Base.metadata.drop_all(bind=database.engine)
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    now = datetime.now(timezone.utc)
+    two_hours_ago = now - timedelta(hours=2)
+    for name, minutes_ago in (("on time", 1), ("late", 30)):
+        db.add(WeatherCache(
+            city_name=name, latitude=0.0, longitude=0.0, refresh_offset=(now.minute - minutes_ago) % 60 * 60,
+            fetch_1_time=two_hours_ago, last_accessed_at=now, access_count=1
+        ))
+    db.commit()
+
+    asyncio.run(WeatherBackgroundTask().fetch_due_cities())
+    asyncio.run(WeatherBackgroundTask().fetch_due_cities())
+
+    jobs = dict(db.query(RefreshJob.city_name, RefreshJob.priority))
+    assert jobs == {"on time": PRIORITY_SCHEDULED, "late": PRIORITY_CATCH_UP}
+    db.close()
+
+
+def test_prewarm_refreshes_popular_cities_in_groups(monkeypatch):
+    from app import background_tasks
+    from app.background_tasks import WeatherBackgroundTask
+
+    database.Base.metadata.drop_all(bind=database.engine)
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(minutes=20)
+
+    def city(name, openweather_id, updated, accessed=now, count=10.0):
+        return WeatherCache(
+            city_name=name, latitude=1.0, longitude=2.0, openweather_id=openweather_id,
+            current_weather={"temp": 0.0}, current_weather_updated_at=updated,
+            last_accessed_at=accessed, access_count=count
+        )
+
+    # Hot cities with and without an OpenWeather id, all expiring soon; the one without expires first
+    db.add_all([city(f"Grouped {i}", i, stale + timedelta(seconds=i)) for i in range(1, 25)])
+    db.add(city("No id", None, stale - timedelta(minutes=1)))
+    db.add(city("Cold", 100, stale, accessed=now - timedelta(days=2), count=50.0))
+    db.add(city("Fresh", 101, now, count=50.0))
+    db.commit()
+
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path.endswith("/group"):
+            ids = [int(city_id) for city_id in request.url.params["id"].split(",")]
+            body = openweather(httpx.Request("GET", "https://example.test/weather")).json()
+            return httpx.Response(200, json={"list": [dict(body, id=city_id) for city_id in ids]})
+        return openweather(request)
+
+    monkeypatch.setattr(background_tasks, "PREWARM_MAX_PER_RUN", 22)
+    task = WeatherBackgroundTask()
+    monkeypatch.setattr(task.weather_service, "transport", httpx.MockTransport(handler))
+    asyncio.run(task.prewarm_current_weather())
+
+    # The 22 that expire first: 21 by id in two group calls, the other one on its own
+    assert sorted(calls) == ["/data/2.5/group", "/data/2.5/group", "/data/2.5/weather"]
+    refreshed = {
+        name for name, current in db.query(WeatherCache.city_name, WeatherCache.current_weather)
+        if current["temp"] == 15.5
+    }
+    assert refreshed == {"No id"} | {f"Grouped {i}" for i in range(1, 22)}
+    db.close()
+
+
+def test_failed_city_does_not_roll_back_others(monkeypatch):
+    from app.aqi_tiles import aqi_tiles
+    from app.background_tasks import WeatherBackgroundTask
+    from app.database import AqiTile
+
+    aqi_tiles.clear()
+    database.Base.metadata.drop_all(bind=database.engine)
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    two_hours_ago = datetime.now(timezone.utc) - timedelta(hours=2)
+    for name, lat in (("Good", 51.5), ("Broken", -33.9)):
+        db.add(WeatherCache(
+            city_name=name, latitude=lat, longitude=0.0, current_weather={"temp": 0.0}, aqi_data={},
+            fetch_1_time=two_hours_ago
+        ))
+    db.commit()
+    entries = {entry.city_name: entry for entry in db.query(WeatherCache)}
+
+    def flaky(request):
+        if request.url.path.endswith("/forecast") and request.url.params["lat"].startswith("-"):
+            return httpx.Response(500)
+        return openweather(request)
+
+    task = WeatherBackgroundTask()
+    monkeypatch.setattr(task.weather_service, "transport", httpx.MockTransport(flaky))
+    stats = asyncio.run(task.refresh_cities(
+        [(entry.city_name, entry.latitude, entry.longitude) for entry in entries.values()], entries
+    ))
+
+    assert stats["done"] == 1 and list(stats["errors"]) == ["Broken"]
+    db.expire_all()
+    good = db.get(WeatherCache, entries["Good"].id)
+    assert good.hourly_forecast and good.response_json is not None
+    assert db.query(AqiTile).count() == 1
+    db.close()
+
+
+def test_refresh_jobs_load_cities_once(monkeypatch, max_queries):
+    from app.aqi_tiles import aqi_tiles
+    from app.background_tasks import WeatherBackgroundTask
+    from app.job_queue import enqueue_refreshes, PRIORITY_SCHEDULED
+
+    aqi_tiles.clear()
+    database.Base.metadata.drop_all(bind=database.engine)
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    two_hours_ago = datetime.now(timezone.utc) - timedelta(hours=2)
+    names = [f"City {i}" for i in range(20)]
+    for name in names:
+        db.add(WeatherCache(
+            city_name=name, latitude=51.5, longitude=-0.12, current_weather={"temp": 0.0}, aqi_data={},
+            fetch_1_time=two_hours_ago
+        ))
+    enqueue_refreshes(db, names, PRIORITY_SCHEDULED)
+    db.commit()
+
+    task = WeatherBackgroundTask()
+    monkeypatch.setattr(task.weather_service, "transport", httpx.MockTransport(openweather))
+    # Claim, one load for the batch, one UPDATE per city, a few AQI tile lookups, completion
+    with max_queries(len(names) + 12):
+        asyncio.run(task.process_refresh_jobs())
+
+    assert db.query(WeatherCache).filter(WeatherCache.response_json.is_(None)).count() == 0
+    db.close()
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, WeatherCache
+from app.schemas import AQIData, WeatherData
+from app.cache_updates import apply_forecast, apply_updates
+
+
+def forecast(temp):
+    return {
+        "cod": "200",
+        "list": [{
+            "dt": 1762156800,
+            "main": {"temp": temp, "feels_like": temp, "humidity": 70},
+            "weather": [{"description": "clear sky", "icon": "01d"}],
+            "wind": {"speed": 3.0},
+            "pop": 0.0
+        }]
+    }
+
+
+def aqi(pm2_5):
+    return AQIData.construct(aqi=2, pm2_5=pm2_5, pm10=18.3, co=230.4, no2=15.2, o3=45.8)
+
+
+def test_repeated_forecast_only_bumps_fetch_time():
+    entry = WeatherCache(city_name="London, GB", latitude=51.5, longitude=-0.1)
+    first = datetime(2025, 11, 3, 8, 0, tzinfo=timezone.utc)
+    second = first + timedelta(hours=1)
+
+    assert apply_forecast(entry, forecast(10.0), aqi(12.5), first, first) is True
+    hourly = entry.hourly_forecast
+
+    # Same model run, and OpenWeather's envelope changed: nothing to rewrite
+    repeated = dict(forecast(10.0), message=0)
+    assert apply_forecast(entry, repeated, aqi(12.5), second, second) is False
+    assert entry.fetch_1_time == second
+    assert entry.fetch_2_data is None
+    assert entry.updated_at == first
+    assert entry.hourly_forecast is hourly
+
+    # Only AQI changed: stored without rotating the forecast fetches
+    assert apply_forecast(entry, forecast(10.0), aqi(20.0), second, second) is True
+    assert entry.aqi_data["pm2_5"] == 20.0
+    assert entry.fetch_2_data is None
+
+    # New forecast: rotated in
+    assert apply_forecast(entry, forecast(11.0), aqi(20.0), second, second) is True
+    assert entry.fetch_2_data == forecast(10.0)
+    assert entry.hourly_forecast[0]["temp"] == 11.0
+
+
+def test_repeated_forecast_keeps_updated_at_in_the_row():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    first = datetime(2025, 11, 3, 8, 0, tzinfo=timezone.utc)
+    entry = WeatherCache(city_name="London, GB", latitude=51.5, longitude=-0.1)
+    apply_forecast(entry, forecast(10.0), aqi(12.5), first, first)
+    db.add(entry)
+    db.commit()
+
+    entry = db.query(WeatherCache).one()
+    second = first + timedelta(hours=1)
+    assert apply_forecast(entry, forecast(10.0), aqi(12.5), second, second) is False
+    db.commit()
+
+    fetch_1_time, updated_at = db.query(WeatherCache.fetch_1_time, WeatherCache.updated_at).one()
+    assert fetch_1_time.replace(tzinfo=timezone.utc) == second
+    assert updated_at.replace(tzinfo=timezone.utc) == first
+    db.close()
+    engine.dispose()
+
+
+def test_unchanged_forecast_needs_a_commit_but_no_notification():
+    entry = WeatherCache(city_name="London, GB", latitude=51.5, longitude=-0.1, refresh_offset=0)
+    current = WeatherData(
+        temp=15.5, feels_like=14.2, humidity=72, pressure=1013, description="clear sky", icon="01d",
+        wind_speed=3.5, wind_deg=180
+    )
+    updates = {"current": current, "openweather_id": None, "forecast": forecast(10.0), "aqi": aqi(12.5), "built": None}
+    _, needs_commit, changed = asyncio.run(apply_updates(None, entry, entry.city_name, 51.5, -0.1, updates))
+    assert needs_commit and changed
+    body = entry.response_json
+
+    # Only the forecast's fetch time moves: saved, but subscribers already have this payload
+    repeated = dict(updates, current=None)
+    _, needs_commit, changed = asyncio.run(apply_updates(None, entry, entry.city_name, 51.5, -0.1, repeated))
+    assert needs_commit and not changed
+    assert entry.response_json == body
+
+    nothing = dict(updates, current=None, forecast=None)
+    assert asyncio.run(apply_updates(None, entry, entry.city_name, 51.5, -0.1, nothing))[1:] == (False, False)
@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import database
+from app.city_import import IMPORT_RESULT_TTL, CityImport, parse_import, prune_imports, run_import
+from app.database import RefreshJob, WeatherCache
+from app.weather_service import WeatherService
+from conftest import openweather
+
+
+def test_parse_csv_json_and_plain_lists():
+    assert parse_import("cities.csv", b"name,lat,lon\nParis, 1, 2\n,48.8,2.3\n") == [
+        {"city_name": "Paris"}, {"lat": 48.8, "lon": 2.3}
+    ]
+    assert parse_import("cities.txt", b"London, GB\n\nTokyo, JP\n") == [
+        {"city_name": "London, GB"}, {"city_name": "Tokyo, JP"}
+    ]
+    assert parse_import("cities.json", b'["Oslo", {"city_name": "Rome"}, {"lat": 1, "lon": 2}]') == [
+        {"city_name": "Oslo"}, {"city_name": "Rome"}, {"lat": 1.0, "lon": 2.0}
+    ]
+    with pytest.raises(ValueError):
+        parse_import("cities.csv", b"lat,lon\n95,0\n")
+    # Wrong JSON types reject the file instead of crashing the upload
+    for content in (b"[123]", b'[{"city_name": 5}]', b'[{"lat": [1], "lon": 2}]'):
+        with pytest.raises(ValueError):
+            parse_import("cities.json", content)
+
+
+def test_import_dedupes_inserts_and_queues_warm_fetches():
+    database.Base.metadata.drop_all(bind=database.engine)
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    db.add(WeatherCache(city_name="London, GB", latitude=51.5, longitude=-0.12))
+    db.commit()
+
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.params.get("q"))
+        return openweather(request)
+
+    entries = [
+        {"city_name": "London, GB"},  # Already cached, not geocoded
+        {"city_name": "Leeds"},
+        {"city_name": "leeds"},  # Same name within the file
+        {"city_name": "Leeds, GB"},  # Geocodes to an already-imported name
+        {"city_name": "York"},
+    ]
+    job = CityImport(entries, warm=True)
+    asyncio.run(run_import(job, database.SessionLocal, WeatherService(httpx.MockTransport(handler))))
+
+    assert job.status == "done"
+    assert sorted(calls) == ["Leeds", "Leeds, GB", "York"]
+    assert (job.inserted, job.duplicates, job.failed, job.queued) == (2, 3, 0, 2)
+    assert {name for name, in db.query(WeatherCache.city_name)} == {"London, GB", "Leeds, GB", "York, GB"}
+    assert {name for name, in db.query(RefreshJob.city_name)} == {"Leeds, GB", "York, GB"}
+    db.close()
+
+
+def test_finished_imports_are_pruned():
+    running, finished, recent = CityImport([], False), CityImport([], False), CityImport([], False)
+    now = finished.started + IMPORT_RESULT_TTL + 10
+    finished.duration = 1.0
+    recent.duration = IMPORT_RESULT_TTL + 5
+    imports = {job.id: job for job in (running, finished, recent)}
+
+    prune_imports(imports, now)
+    assert set(imports) == {running.id, recent.id}
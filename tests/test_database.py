@@ -1,26 +1,57 @@
-import pytest
 from datetime import datetime, timezone, timedelta
 
-from app.database import WeatherCache
+from app.database import WeatherCache, refresh_offset_for
 
 
 def test_needs_fetch_when_no_fetch_time():
-    wc = WeatherCache()
+    wc = WeatherCache(refresh_offset=0)
     wc.fetch_1_time = None
-    assert wc.needs_fetch() is True
+    assert wc.needs_forecast_fetch() is True
 
 
 def test_needs_fetch_when_old():
-    wc = WeatherCache()
+    wc = WeatherCache(refresh_offset=0)
     # Set fetch time to 2 hours ago
     wc.fetch_1_time = datetime.now(timezone.utc) - timedelta(hours=2)
-    assert wc.needs_fetch() is True
+    assert wc.needs_forecast_fetch() is True
 
 
 def test_needs_fetch_when_current_hour():
-    wc = WeatherCache()
+    wc = WeatherCache(refresh_offset=0)
     # Set fetch time to current rounded hour
     now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
     wc.fetch_1_time = now
-    assert wc.needs_fetch() is False
+    assert wc.needs_forecast_fetch() is False
 
+
+def test_refresh_offset_is_deterministic_and_within_hour():
+    assert refresh_offset_for("London, GB") == refresh_offset_for("London, GB")
+    offsets = {refresh_offset_for(f"City {i}, XX") for i in range(200)}
+    assert all(0 <= offset < 3600 for offset in offsets)
+    assert len(offsets) > 150
+
+
+def test_current_slot_start_uses_city_offset():
+    wc = WeatherCache(refresh_offset=37 * 60)
+    now = datetime(2025, 11, 3, 10, 50, tzinfo=timezone.utc)
+    assert wc.current_slot_start(now) == datetime(2025, 11, 3, 10, 37, tzinfo=timezone.utc)
+
+    before_slot = datetime(2025, 11, 3, 10, 20, tzinfo=timezone.utc)
+    assert wc.current_slot_start(before_slot) == datetime(2025, 11, 3, 9, 37, tzinfo=timezone.utc)
+
+
+def test_grace_leaves_fresh_slot_to_scheduler():
+    wc = WeatherCache(refresh_offset=37 * 60)
+    wc.fetch_1_time = datetime(2025, 11, 3, 9, 37, tzinfo=timezone.utc)
+    # Slot started one minute ago, forecast is from the previous slot
+    now = datetime(2025, 11, 3, 10, 38, tzinfo=timezone.utc)
+
+    assert wc.needs_forecast_fetch(now=now) is True
+    assert wc.needs_forecast_fetch(grace_seconds=300, now=now) is False
+    assert wc.needs_forecast_fetch(grace_seconds=300, now=now + timedelta(minutes=5)) is True
+
+
+def test_grace_does_not_hide_missed_slots():
+    wc = WeatherCache(refresh_offset=0)
+    wc.fetch_1_time = datetime.now(timezone.utc) - timedelta(hours=3)
+    assert wc.needs_forecast_fetch(grace_seconds=300) is True
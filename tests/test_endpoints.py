@@ -0,0 +1,106 @@
+import httpx
+import orjson
+
+from conftest import openweather
+
+
+def test_cached_weather_is_one_query(client, max_queries):
+    assert client.post("/api/weather", json={"city_name": "London"}).status_code == 200
+
+    with max_queries(1):
+        response = client.post("/api/weather", json={"city_name": "London, GB"})
+    assert response.status_code == 200
+    assert response.json()["city_name"] == "London, GB"
+
+
+def test_new_city_query_budget(client, max_queries):
+    # Includes reading and storing the city's (new) AQI tile
+    with max_queries(6):
+        assert client.post("/api/weather", json={"city_name": "Paris"}).status_code == 200
+
+
+def test_batch_queries_do_not_grow_with_locations(client, max_queries):
+    names = ["London", "Paris", "Berlin", "Madrid"]
+    for name in names:
+        client.post("/api/weather", json={"city_name": name})
+
+    with max_queries(1):
+        response = client.post("/api/weather/batch", json={
+            "locations": [{"city_name": f"{name}, GB"} for name in names]
+        })
+    assert response.status_code == 200
+    assert len(response.json()["results"]) == 4
+
+
+def counting_openweather(calls):
+    """openweather handler that records request paths and finds no city called Nowhere"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.params.get("q", "").startswith("Nowhere"):
+            return httpx.Response(200, json=[])
+        return openweather(request)
+    return handler
+
+
+def test_batch_keeps_order_and_reports_errors_per_slot(client, monkeypatch):
+    from app import main
+
+    calls = []
+    monkeypatch.setattr(main.weather_service, "transport", httpx.MockTransport(counting_openweather(calls)))
+    response = client.post("/api/weather/batch", json={"locations": [
+        {"city_name": "Paris"}, {"city_name": "Nowhere"}, {"city_name": "London"}
+    ]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["city_name"] == "Paris, GB"
+    assert results[1] == {"error": "Location not found", "status_code": 400}
+    assert results[2]["city_name"] == "London, GB"
+
+
+def test_batch_refreshes_repeated_cities_once(client, monkeypatch):
+    from app import main
+
+    calls = []
+    monkeypatch.setattr(main.weather_service, "transport", httpx.MockTransport(counting_openweather(calls)))
+    response = client.post("/api/weather/batch", json={"locations": [
+        {"city_name": "London"}, {"city_name": "London"}, {"lat": 51.5, "lon": -0.12}
+    ]})
+    results = response.json()["results"]
+    assert [result["city_name"] for result in results] == ["London, GB"] * 3
+    # One forward and one reverse geocode, then a single refresh of the city
+    assert sum(path.endswith("/forecast") for path in calls) == 1
+    assert sum(path.endswith("/weather") for path in calls) == 1
+
+
+def test_batch_streams_ndjson(client, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main.weather_service, "transport", httpx.MockTransport(counting_openweather([])))
+    response = client.post("/api/weather/batch?stream=true", json={"locations": [
+        {"city_name": "London"}, {"city_name": "Nowhere"}, {"city_name": "Paris"}
+    ]})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [orjson.loads(line) for line in response.content.splitlines()]
+    by_index = {line["index"]: line["result"] for line in lines}
+    assert sorted(by_index) == [0, 1, 2]
+    assert by_index[0]["city_name"] == "London, GB"
+    assert by_index[1]["status_code"] == 400
+    assert by_index[2]["city_name"] == "Paris, GB"
+
+
+def test_cities_is_one_query(client, max_queries):
+    for name in ["London", "Paris", "Berlin"]:
+        client.post("/api/weather", json={"city_name": name})
+
+    with max_queries(1):
+        response = client.get("/api/cities")
+    assert len(response.json()) == 3
+
+
+def test_profile_requires_admin_credentials(client):
+    assert client.get("/admin/profile?seconds=0.01").status_code == 401
+    assert client.get("/admin/profile?seconds=0.01", auth=("admin", "wrong")).status_code == 401
+
+    response = client.get("/admin/profile?seconds=0.05", auth=("admin", "admin123"))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
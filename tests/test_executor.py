@@ -0,0 +1,32 @@
+import asyncio
+
+from app.executor import BatchingExecutor
+
+
+def test_concurrent_submits_share_one_executor_call():
+    calls = []
+
+    def double_many(jobs):
+        calls.append(list(jobs))
+        return [job * 2 for job in jobs]
+
+    async def scenario():
+        batcher = BatchingExecutor(double_many, max_batch=3, max_delay=0.05)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(4)))
+        assert results == [0, 2, 4, 6]
+
+    asyncio.run(scenario())
+    # A full batch is sent right away, the rest after the delay
+    assert calls == [[0, 1, 2], [3]]
+
+
+def test_executor_errors_reach_every_caller():
+    def fail_many(jobs):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        batcher = BatchingExecutor(fail_many, max_batch=10, max_delay=0.01)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(scenario())
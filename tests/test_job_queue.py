@@ -0,0 +1,71 @@
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, RefreshJob
+from app import job_queue
+from app.job_queue import (
+    enqueue_refreshes, claim_jobs, complete_jobs, fail_job, PRIORITY_USER, PRIORITY_SCHEDULED, PRIORITY_CATCH_UP
+)
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_enqueue_dedupes_per_city_and_keeps_highest_priority():
+    db = make_session()
+    now = datetime.now(timezone.utc)
+    enqueue_refreshes(db, ["London, GB", "Paris, FR", "London, GB"], PRIORITY_SCHEDULED, now)
+    enqueue_refreshes(db, ["London, GB"], PRIORITY_USER, now)
+    enqueue_refreshes(db, ["London, GB", "Paris, FR"], PRIORITY_CATCH_UP, now)
+    db.commit()
+
+    priorities = dict(db.query(RefreshJob.city_name, RefreshJob.priority).all())
+    assert priorities == {"London, GB": PRIORITY_USER, "Paris, FR": PRIORITY_SCHEDULED}
+
+
+def test_claim_leases_jobs_by_priority():
+    db = make_session()
+    now = datetime.now(timezone.utc)
+    enqueue_refreshes(db, ["Paris, FR"], PRIORITY_CATCH_UP, now)
+    enqueue_refreshes(db, ["London, GB"], PRIORITY_USER, now)
+    db.commit()
+
+    claimed = claim_jobs(db, 1, now)
+    assert [city_name for _, city_name, _ in claimed] == ["London, GB"]
+    assert claimed[0][2] == 1
+
+    # Leased jobs are not handed out again until the lease expires
+    assert [city_name for _, city_name, _ in claim_jobs(db, 10, now)] == ["Paris, FR"]
+    assert claim_jobs(db, 10, now) == []
+    # A one-job lease
+    lease_expired = now + timedelta(
+        seconds=job_queue.REFRESH_JOB_LEASE_SECONDS + job_queue.REFRESH_JOB_LEASE_PER_JOB_SECONDS + 1
+    )
+    assert len(claim_jobs(db, 10, lease_expired)) == 2
+
+    complete_jobs(db, [claimed[0][0]])
+    db.commit()
+    assert db.query(RefreshJob).count() == 1
+
+
+def test_failed_job_backs_off_then_gives_up(monkeypatch):
+    monkeypatch.setattr(job_queue, "REFRESH_JOB_MAX_ATTEMPTS", 2)
+    db = make_session()
+    now = datetime.now(timezone.utc)
+    enqueue_refreshes(db, ["London, GB"], PRIORITY_SCHEDULED, now)
+    db.commit()
+
+    job_id, city_name, attempt = claim_jobs(db, 1, now)[0]
+    fail_job(db, job_id, city_name, attempt, "upstream 500", now)
+    db.commit()
+    assert claim_jobs(db, 1, now + timedelta(seconds=job_queue.REFRESH_JOB_BACKOFF_SECONDS - 1)) == []
+
+    job_id, city_name, attempt = claim_jobs(db, 1, now + timedelta(seconds=job_queue.REFRESH_JOB_BACKOFF_SECONDS))[0]
+    assert attempt == 2
+    fail_job(db, job_id, city_name, attempt, "upstream 500", now)
+    db.commit()
+    assert db.query(RefreshJob).count() == 0
@@ -0,0 +1,31 @@
+import asyncio
+from sqlalchemy import create_engine
+
+from app.leader import LeaderElection
+
+
+def test_single_process_database_is_always_leader():
+    election = LeaderElection(create_engine("sqlite://"))
+    assert election.is_leader
+    assert election.check() is True
+    election.release()
+    assert election.is_leader
+
+
+def test_leader_only_jobs_skip_followers(monkeypatch):
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "test-key")
+    from app.background_tasks import WeatherBackgroundTask
+
+    task = WeatherBackgroundTask()
+    calls = []
+
+    async def job():
+        calls.append(1)
+
+    monkeypatch.setattr(LeaderElection, "is_leader", property(lambda self: False))
+    asyncio.run(task.leader_only(job)())
+    assert calls == []
+
+    monkeypatch.setattr(LeaderElection, "is_leader", property(lambda self: True))
+    asyncio.run(task.leader_only(job)())
+    assert calls == [1]
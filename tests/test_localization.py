@@ -0,0 +1,66 @@
+import asyncio
+
+import orjson
+
+from app.localization import describe, negotiate_language
+
+
+def test_negotiate_language():
+    assert negotiate_language(None) == "en"
+    assert negotiate_language("ru-RU,ru;q=0.9,en;q=0.8") == "ru"
+    assert negotiate_language("ja, de;q=0.5, fr;q=0.7") == "fr"
+    assert negotiate_language("uz;q=0, es") == "es"
+    assert negotiate_language("ja") == "en"
+
+
+def test_describe_falls_back_by_group_then_to_english():
+    assert describe(800, "de", "clear sky") == "klarer Himmel"
+    assert describe(599, "ru", "some rain") == "дождь"
+    assert describe(None, "fr", "clear sky") == "clear sky"
+    assert describe(800, "en", "clear sky") == "clear sky"
+
+
+def test_descriptions_follow_accept_language(client, max_queries):
+    english = client.post("/api/weather", json={"city_name": "London"})
+    assert english.headers["content-language"] == "en"
+    assert english.json()["current"]["description"] == "clear sky"
+
+    with max_queries(1):
+        russian = client.post(
+            "/api/weather", json={"city_name": "London, GB"}, headers={"Accept-Language": "ru-RU,ru;q=0.9"}
+        )
+    assert russian.headers["content-language"] == "ru"
+    assert "Accept-Language" in russian.headers["vary"]
+    data = russian.json()
+    assert data["current"]["description"] == "ясно"
+    assert {entry["description"] for entry in data["hourly"] + data["daily"]} == {"ясно"}
+    assert data["current"]["condition_id"] == 800
+
+    delta = client.post(
+        "/api/weather/delta", json={"city_name": "London, GB"}, headers={"Accept-Language": "uz"}
+    )
+    assert delta.json()["current"]["description"] == "ochiq osmon"
+
+
+def test_subscription_is_localized(client):
+    from starlette.requests import Request
+    from app import main
+
+    client.post("/api/weather", json={"city_name": "London"})
+    request = Request({
+        "type": "http", "method": "GET", "path": "/api/weather/subscribe",
+        "headers": [(b"accept-language", b"de-DE,de;q=0.9")]
+    })
+
+    async def first_event():
+        response = await main.subscribe_weather(request, city=["London, GB"], units="metric")
+        try:
+            return response, await response.body_iterator.__anext__()
+        finally:
+            await response.body_iterator.aclose()
+
+    response, event = asyncio.run(first_event())
+    assert response.headers["content-language"] == "de"
+    data = orjson.loads(event.split(b"data: ", 1)[1])
+    assert data["current"]["description"] == "klarer Himmel"
+    assert {entry["description"] for entry in data["hourly"] + data["daily"]} == {"klarer Himmel"}
@@ -0,0 +1,114 @@
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, WeatherCache
+from app import popularity
+from app.popularity import (
+    AccessTracker, current_slot_starts, decay_and_evict, due_refresh_filter, refresh_lag_by_tier
+)
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_flush_batches_hits_per_city():
+    db = make_session()
+    db.add_all([
+        WeatherCache(city_name="London, GB", latitude=51.5, longitude=-0.1),
+        WeatherCache(city_name="Paris, FR", latitude=48.8, longitude=2.3),
+    ])
+    db.commit()
+
+    tracker = AccessTracker()
+    for _ in range(3):
+        tracker.record("London, GB")
+    tracker.record("Paris, FR")
+
+    assert tracker.flush(db) == 2
+    assert tracker.flush(db) == 0
+
+    counts = dict(db.query(WeatherCache.city_name, WeatherCache.access_count).all())
+    assert counts == {"London, GB": 3, "Paris, FR": 1}
+    assert db.query(WeatherCache).filter(WeatherCache.last_accessed_at.is_(None)).count() == 0
+
+
+def test_decay_and_evict_removes_untouched_cities(monkeypatch):
+    monkeypatch.setattr(popularity, "EVICT_AFTER_DAYS", 30)
+    db = make_session()
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        WeatherCache(city_name="Hot, XX", latitude=0, longitude=0, access_count=8, last_accessed_at=now),
+        WeatherCache(city_name="Gone, XX", latitude=0, longitude=0, access_count=1,
+                     last_accessed_at=now - timedelta(days=31)),
+    ])
+    db.commit()
+
+    assert decay_and_evict(db, now) == 1
+    assert dict(db.query(WeatherCache.city_name, WeatherCache.access_count).all()) == {"Hot, XX": 4}
+
+
+def test_refresh_lag_by_tier_measures_stalest_forecast():
+    db = make_session()
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        WeatherCache(city_name="Hot, XX", latitude=0, longitude=0, last_accessed_at=now,
+                     fetch_1_time=now - timedelta(hours=1, minutes=10)),
+        WeatherCache(city_name="Fresh, XX", latitude=0, longitude=0, last_accessed_at=now,
+                     fetch_1_time=now - timedelta(minutes=10)),
+        WeatherCache(city_name="Warm, XX", latitude=0, longitude=0, last_accessed_at=now - timedelta(hours=24),
+                     fetch_1_time=now - timedelta(hours=2)),
+    ])
+    db.commit()
+
+    lags = refresh_lag_by_tier(db, now)
+    assert round(lags["hot"]) == 600
+    assert lags["warm"] == 0.0
+
+
+def test_access_writes_keep_updated_at():
+    db = make_session()
+    updated_at = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    db.add(WeatherCache(city_name="London, GB", latitude=51.5, longitude=-0.1, updated_at=updated_at))
+    db.commit()
+
+    tracker = AccessTracker()
+    tracker.record("London, GB")
+    tracker.flush(db)
+    decay_and_evict(db)
+
+    stored = db.query(WeatherCache.updated_at).scalar()
+    assert stored.replace(tzinfo=timezone.utc) == updated_at
+    assert db.query(WeatherCache.access_count).scalar() == 0.5
+
+
+def test_due_cities_include_every_passed_slot():
+    db = make_session()
+    now = datetime(2025, 11, 3, 10, 30, 20, tzinfo=timezone.utc)
+
+    def city(name, offset, fetched):
+        return WeatherCache(
+            city_name=name, latitude=0.0, longitude=0.0, refresh_offset=offset,
+            fetch_1_time=fetched, last_accessed_at=now, access_count=1
+        )
+
+    db.add_all([
+        city("slot earlier this hour", 600, datetime(2025, 11, 3, 9, 5, tzinfo=timezone.utc)),
+        city("refreshed in its slot", 600, datetime(2025, 11, 3, 10, 12, tzinfo=timezone.utc)),
+        city("slot last minute", 1750, datetime(2025, 11, 3, 9, 40, tzinfo=timezone.utc)),
+        city("slot missed last hour", 3000, datetime(2025, 11, 3, 9, 40, tzinfo=timezone.utc)),
+        city("refreshed last hour", 3000, datetime(2025, 11, 3, 9, 55, tzinfo=timezone.utc)),
+        city("never fetched", 3500, None),
+    ])
+    db.commit()
+
+    slot_starts = current_slot_starts(now)
+    assert slot_starts[10] == datetime(2025, 11, 3, 10, 10, tzinfo=timezone.utc)
+    assert slot_starts[50] == datetime(2025, 11, 3, 9, 50, tzinfo=timezone.utc)
+
+    due = {name for name, in db.query(WeatherCache.city_name).filter(due_refresh_filter(now, slot_starts))}
+    assert due == {"slot earlier this hour", "slot last minute", "slot missed last hour", "never fetched"}
+
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from app.profiler import SamplingProfiler, collapsed, coroutine_stack
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_samples_threads_and_waiting_tasks():
+    async def waiting_inner():
+        await asyncio.sleep(1)
+
+    async def waiting_outer():
+        await waiting_inner()
+
+    async def main():
+        waiter = asyncio.create_task(waiting_outer(), name="waiter")
+        await asyncio.sleep(0)
+        assert [label.split(" ")[0] for label in coroutine_stack(waiter)][:3] == [
+            "waiting_outer", "waiting_inner", "sleep"
+        ]
+
+        profiler = SamplingProfiler(interval=0.001, loop=asyncio.get_running_loop())
+        profiler.start()
+        busy_wait(0.05)
+        await asyncio.sleep(0.05)
+        counts = profiler.stop()
+        waiter.cancel()
+        return profiler.samples, counts
+
+    samples, counts = asyncio.run(main())
+    assert samples > 0
+    assert any("busy_wait" in stack and stack.startswith("thread MainThread;") for stack in counts)
+    assert any(stack.startswith("awaiting waiter;waiting_outer") for stack in counts)
+
+    for line in collapsed(counts).splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and stack
@@ -0,0 +1,39 @@
+import asyncio
+
+from app.pubsub import WeatherHub
+
+
+def test_publish_reaches_only_subscribed_cities():
+    async def scenario():
+        hub = WeatherHub()
+        london = hub.subscribe(["London, GB"])
+        both = hub.subscribe(["London, GB", "Paris, FR"])
+
+        hub.publish("Paris, FR", b'{"city_name":"Paris, FR"}')
+        assert await london.wait(0.01) == {}
+        assert await both.wait(0.01) == {"Paris, FR": b'{"city_name":"Paris, FR"}'}
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_only_keeps_latest_payload():
+    async def scenario():
+        hub = WeatherHub()
+        subscription = hub.subscribe(["London, GB"])
+
+        hub.publish("London, GB", b"1")
+        hub.publish("London, GB", b"2")
+        assert await subscription.wait(0.01) == {"London, GB": b"2"}
+        assert await subscription.wait(0.01) == {}
+
+    asyncio.run(scenario())
+
+
+def test_unsubscribe_removes_empty_cities():
+    hub = WeatherHub()
+    subscription = hub.subscribe(["London, GB"])
+    assert hub.has_subscribers("London, GB")
+
+    hub.unsubscribe(subscription)
+    assert not hub.has_subscribers("London, GB")
+    hub.publish("London, GB", b"ignored")
@@ -0,0 +1,43 @@
+import asyncio
+
+from app.rate_limit import AdaptiveConcurrencyLimiter
+
+
+def test_limit_grows_on_fast_successes():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=10, initial_limit=2, target_latency=1.0)
+    for _ in range(20):
+        limiter.record_success(0.1)
+    assert limiter.current_limit > 2
+    assert limiter.current_limit <= 10
+
+
+def test_limit_halves_on_throttling_and_respects_minimum():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=2, max_limit=10, initial_limit=8)
+    limiter.record_throttled()
+    assert limiter.current_limit == 4
+    limiter.record_throttled()
+    limiter.record_throttled()
+    assert limiter.current_limit == 2
+
+
+def test_slow_responses_shrink_limit():
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=10, initial_limit=10, target_latency=1.0)
+    limiter.record_success(5.0)
+    assert limiter.current_limit == 9
+
+
+def test_in_flight_never_exceeds_limit():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(min_limit=3, max_limit=3, initial_limit=3)
+        peak = 0
+
+        async def task():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(*(task() for _ in range(20)))
+        return peak
+
+    assert asyncio.run(scenario()) == 3
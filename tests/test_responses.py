@@ -0,0 +1,105 @@
+import asyncio
+import gzip
+import json
+from datetime import datetime, timezone
+
+from app import responses
+from app.database import WeatherCache
+from app.responses import materialize_response, materialize_response_async, stored_response, accepts_gzip, render_delta_response
+
+
+def make_entry():
+    now = datetime(2025, 11, 3, 8, 23, 45, tzinfo=timezone.utc)
+    return WeatherCache(
+        city_name="London, GB",
+        latitude=51.5074,
+        longitude=-0.1278,
+        current_weather={
+            "temp": 15.5, "feels_like": 14.2, "humidity": 72, "pressure": 1013,
+            "description": "clear sky", "icon": "01d", "wind_speed": 3.5, "wind_deg": 180
+        },
+        current_weather_updated_at=now,
+        aqi_data={"aqi": 2, "pm2_5": 12.5, "pm10": 18.3, "co": 230.4, "no2": 15.2, "o3": 45.8},
+        hourly_forecast=[],
+        daily_forecast=[],
+        updated_at=now.replace(minute=0, second=0),
+    )
+
+
+def test_materialize_response_stores_plain_and_gzip():
+    entry = make_entry()
+    materialize_response(entry)
+
+    body = json.loads(entry.response_json)
+    assert body["city_name"] == "London, GB"
+    assert body["current"]["temp"] == 15.5
+    assert gzip.decompress(entry.response_json_gzip) == entry.response_json
+
+
+def test_large_responses_are_compressed_in_the_executor(monkeypatch):
+    monkeypatch.setattr(responses, "GZIP_OFFLOAD_BYTES", 0)
+    offloaded = []
+
+    async def run_cpu(func, *args):
+        offloaded.append(func)
+        return func(*args)
+
+    monkeypatch.setattr(responses, "run_cpu", run_cpu)
+    entry, expected = make_entry(), make_entry()
+    asyncio.run(materialize_response_async(entry))
+    materialize_response(expected)
+
+    assert offloaded == [responses.compress_response]
+    assert entry.response_json == expected.response_json
+    assert entry.response_json_gzip == expected.response_json_gzip
+
+
+def test_materialize_response_skips_incomplete_entry():
+    entry = make_entry()
+    entry.current_weather = {}
+    materialize_response(entry)
+    assert entry.response_json is None
+    assert entry.response_json_gzip is None
+
+
+def test_stored_response_negotiates_gzip():
+    entry = make_entry()
+    materialize_response(entry)
+
+    compressed = stored_response(entry, "gzip, deflate, br")
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.body == entry.response_json_gzip
+
+    plain = stored_response(entry, None)
+    assert "content-encoding" not in plain.headers
+    assert plain.body == entry.response_json
+
+
+def test_accepts_gzip_respects_q_zero():
+    assert accepts_gzip("gzip;q=0") is False
+    assert accepts_gzip("identity") is False
+    assert accepts_gzip("*") is True
+
+
+def test_delta_response_only_sends_changed_entries():
+    entry = make_entry()
+    entry.hourly_forecast = [{"dt": 1, "temp": 10.0}, {"dt": 2, "temp": 11.0}]
+    entry.daily_forecast = [{"dt": 1, "date": "2025-11-03", "temp_min": 9.0}]
+    entry.section_versions = {
+        "aqi": 100.0,
+        "hourly": {"1": 100.0, "2": 200.0},
+        "daily": {"2025-11-03": 100.0},
+    }
+    since = datetime.fromtimestamp(150.0, tz=timezone.utc)
+
+    body = json.loads(render_delta_response(entry, entry.current_weather_updated_at, since))
+    assert body["current"] is None
+    assert body["aqi"] is None
+    assert body["hourly"] == [{"dt": 2, "temp": 11.0}]
+    assert body["daily"] == []
+    assert body["hourly_dts"] == [1, 2]
+    assert body["daily_dates"] == ["2025-11-03"]
+
+    body = json.loads(render_delta_response(entry, None, None))
+    assert body["current"]["temp"] == 15.5
+    assert len(body["hourly"]) == 2
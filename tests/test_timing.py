@@ -0,0 +1,33 @@
+import asyncio
+
+from app.timing import ServerTimingMiddleware, phase, record_phase
+
+
+def test_phases_reach_server_timing_header():
+    async def endpoint(scope, receive, send):
+        with phase("upstream_forecast"):
+            await asyncio.sleep(0)
+        record_phase("db", 2.0)
+        record_phase("db", 1.5)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/weather", "headers": []}
+    asyncio.run(ServerTimingMiddleware(endpoint)(scope, None, send))
+
+    headers = dict(sent[0]["headers"])
+    server_timing = headers[b"server-timing"].decode()
+    assert server_timing.startswith("upstream_forecast;dur=")
+    assert "db;dur=3.5" in server_timing
+    assert "total;dur=" in server_timing
+
+
+def test_phase_outside_request_is_a_noop():
+    with phase("db"):
+        pass
+    record_phase("db", 1.0)
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from starlette.requests import Request
+
+from app.database import WeatherCache
+from app.variants import VariantCache, shape_response
+
+
+def body():
+    now = 1762156800  # 2025-11-03 08:00 UTC
+    return {
+        "current": {"temp": 20.0, "feels_like": 18.0, "wind_speed": 10.0, "pressure": 1013},
+        "hourly": [
+            {"dt": now + i * 10800, "temp": 0.0, "feels_like": -2.0, "wind_speed": 1.0} for i in range(-2, 40)
+        ],
+        "daily": [
+            {"date": f"2025-11-0{day}", "temp_min": -10.0, "temp_max": 30.0, "wind_speed": 5.0} for day in range(2, 9)
+        ],
+    }, now
+
+
+def test_units_are_converted_from_metric():
+    data, now = body()
+    imperial = shape_response(data, "imperial", None, None, now)
+    assert imperial["units"] == "imperial"
+    assert imperial["current"]["temp"] == 68.0
+    assert imperial["current"]["wind_speed"] == 22.37
+    assert imperial["current"]["pressure"] == 1013
+    assert imperial["hourly"][0]["feels_like"] == 28.4
+    assert imperial["daily"][0]["temp_min"] == 14.0
+
+    data, now = body()
+    standard = shape_response(data, "standard", None, None, now)
+    assert standard["current"]["temp"] == 293.15
+    assert standard["current"]["wind_speed"] == 10.0
+
+
+def test_horizon_keeps_the_current_block_onwards():
+    data, now = body()
+    shaped = shape_response(data, "metric", 24, 3, now + 3600)
+    # The 08:00 block is in progress at 09:00; 24 hours ahead is up to (not including) 09:00 tomorrow
+    assert [entry["dt"] for entry in shaped["hourly"]] == [now + i * 10800 for i in range(9)]
+    assert [entry["date"] for entry in shaped["daily"]] == ["2025-11-03", "2025-11-04", "2025-11-05"]
+    assert shaped["hourly"][0]["temp"] == 0.0
+
+
+def test_variants_are_served_from_the_single_cached_dataset(client, max_queries):
+    client.post("/api/weather", json={"city_name": "London"})
+    metric = client.post("/api/weather", json={"city_name": "London, GB"}).json()
+
+    with max_queries(1):
+        imperial = client.post("/api/weather", json={"city_name": "London, GB", "units": "imperial", "hours": 24})
+    assert imperial.status_code == 200
+    imperial = imperial.json()
+    assert imperial["units"] == "imperial" and metric["units"] == "metric"
+    assert imperial["current"]["temp"] == round(metric["current"]["temp"] * 9 / 5 + 32, 2)
+    assert all(entry["dt"] < time.time() + 25 * 3600 for entry in imperial["hourly"])
+
+    response = client.post("/api/weather/batch", json={"locations": [
+        {"city_name": "London, GB"}, {"city_name": "London, GB", "units": "standard", "days": 2}
+    ]})
+    first, second = response.json()["results"]
+    assert first == metric
+    assert second["current"]["temp"] == round(metric["current"]["temp"] + 273.15, 2)
+    assert len(second["daily"]) <= 2
+
+    assert client.post("/api/weather", json={"city_name": "London, GB", "units": "kelvin"}).status_code == 422
+
+
+def test_delta_and_subscribe_apply_units(client):
+    from app import main
+
+    metric = client.post("/api/weather", json={"city_name": "London"}).json()
+    fahrenheit = round(metric["current"]["temp"] * 9 / 5 + 32, 2)
+
+    delta = client.post("/api/weather/delta", json={"city_name": "London, GB", "units": "imperial"}).json()
+    assert delta["units"] == "imperial"
+    assert delta["current"]["temp"] == fahrenheit
+    assert delta["hourly"][0]["temp"] == round(metric["hourly"][0]["temp"] * 9 / 5 + 32, 2)
+    assert client.post("/api/weather/delta", json={"city_name": "London, GB"}).json()["units"] == "metric"
+
+    # Nothing new: the delta still converts what it sends
+    up_to_date = client.post("/api/weather/delta", json={
+        "city_name": "London, GB", "units": "standard",
+        "current_weather_updated_at": metric["current_weather_updated_at"], "updated_at": metric["updated_at"]
+    }).json()
+    assert up_to_date["current"] is None and up_to_date["units"] == "standard"
+
+    def request():
+        return Request({"type": "http", "method": "GET", "path": "/api/weather/subscribe", "headers": []})
+
+    async def first_event():
+        response = await main.subscribe_weather(request(), city=["London, GB"], units="imperial")
+        try:
+            return await response.body_iterator.__anext__()
+        finally:
+            await response.body_iterator.aclose()
+
+    event = asyncio.run(first_event())
+    data = orjson.loads(event.split(b"data: ", 1)[1])
+    assert data["units"] == "imperial" and data["current"]["temp"] == fahrenheit
+
+
+def test_variant_cache_follows_the_stored_response_version():
+    data, now = body()
+    stamp = datetime.fromtimestamp(now, tz=timezone.utc)
+    entry = WeatherCache(
+        city_name="London, GB", response_json=orjson.dumps(data),
+        current_weather_updated_at=stamp, updated_at=stamp
+    )
+    cache = VariantCache()
+    first = cache.get(entry, "imperial", None, None, now=stamp)
+    assert cache.get(entry, "imperial", None, None, now=stamp)[0] is first[0]
+    # Only the rendered bodies are kept, not the source
+    assert entry.response_json not in next(iter(cache._entries.values()))
+
+    data["current"]["temp"] = 30.0
+    entry.response_json = orjson.dumps(data)
+    entry.current_weather_updated_at = stamp + timedelta(minutes=15)
+    assert orjson.loads(cache.get(entry, "imperial", None, None, now=stamp)[0])["current"]["temp"] == 86.0
+
+    # A new forecast written within the same second still changes the version
+    data["hourly"][0]["temp"] = 0.0
+    entry.response_json = orjson.dumps(data)
+    entry.forecast_fingerprint = "next run"
+    assert orjson.loads(cache.get(entry, "imperial", None, None, now=stamp)[0])["hourly"][0]["temp"] == 32.0
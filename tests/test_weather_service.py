@@ -0,0 +1,50 @@
+import asyncio
+import httpx
+
+from app.weather_service import WeatherService, GROUP_MAX_IDS
+
+
+def current_payload(city_id: int):
+    return {
+        "id": city_id,
+        "main": {"temp": 15, "feels_like": 14.2, "humidity": 72, "pressure": 1013},
+        "weather": [{"id": 800, "description": "clear sky", "icon": "01d"}],
+        "wind": {"speed": 3.5, "deg": 180},
+    }
+
+
+def make_service(monkeypatch, handler):
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "test-key")
+    return WeatherService(transport=httpx.MockTransport(handler))
+
+
+def test_fetch_current_weather_many_chunks_group_calls(monkeypatch):
+    calls = []
+
+    def handler(request: httpx.Request):
+        assert request.url.path.endswith("/group")
+        ids = [int(city_id) for city_id in request.url.params["id"].split(",")]
+        calls.append(ids)
+        return httpx.Response(200, json={"cnt": len(ids), "list": [current_payload(i) for i in ids]})
+
+    service = make_service(monkeypatch, handler)
+    city_ids = list(range(1, 46)) + [1, 2]
+    result = asyncio.run(service.fetch_current_weather_many(city_ids))
+
+    assert sorted(result) == list(range(1, 46))
+    assert [len(ids) for ids in calls] == [GROUP_MAX_IDS, GROUP_MAX_IDS, 5]
+    assert result[7].temp == 15.0
+    assert isinstance(result[7].temp, float)
+
+
+def test_fetch_current_weather_with_id_returns_city_id(monkeypatch):
+    def handler(request: httpx.Request):
+        assert request.url.path.endswith("/weather")
+        assert request.url.params["appid"] == "test-key"
+        return httpx.Response(200, json=current_payload(2643743))
+
+    service = make_service(monkeypatch, handler)
+    current_weather, city_id = asyncio.run(service.fetch_current_weather_with_id(51.5, -0.12))
+
+    assert city_id == 2643743
+    assert current_weather.description == "clear sky"